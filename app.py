@@ -14,7 +14,6 @@ from flask import (
     redirect,
     url_for,
     flash,
-    Response,
 )
 from flask_cors import CORS
 from flasgger import Swagger
@@ -24,14 +23,31 @@ load_dotenv()
 
 from config import Config, calculate_distance, IST
 from database import db
-from models import Person, Attendance, Settings, AllowedIP, Holiday, User, LeaveAllotment, LeaveType, MonthlyReport, ManualTimeEntry, WorkingRecord, Option, DailyAttendanceSummary
+from models import Person, Attendance, Settings, AllowedIP, Holiday, User, LeaveAllotment, MonthlyReport, ManualTimeEntry, WorkingRecord, Option, DailyAttendanceSummary, serialize_all, prefetch_users, day_bounds
 from multilevel_models import LeaveApprover, LeaveApproval
+from user_directory import user_directory
+from working_reports import build_working_report
+from monthly_reports import build_monthly_reports, save_monthly_reports, add_monthly_report_routes
+from daily_summary import refresh_daily_summary, refresh_user_days, add_daily_summary_commands
+from attendance_rollups import get_rollups, day_counts, record_clock_in, record_clock_out, recount_rollups, add_attendance_rollup_commands
+from ttl_cache import TTLCache
+from http_cache import is_current, not_modified, with_validators, json_with_etag
+from work_calendar import work_calendar
+from report_cache import report_cache, cached_report, month_scopes, bump, CALENDAR_SCOPE, SAVED_MONTHLY_SCOPE, SETTINGS_SCOPE
+from exports import add_export_routes
+from pagination import paginate, page_args, PaginationError
+from bulk_ops import sync_rows
+from leave_balances import ledger_used, lock_leave_request, set_leave_status, add_leave_ledger_commands
 from multilevel_approval_apis import add_multilevel_approval_routes
 from user_approvers_model import UserApprover
 from user_approvers_api import add_user_approvers_routes
+from approver_routing import approver_routing
+from approval_notifications import approval_dispatcher, add_approval_notification_routes
+from attendance_events import attendance_events, add_attendance_event_routes, MAX_WAIT
 from sqlalchemy import and_, func
-from werkzeug.security import generate_password_hash, check_password_hash
-from auth import token_required, generate_access_token, generate_refresh_token, verify_token
+from werkzeug.security import generate_password_hash
+from auth import token_required, generate_access_token, generate_refresh_token, verify_token, evict_user_tokens
+from login_pipeline import password_verifier, refresh_token_writer, rotate_refresh_token
 import pytz
 
 
@@ -40,7 +56,8 @@ def get_office_settings():
     return {
         'latitude': float(Settings.get('office_latitude', Config.OFFICE_LATITUDE)),
         'longitude': float(Settings.get('office_longitude', Config.OFFICE_LONGITUDE)),
-        'radius': float(Settings.get('geofence_radius', Config.GEOFENCE_RADIUS_METERS))
+        'radius': float(Settings.get('geofence_radius', Config.GEOFENCE_RADIUS_METERS)),
+        'standard_working_hours': Option.get_standard_working_hours()
     }
 
 
@@ -63,7 +80,7 @@ from face_utils import (
     FACE_RECOGNITION_AVAILABLE,
 )
 from auth import generate_access_token, generate_refresh_token, verify_token, token_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 
 try:
     import face_recognition  # type: ignore
@@ -103,6 +120,7 @@ def create_app():
     os.makedirs(os.path.join(os.path.dirname(__file__), "instance"), exist_ok=True)
 
     db.init_app(app)
+    report_cache.init_app(app)
     CORS(app)
     
     # Initialize Swagger
@@ -111,9 +129,27 @@ def create_app():
 
     with app.app_context():
         db.create_all()
+        user_directory.load()
+    
+    @app.before_request
+    def start_background_workers():
+        # Started by the first request, so `flask` CLI commands never run them
+        refresh_token_writer.start(app)
+        approval_dispatcher.start(app)
     
     # Add multi-level approval routes
     add_multilevel_approval_routes(app, db)
+    add_approval_notification_routes(app, db)
+    add_attendance_event_routes(app, db)
+    
+    # Batch monthly report generation (admin endpoint and CLI)
+    add_monthly_report_routes(app, db)
+    add_daily_summary_commands(app)
+    add_attendance_rollup_commands(app)
+    
+    # Streaming CSV/NDJSON/XLSX exports
+    add_export_routes(app, db)
+    add_leave_ledger_commands(app)
     
     # ---------- Authentication APIs ----------
     @app.route("/api/auth/login", methods=["POST"])
@@ -132,15 +168,19 @@ def create_app():
         if not hasattr(user, 'userPassword') or not user.userPassword:
             return jsonify({'success': False, 'error': 'Password not set'}), 401
         
-        if not check_password_hash(user.userPassword, password):
+        # Hashing runs on the bounded login pool; None means it is saturated
+        password_ok = password_verifier.verify(user.userPassword, password)
+        if password_ok is None:
+            return jsonify({'success': False, 'error': 'Login service busy, please retry'}), 503, {'Retry-After': '2'}
+        if not password_ok:
             return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
         
         access_token = generate_access_token(user.userId)
         refresh_token = generate_refresh_token(user.userId)
         
-        user.userRefreshToken = refresh_token
-        user.userTokenCreatedAt = get_ist_now()
-        db.session.commit()
+        # Persisted in batches by the write-behind writer instead of a commit per login
+        refresh_token_writer.submit(user.userId, refresh_token)
+        evict_user_tokens(user.userId)
         
         return jsonify({
             'success': True,
@@ -148,6 +188,54 @@ def create_app():
             'refresh_token': refresh_token,
             'user': {'user_id': user.userId, 'name': f"{user.userFirstName} {user.userLastName}".strip()}
         })
+
+    @app.route("/api/auth/refresh", methods=["POST"])
+    def api_refresh_token():
+        """
+        Refresh Access Token
+        ---
+        tags:
+          - Authentication
+        parameters:
+          - name: body
+            in: body
+            required: true
+            schema:
+              type: object
+              properties:
+                refresh_token:
+                  type: string
+        responses:
+          200:
+            description: New access and refresh token pair (the old refresh token stops working)
+          401:
+            description: Invalid, expired or already rotated refresh token
+        """
+        data = request.get_json() or {}
+        token = data.get('refresh_token')
+        if not token:
+            return jsonify({'success': False, 'error': 'refresh_token required'}), 400
+        
+        payload = verify_token(token, token_type='refresh')
+        if not payload:
+            return jsonify({'success': False, 'error': 'Invalid or expired refresh token'}), 401
+        
+        user = User.query.filter_by(userId=payload['user_id'], userIsActive='1').first()
+        if not user:
+            return jsonify({'success': False, 'error': 'User not found'}), 401
+        
+        # Only the most recently issued refresh token may be used, and only once
+        refresh_token = generate_refresh_token(user.userId)
+        if not rotate_refresh_token(user.userId, token, refresh_token):
+            return jsonify({'success': False, 'error': 'Refresh token has been rotated'}), 401
+        
+        access_token = generate_access_token(user.userId)
+        
+        return jsonify({
+            'success': True,
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        })
     
     # Add user approvers routes (simple version)
     @app.route("/api/user-approvers-simple", methods=["GET"])
@@ -178,7 +266,7 @@ def create_app():
             assignments = query.all()
             return jsonify({
                 "success": True, 
-                "assignments": [a.to_dict() for a in assignments]
+                "assignments": serialize_all(assignments)
             })
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
@@ -233,11 +321,12 @@ def create_app():
                 assignments.append(assignment)
             
             db.session.commit()
+            approver_routing.invalidate()
             
             return jsonify({
                 "success": True,
                 "count": len(assignments),
-                "assignments": [a.to_dict() for a in assignments]
+                "assignments": serialize_all(assignments)
             })
             
         except Exception as e:
@@ -258,7 +347,7 @@ def create_app():
             description: List of all active users
         """
         try:
-            users = User.query.filter_by(userIsActive='1').all()
+            users = user_directory.active_users()
             return jsonify({
                 "success": True,
                 "users": [{
@@ -308,6 +397,14 @@ def create_app():
             required: false
             description: End date for filtering (YYYY-MM-DD)
             example: "2025-12-31"
+          - name: limit
+            in: query
+            type: integer
+            description: Page size (default 100, max 500)
+          - name: cursor
+            in: query
+            type: string
+            description: next_cursor from the previous page
         responses:
           200:
             description: Successful response with list of manual time entries
@@ -375,6 +472,7 @@ def create_app():
                   example: "Internal server error"
         """
         try:
+            limit, cursor = page_args(request.args)
             query = ManualTimeEntry.query
 
             user_id = request.args.get("user_id", type=int)
@@ -392,17 +490,21 @@ def create_app():
                 to_date = datetime.strptime(to_date_str, "%Y-%m-%d").date()
                 query = query.filter(ManualTimeEntry.entryWorkingDate <= to_date)
 
-            entries = query.order_by(
-                ManualTimeEntry.entryWorkingDate.desc(),
-                ManualTimeEntry.entryUserId.asc(),
-            ).all()
+            entries, next_cursor = paginate(query, [
+                (ManualTimeEntry.entryWorkingDate, True),
+                (ManualTimeEntry.entryUserId, False),
+                (ManualTimeEntry.entryId, False),
+            ], limit, cursor)
 
             return jsonify(
                 {
                     "success": True,
-                    "entries": [e.to_dict() for e in entries],
+                    "entries": serialize_all(entries),
+                    "next_cursor": next_cursor,
                 }
             )
+        except PaginationError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
@@ -662,6 +764,7 @@ def create_app():
                 # Default to Admin (1) when coming from this UI, so value is stored in DB but not shown
                 entry.entryCreatedBy = entry.entryCreatedBy or 1
 
+            refresh_daily_summary(user_id, working_date)
             db.session.commit()
 
             return jsonify({"success": True, "entry": entry.to_dict()})
@@ -676,7 +779,7 @@ def create_app():
             # Try to get a real record from database
             example_record = WorkingRecord.query.first()
             if example_record:
-                user = User.query.filter_by(userId=example_record.recordUserId).first()
+                user = user_directory.get(example_record.recordUserId)
                 user_name = f"{user.userFirstName} {user.userLastName}" if user else f"User {example_record.recordUserId}"
                 return {
                     "success": True,
@@ -781,6 +884,10 @@ def create_app():
                         type: string
                         format: date
                         example: "2025-12-05"
+                      day_type:
+                        type: string
+                        enum: [working, holiday, week_off]
+                        example: "working"
                       clock_in_time:
                         type: string
                         format: time
@@ -806,6 +913,9 @@ def create_app():
                     date_range:
                       type: string
                       example: "2025-12-05 to 2025-12-05"
+                    working_days:
+                      type: integer
+                      example: 1
                     attendance_records_found:
                       type: integer
                       example: 0
@@ -863,7 +973,7 @@ def create_app():
                 return jsonify({"success": False, "error": "user_id is required"}), 400
 
             # Validate user exists
-            user = User.query.filter_by(userId=user_id, userIsActive="1").first()
+            user = user_directory.get_active(user_id)
             if not user:
                 return jsonify({"success": False, "error": "User not found or inactive"}), 404
 
@@ -913,210 +1023,23 @@ def create_app():
                 end_date = now.date()
                 start_date = end_date - timedelta(days=6)
 
-            # Get attendance records from mtpl_attendance table
-            # Don't require clock_in_time to be not null - get all records in date range
-            attendance_records = Attendance.query.filter(
-                and_(
-                    Attendance.attendanceUserId == user_id,
-                    func.date(Attendance.attendanceTimestamp) >= start_date,
-                    func.date(Attendance.attendanceTimestamp) <= end_date
-                )
-            ).order_by(Attendance.attendanceTimestamp.asc()).all()
+            def build():
+                records, search_info = build_working_report(user.userId, user_full_name, start_date, end_date)
 
-            # Also check manual time entries
-            manual_entries = ManualTimeEntry.query.filter(
-                and_(
-                    ManualTimeEntry.entryUserId == user_id,
-                    ManualTimeEntry.entryWorkingDate >= start_date,
-                    ManualTimeEntry.entryWorkingDate <= end_date
-                )
-            ).all()
-
-            # Get existing working reports from database FIRST
-            existing_records = WorkingRecord.query.filter(
-                and_(
-                    WorkingRecord.recordUserId == user_id,
-                    WorkingRecord.recordDate >= start_date,
-                    WorkingRecord.recordDate <= end_date
-                )
-            ).all()
-
-            # Create a map of existing records by date
-            existing_by_date = {rec.recordDate: rec for rec in existing_records}
-
-            # Start with existing records from database
-            records = []
-            processed_dates = set()
-            
-            # Get current standard working hours from database (for recalculation)
-            current_standard_hours = Option.get_standard_working_hours()
-            
-            # Add existing records to response first (recalculate total_hours_difference with current standard)
-            for rec_date, rec in existing_by_date.items():
-                # Recalculate total_hours_difference using current standard hours from database
-                worked_hrs = float(rec.recordWorkedHours) if rec.recordWorkedHours is not None else None
-                recalculated_diff = None
-                if worked_hrs is not None:
-                    recalculated_diff = round(worked_hrs - current_standard_hours, 2)
-                
-                records.append(OrderedDict([
-                    ("user_full_name", user_full_name),
-                    ("date", rec_date.isoformat()),
-                    ("clock_in_time", rec.recordClockInTime.strftime("%H:%M:%S") if rec.recordClockInTime else None),
-                    ("clock_out_time", rec.recordClockOutTime.strftime("%H:%M:%S") if rec.recordClockOutTime else None),
-                    ("worked_hours", worked_hrs),
-                    ("total_hours_difference", recalculated_diff)
-                ]))
-                processed_dates.add(rec_date)
-
-            # Process attendance records
-            for att in attendance_records:
-                att_date = att.attendanceTimestamp.date()
-                if att_date in processed_dates:
-                    continue
-
-                clock_in = att.attendanceClockInTime
-                clock_out = att.attendanceClockOutTime
-
-                # Calculate worked hours
-                worked_hours = None
-                total_hours_difference = None
-
-                if clock_in and clock_out:
-                    # Calculate worked hours (considering break time if available)
-                    break_duration = timedelta(0)
-                    if att.attendanceBreakInTime and att.attendanceBreakOutTime:
-                        break_duration = att.attendanceBreakOutTime - att.attendanceBreakInTime
-
-                    total_duration = clock_out - clock_in
-                    worked_duration = total_duration - break_duration
-                    worked_hours = worked_duration.total_seconds() / 3600.0
-
-                    # Calculate total hours difference (using standard working hours from database)
-                    standard_hours = Option.get_standard_working_hours()
-                    total_hours_difference = worked_hours - standard_hours
-
-                # Save to database
-                working_record = WorkingRecord.query.filter_by(
-                    recordUserId=user_id,
-                    recordDate=att_date
-                ).first()
-
-                if not working_record:
-                    working_record = WorkingRecord(
-                        recordUserId=user_id,
-                        recordDate=att_date,
-                        recordClockInTime=clock_in.time() if clock_in else None,
-                        recordClockOutTime=clock_out.time() if clock_out else None,
-                        recordWorkedHours=worked_hours,
-                        recordTotalHoursDifference=total_hours_difference
-                    )
-                    db.session.add(working_record)
-                else:
-                    working_record.recordClockInTime = clock_in.time() if clock_in else working_record.recordClockInTime
-                    working_record.recordClockOutTime = clock_out.time() if clock_out else working_record.recordClockOutTime
-                    working_record.recordWorkedHours = worked_hours
-                    working_record.recordTotalHoursDifference = total_hours_difference
-
-                records.append(OrderedDict([
-                    ("user_full_name", user_full_name),
-                    ("date", att_date.isoformat()),
-                    ("clock_in_time", clock_in.strftime("%H:%M:%S") if clock_in else None),
-                    ("clock_out_time", clock_out.strftime("%H:%M:%S") if clock_out else None),
-                    ("worked_hours", round(worked_hours, 2) if worked_hours is not None else None),
-                    ("total_hours_difference", round(total_hours_difference, 2) if total_hours_difference is not None else None)
-                ]))
+                # Return response with search info (using OrderedDict to maintain field order)
+                response = OrderedDict([
+                    ("success", True),
+                    ("records", records),
+                    ("search_info", search_info)
+                ])
 
-                processed_dates.add(att_date)
+                # Use json.dumps to ensure field order is preserved
+                return json.dumps(response, ensure_ascii=False)
 
-            # Process manual time entries (for dates not in attendance)
-            for manual in manual_entries:
-                if manual.entryWorkingDate in processed_dates:
-                    continue
-
-                clock_in_time = manual.entryCheckInTime
-                clock_out_time = manual.entryCheckOutTime
-                break_in_time = manual.entryBreakInTime
-                break_out_time = manual.entryBreakOutTime
-
-                worked_hours = None
-                total_hours_difference = None
-
-                if clock_in_time and clock_out_time:
-                    # Create datetime objects for calculation
-                    clock_in_dt = datetime.combine(manual.entryWorkingDate, clock_in_time)
-                    clock_out_dt = datetime.combine(manual.entryWorkingDate, clock_out_time)
-
-                    # Calculate break duration
-                    break_duration = timedelta(0)
-                    if break_in_time and break_out_time:
-                        break_in_dt = datetime.combine(manual.entryWorkingDate, break_in_time)
-                        break_out_dt = datetime.combine(manual.entryWorkingDate, break_out_time)
-                        break_duration = break_out_dt - break_in_dt
-
-                    total_duration = clock_out_dt - clock_in_dt
-                    worked_duration = total_duration - break_duration
-                    worked_hours = worked_duration.total_seconds() / 3600.0
-
-                    # Calculate total hours difference (using standard working hours from database)
-                    standard_hours = Option.get_standard_working_hours()
-                    total_hours_difference = worked_hours - standard_hours
-
-                # Save to database
-                working_record = WorkingRecord.query.filter_by(
-                    recordUserId=user_id,
-                    recordDate=manual.entryWorkingDate
-                ).first()
-
-                if not working_record:
-                    working_record = WorkingRecord(
-                        recordUserId=user_id,
-                        recordDate=manual.entryWorkingDate,
-                        recordClockInTime=clock_in_time,
-                        recordClockOutTime=clock_out_time,
-                        recordWorkedHours=worked_hours,
-                        recordTotalHoursDifference=total_hours_difference
-                    )
-                    db.session.add(working_record)
-                else:
-                    working_record.recordClockInTime = clock_in_time
-                    working_record.recordClockOutTime = clock_out_time
-                    working_record.recordWorkedHours = worked_hours
-                    working_record.recordTotalHoursDifference = total_hours_difference
-
-                records.append(OrderedDict([
-                    ("user_full_name", user_full_name),
-                    ("date", manual.entryWorkingDate.isoformat()),
-                    ("clock_in_time", clock_in_time.strftime("%H:%M:%S") if clock_in_time else None),
-                    ("clock_out_time", clock_out_time.strftime("%H:%M:%S") if clock_out_time else None),
-                    ("worked_hours", round(worked_hours, 2) if worked_hours is not None else None),
-                    ("total_hours_difference", round(total_hours_difference, 2) if total_hours_difference is not None else None)
-                ]))
-
-                processed_dates.add(manual.entryWorkingDate)
-
-            db.session.commit()
-
-            # Sort records by date
-            records.sort(key=lambda x: x["date"])
-
-            # Return response with search info (using OrderedDict to maintain field order)
-            response = OrderedDict([
-                ("success", True),
-                ("records", records),
-                ("search_info", OrderedDict([
-                    ("user_id", user_id),
-                    ("date_range", f"{start_date} to {end_date}"),
-                    ("attendance_records_found", len(attendance_records)),
-                    ("manual_entries_found", len(manual_entries)),
-                    ("existing_records_found", len(existing_records)),
-                ]))
-            ])
-
-            # Use json.dumps to ensure field order is preserved
-            return Response(
-                json.dumps(response, ensure_ascii=False),
-                mimetype='application/json'
+            return cached_report(
+                "working-reports", [user.userId, user_full_name, start_date, end_date],
+                # total_hours_difference depends on the standard working hours option
+                month_scopes(user.userId, start_date, end_date) + [CALENDAR_SCOPE, SETTINGS_SCOPE], build
             )
 
         except Exception as e:
@@ -1153,18 +1076,8 @@ def create_app():
     @app.route("/")
     def index():
         persons_count = Person.query.count()
-        today_start = get_ist_now().replace(hour=0, minute=0, second=0, microsecond=0)
-        attendance_today = Attendance.query.filter(
-            Attendance.attendanceTimestamp >= today_start
-        ).count()
-        
-        # Calculate absent count
-        attended_person_ids = db.session.query(Attendance.attendanceUserId).filter(
-            Attendance.attendanceTimestamp >= today_start,
-            Attendance.attendanceClockInTime.isnot(None)
-        ).distinct().all()
-        attended_ids = [pid[0] for pid in attended_person_ids]
-        absent_count = persons_count - len(attended_ids)
+        attendance_today, _, present_count, _, _ = day_counts(get_ist_now().date())
+        absent_count = persons_count - present_count
         
         return render_template(
             "index.html",
@@ -1176,7 +1089,7 @@ def create_app():
     @app.route("/manual-time-entries")
     def manual_time_entries_view():
         """Simple admin UI to view and manage manual time entries."""
-        users = User.query.filter_by(userIsActive='1').order_by(User.userFirstName.asc()).all()
+        users = sorted(user_directory.active_users(), key=lambda u: u.userFirstName or '')
         return render_template("manual_time_entries.html", users=users)
 
     @app.route("/working-reports")
@@ -1184,6 +1097,8 @@ def create_app():
         """UI to search and view working reports based on user ID, date, month, and year."""
         return render_template("working_reports.html")
 
+    dashboard_cache = TTLCache(maxsize=8, ttl=app.config["DASHBOARD_CACHE_TTL"])
+
     @app.route("/api/analytics/dashboard")
     @token_required
     def api_analytics_dashboard():
@@ -1196,64 +1111,48 @@ def create_app():
           200:
             description: Dashboard statistics
         """
-        now = get_ist_now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=now.weekday())
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        today = get_ist_now().date()
+        cached = dashboard_cache.get(today)
+        if cached is not None:
+            return json_with_etag(jsonify(cached))
+        week_start = today - timedelta(days=today.weekday())
         
-        # Today's stats
-        today_records = Attendance.query.filter(
-            Attendance.attendanceTimestamp >= today_start,
-            Attendance.attendanceClockInTime.isnot(None)
-        ).all()
+        # One range read covers today, this week so far and the last 30 days
+        rollups = get_rollups(today - timedelta(days=29), today)
         
-        late_count = sum(1 for r in today_records if r.attendanceClockInTime and r.attendanceClockInTime.hour >= 10)
-        overtime_count = sum(1 for r in today_records if r.attendanceClockOutTime and r.attendanceClockOutTime.hour >= 18)
+        def clock_ins(day):
+            rollup = rollups.get(day)
+            return rollup.rollupClockIns if rollup else 0
         
-        # Calculate absent count
-        attended_person_ids = db.session.query(Attendance.attendanceUserId).filter(
-            Attendance.attendanceTimestamp >= today_start,
-            Attendance.attendanceClockInTime.isnot(None)
-        ).distinct().all()
-        attended_ids = [pid[0] for pid in attended_person_ids]
+        # Today's stats
+        today_rollup = rollups[today]
         total_persons = Person.query.count()
-        absent_count = total_persons - len(attended_ids)
         
         # Weekly data
         weekly_data = []
         for i in range(7):
             day = week_start + timedelta(days=i)
-            day_end = day + timedelta(days=1)
-            count = Attendance.query.filter(
-                Attendance.attendanceTimestamp >= day,
-                Attendance.attendanceTimestamp < day_end,
-                Attendance.attendanceClockInTime.isnot(None)
-            ).count()
-            weekly_data.append({"day": day.strftime("%a"), "count": count})
+            weekly_data.append({"day": day.strftime("%a"), "count": clock_ins(day)})
         
         # Monthly data (last 30 days)
         monthly_data = []
         for i in range(30):
-            day = today_start - timedelta(days=29-i)
-            day_end = day + timedelta(days=1)
-            count = Attendance.query.filter(
-                Attendance.attendanceTimestamp >= day,
-                Attendance.attendanceTimestamp < day_end,
-                Attendance.attendanceClockInTime.isnot(None)
-            ).count()
-            monthly_data.append({"date": day.strftime("%d"), "count": count})
+            day = today - timedelta(days=29-i)
+            monthly_data.append({"date": day.strftime("%d"), "count": clock_ins(day)})
         
-        return jsonify({
+        dashboard = {
             "today": {
-                "total": len(today_records),
-                "late": late_count,
-                "overtime": overtime_count,
-                "ontime": len(today_records) - late_count,
-                "absent": absent_count
+                "total": today_rollup.rollupClockIns,
+                "late": today_rollup.rollupLate,
+                "overtime": today_rollup.rollupOvertime,
+                "ontime": today_rollup.rollupClockIns - today_rollup.rollupLate,
+                "absent": total_persons - today_rollup.rollupPresent
             },
             "weekly": weekly_data,
             "monthly": monthly_data
-        })
+        }
+        dashboard_cache.set(today, dashboard)
+        return json_with_etag(jsonify(dashboard))
 
     # --- register with upload ---
     @app.route("/register", methods=["GET", "POST"])
@@ -1385,13 +1284,21 @@ def create_app():
     @app.route("/persons")
     def persons_view():
         persons = Person.query.order_by(Person.biometricCreatedAt.desc()).all()
+        prefetch_users(persons)
         return render_template("persons.html", persons=persons)
 
     @app.route("/api/persons", methods=["GET"])
     @token_required
     def api_get_persons():
-        persons = Person.query.filter_by(biometricIsActive=True).order_by(Person.biometricCreatedAt.desc()).all()
-        return jsonify({"success": True, "persons": [p.to_dict() for p in persons]})
+        try:
+            limit, cursor = page_args(request.args)
+            persons, next_cursor = paginate(Person.query.filter_by(biometricIsActive=True), [
+                (Person.biometricCreatedAt, True),
+                (Person.biometricId, True),
+            ], limit, cursor)
+        except PaginationError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        return jsonify({"success": True, "persons": serialize_all(persons), "next_cursor": next_cursor})
 
     @app.route("/api/users/bulk", methods=["POST"])
     @token_required
@@ -1420,6 +1327,8 @@ def create_app():
                 added.append(user)
             
             db.session.commit()
+            if added:
+                user_directory.refresh_new()
             return jsonify({"success": True, "count": len(added)})
         except Exception as e:
             db.session.rollback()
@@ -1433,12 +1342,26 @@ def create_app():
             if not person:
                 return jsonify({"success": False, "error": "Person not found"}), 404
             
+            # Days whose summaries, rollups and cached reports include this person's punches
+            punch_days = {
+                datetime.strptime(day, "%Y-%m-%d").date() if isinstance(day, str) else day
+                for day, in db.session.query(func.date(Attendance.attendanceTimestamp)).filter(
+                    Attendance.attendanceUserId == person.biometricUserId
+                ).distinct()
+            }
+
             # Delete associated attendance records first
             Attendance.query.filter_by(attendanceUserId=person.biometricUserId).delete()
             
             # Delete person
             db.session.delete(person)
+            db.session.flush()
+            # Same transaction: summaries are rebuilt (this bumps the report versions) and
+            # stored rollups recounted without the deleted rows and headcount
+            refresh_user_days(person.biometricUserId, punch_days)
+            recount_rollups(punch_days)
             db.session.commit()
+            dashboard_cache.clear()
             
             return jsonify({"success": True, "message": "Person deleted successfully"})
         except Exception as e:
@@ -1510,12 +1433,25 @@ def create_app():
                   type: number
                 radius:
                   type: number
+                standard_working_hours:
+                  type: number
+                  description: Daily hours the working report compares worked hours against
         responses:
           200:
             description: Settings updated
+          400:
+            description: Invalid standard_working_hours
         """
         data = request.get_json() or {}
         
+        if 'standard_working_hours' in data:
+            try:
+                hours = float(data['standard_working_hours'])
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "error": "standard_working_hours must be a number"}), 400
+            # Committed together with the version bump, so cached working reports are rebuilt
+            bump([SETTINGS_SCOPE])
+            Option.set('standard_working_hours', hours)
         if 'latitude' in data:
             Settings.set('office_latitude', data['latitude'])
         if 'longitude' in data:
@@ -1798,6 +1734,8 @@ def create_app():
                 attendanceTimestamp=now
             )
             db.session.add(record)
+            record_clock_in(record)
+            refresh_daily_summary(person.biometricUserId, today)
             db.session.commit()
             message = f"Clocked in at {now.strftime('%H:%M:%S')}"
 
@@ -1810,14 +1748,18 @@ def create_app():
 
             today_record.attendanceClockOutTime = now
             today_record.attendanceAction = "clock_out"
+            record_clock_out(today_record)
+            refresh_daily_summary(person.biometricUserId, today)
             db.session.commit()
             record = today_record
             message = f"Clocked out at {now.strftime('%H:%M:%S')}"
 
+        attendance = record.to_dict()
+        attendance_events.publish(action, attendance)
         return jsonify({
             "success": True,
             "person": person.to_dict(),
-            "attendance": record.to_dict(),
+            "attendance": attendance,
             "message": message,
             "distance_from_office": round(distance_from_office, 2)
         })
@@ -1851,7 +1793,11 @@ def create_app():
         if not last or (now - last.attendanceTimestamp) > timedelta(minutes=1):
             record = Attendance(attendanceUserId=person.biometricUserId, attendanceStatus="present", attendanceSource="live_camera")
             db.session.add(record)
+            # Same transaction as the new row so cached reports of this month are rebuilt
+            today = now.date()
+            bump(month_scopes(person.biometricUserId, today, today))
             db.session.commit()
+            attendance_events.publish("live_mark", record.to_dict())
         else:
             record = last
 
@@ -1873,17 +1819,70 @@ def create_app():
         ---
         tags:
           - Attendance
+        parameters:
+          - name: since
+            in: query
+            type: integer
+            required: false
+            description: last_event_id from the previous response; returns only newer events
+          - name: wait
+            in: query
+            type: integer
+            required: false
+            description: With since, seconds (max 30) to wait for an event before answering (long-poll)
+          - name: If-None-Match
+            in: header
+            type: string
+            required: false
+            description: ETag of the previous response
         responses:
           200:
-            description: Latest 20 records
-        """
+            description: Latest 20 records (results), or with since the newer events (events); reset is true when the events since could not be replayed and results holds a full reload
+          304:
+            description: No attendance written since the ETag (or If-Modified-Since) sent
+        """
+        since = request.args.get('since', type=int)
+        if since is not None:
+            wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_WAIT)
+            if wait:
+                # Do not hold a pooled connection while blocking
+                db.session.close()
+            events = attendance_events.wait(since, wait) if wait else attendance_events.since(since)
+            if events is not None:
+                return jsonify({
+                    "success": True,
+                    "events": events,
+                    "last_event_id": events[-1]["id"] if events else since,
+                })
+            # Taken before the reload so no event can fall between the two
+            last_event_id = attendance_events.last_id
+            records = Attendance.query.order_by(Attendance.attendanceTimestamp.desc()).limit(20).all()
+            return jsonify({
+                "success": True,
+                "reset": True,
+                "results": serialize_all(records),
+                "last_event_id": last_event_id,
+            })
+
+        # Answered from indexes; pollers that are current get a 304. The row count
+        # changes on deletes, which move neither maximum.
+        last_id, last_updated, row_count = db.session.query(
+            func.max(Attendance.attendanceId), func.max(Attendance.attendanceUpdatedAt), func.count(Attendance.attendanceId)
+        ).one()
+        etag = f"{last_id or 0}-{row_count}"
+        if last_updated:
+            etag += f"-{last_updated:%Y%m%d%H%M%S%f}"
+        if is_current(etag, last_updated):
+            return not_modified(etag, last_updated)
+        last_event_id = attendance_events.last_id
         records = Attendance.query.order_by(Attendance.attendanceTimestamp.desc()).limit(20).all()
-        return jsonify(
+        return with_validators(jsonify(
             {
                 "success": True,
-                "results": [r.to_dict() for r in records],
+                "results": serialize_all(records),
+                "last_event_id": last_event_id,
             }
-        )
+        ), etag, last_updated)
 
     @app.route("/api/attendance/today/<user_id>", methods=["GET"])
     @token_required
@@ -2003,11 +2002,14 @@ def create_app():
             today_record.attendanceBreakOutTime = now
             message = f"Break ended at {now.strftime('%H:%M:%S')}"
 
+        refresh_daily_summary(today_record.attendanceUserId, today_record.attendanceTimestamp.date())
         db.session.commit()
+        attendance = today_record.to_dict()
+        attendance_events.publish(action, attendance)
 
         return jsonify({
             "success": True,
-            "attendance": today_record.to_dict(),
+            "attendance": attendance,
             "message": message,
             "distance_from_office": round(distance_from_office, 2)
         })
@@ -2039,10 +2041,15 @@ def create_app():
         year = request.args.get('year', get_ist_now().year, type=int)
         month = request.args.get('month', get_ist_now().month, type=int)
         
+        try:
+            first_day = date(year, month, 1)
+        except ValueError:
+            return jsonify({"success": False, "error": "Invalid year or month"}), 400
+        next_month = date(year + month // 12, month % 12 + 1, 1)
         holidays = Holiday.query.filter(
-            func.extract('year', Holiday.holidayDate) == year,
-            func.extract('month', Holiday.holidayDate) == month
-        ).all()
+            Holiday.holidayDate >= first_day,
+            Holiday.holidayDate < next_month
+        ).order_by(Holiday.holidayDate).all()
         
         return jsonify({"success": True, "holidays": [h.to_dict() for h in holidays]})
 
@@ -2090,7 +2097,9 @@ def create_app():
             
             holiday = Holiday(holidayDate=holiday_date, holidayName=name, holidayIsWeekoff=is_weekoff)
             db.session.add(holiday)
+            bump([CALENDAR_SCOPE])
             db.session.commit()
+            work_calendar.invalidate(holiday_date.year)
             
             return jsonify({"success": True, "holiday": holiday.to_dict()})
         except Exception as e:
@@ -2104,8 +2113,11 @@ def create_app():
         if not holiday:
             return jsonify({"success": False, "error": "Holiday not found"}), 404
         
+        holiday_year = holiday.holidayDate.year
         db.session.delete(holiday)
+        bump([CALENDAR_SCOPE])
         db.session.commit()
+        work_calendar.invalidate(holiday_year)
         
         return jsonify({"success": True})
 
@@ -2304,7 +2316,7 @@ def create_app():
             return jsonify({"success": False, "error": "user_id required"}), 400
         
         balances = UserLeaveBalance.query.filter_by(balanceUserId=user_id, balanceYear=year).all()
-        return jsonify({"success": True, "balances": [b.to_dict() for b in balances]})
+        return jsonify({"success": True, "balances": serialize_all(balances)})
 
     @app.route("/api/user-leave-balance/rollover", methods=["POST"])
     @token_required
@@ -2345,33 +2357,29 @@ def create_app():
         if not user_ids:
             return jsonify({"success": False, "error": "user_ids required"}), 400
         
-        created = []
-        for user_id in user_ids:
-            old_balances = UserLeaveBalance.query.filter_by(
-                balanceUserId=user_id,
-                balanceYear=from_year
-            ).all()
-            
-            for old_bal in old_balances:
-                existing = UserLeaveBalance.query.filter_by(
-                    balanceUserId=user_id,
-                    balanceLeaveTypeId=old_bal.balanceLeaveTypeId,
-                    balanceYear=to_year
-                ).first()
-                
-                if not existing:
-                    new_bal = UserLeaveBalance(
-                        balanceUserId=user_id,
-                        balanceLeaveTypeId=old_bal.balanceLeaveTypeId,
-                        balanceTotal=old_bal.balanceTotal,
-                        balanceUsed=0,
-                        balanceYear=to_year
-                    )
-                    db.session.add(new_bal)
-                    created.append(new_bal)
-        
+        # Keys must be ints to match the rows sync_rows reads back
+        try:
+            from_year, to_year = int(from_year), int(to_year)
+            user_ids = [int(uid) for uid in user_ids]
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "from_year, to_year and user_ids must be integers"}), 400
+        
+        old_balances = UserLeaveBalance.query.filter(
+            UserLeaveBalance.balanceUserId.in_(user_ids),
+            UserLeaveBalance.balanceYear == from_year
+        ).all()
+        rows = [{
+            "balanceUserId": old_bal.balanceUserId,
+            "balanceLeaveTypeId": old_bal.balanceLeaveTypeId,
+            "balanceYear": to_year,
+            "balanceTotal": old_bal.balanceTotal,
+            "balanceUsed": 0,
+        } for old_bal in old_balances]
+        
+        # Balances already present for to_year are left untouched
+        counts = sync_rows(UserLeaveBalance, rows, ("balanceUserId", "balanceLeaveTypeId", "balanceYear"), ())
         db.session.commit()
-        return jsonify({"success": True, "count": len(created)})
+        return jsonify({"success": True, "count": counts["inserted"], **counts})
 
     @app.route("/api/user-leave-balance/default", methods=["POST"])
     @token_required
@@ -2405,10 +2413,14 @@ def create_app():
         """
         from models import UserLeaveBalance, LeaveType
         data = request.get_json() or {}
-        year = data.get('year', get_ist_now().year)
+        # Keys must be ints to match the rows sync_rows reads back
+        try:
+            year = int(data.get('year', get_ist_now().year))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "year must be an integer"}), 400
         defaults = data.get('defaults', {'casual': 4, 'sick': 7, 'celebratory': 0.5})
         
-        users = User.query.filter_by(userIsActive='1').all()
+        users = user_directory.active_users()
         if not users:
             return jsonify({"success": False, "error": "No users found"}), 404
         
@@ -2427,30 +2439,17 @@ def create_app():
             'Celebratory Leave': defaults.get('celebratory', 0.5)
         }
         
-        count = 0
-        for user in users:
-            for leave_name, total in mapping.items():
-                leave_type = leave_types[leave_name]
-                balance = UserLeaveBalance.query.filter_by(
-                    balanceUserId=user.userId,
-                    balanceLeaveTypeId=leave_type.leaveTypeId,
-                    balanceYear=year
-                ).first()
-                
-                if balance:
-                    balance.balanceTotal = total
-                else:
-                    balance = UserLeaveBalance(
-                        balanceUserId=user.userId,
-                        balanceLeaveTypeId=leave_type.leaveTypeId,
-                        balanceTotal=total,
-                        balanceYear=year
-                    )
-                    db.session.add(balance)
-                count += 1
+        rows = [{
+            "balanceUserId": user.userId,
+            "balanceLeaveTypeId": leave_types[leave_name].leaveTypeId,
+            "balanceYear": year,
+            "balanceTotal": total,
+            "balanceUsed": 0,
+        } for user in users for leave_name, total in mapping.items()]
         
+        counts = sync_rows(UserLeaveBalance, rows, ("balanceUserId", "balanceLeaveTypeId", "balanceYear"), ("balanceTotal",))
         db.session.commit()
-        return jsonify({"success": True, "count": count, "users": len(users)})
+        return jsonify({"success": True, "count": len(rows), "users": len(users), **counts})
 
     @app.route("/api/user-leave-balance/bulk", methods=["POST"])
     @token_required
@@ -2491,28 +2490,30 @@ def create_app():
         if not user_ids or not leave_type_id:
             return jsonify({"success": False, "error": "user_ids and leave_type_id required"}), 400
         
-        results = []
-        for user_id in user_ids:
-            balance = UserLeaveBalance.query.filter_by(
-                balanceUserId=user_id,
-                balanceLeaveTypeId=leave_type_id,
-                balanceYear=year
-            ).first()
-            
-            if balance:
-                balance.balanceTotal = total
-            else:
-                balance = UserLeaveBalance(
-                    balanceUserId=user_id,
-                    balanceLeaveTypeId=leave_type_id,
-                    balanceTotal=total,
-                    balanceYear=year
-                )
-                db.session.add(balance)
-            results.append(balance)
-        
+        # Keys must be ints to match the rows sync_rows reads back
+        try:
+            user_ids = [int(uid) for uid in user_ids]
+            leave_type_id, year = int(leave_type_id), int(year)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "user_ids, leave_type_id and year must be integers"}), 400
+        
+        rows = [{
+            "balanceUserId": user_id,
+            "balanceLeaveTypeId": leave_type_id,
+            "balanceYear": year,
+            "balanceTotal": total,
+            "balanceUsed": 0,
+        } for user_id in user_ids]
+        
+        counts = sync_rows(UserLeaveBalance, rows, ("balanceUserId", "balanceLeaveTypeId", "balanceYear"), ("balanceTotal",))
         db.session.commit()
-        return jsonify({"success": True, "count": len(results), "balances": [b.to_dict() for b in results]})
+        
+        results = UserLeaveBalance.query.filter(
+            UserLeaveBalance.balanceUserId.in_(user_ids),
+            UserLeaveBalance.balanceLeaveTypeId == leave_type_id,
+            UserLeaveBalance.balanceYear == year
+        ).all()
+        return jsonify({"success": True, "count": len(results), **counts, "balances": serialize_all(results)})
 
     @app.route("/api/user-leave-balance", methods=["POST"])
     @token_required
@@ -2586,7 +2587,15 @@ def create_app():
           - name: status
             in: query
             type: string
-            enum: [pending, approved, rejected]
+            enum: [pending, approved, rejected, cancelled]
+          - name: limit
+            in: query
+            type: integer
+            description: Page size (default 100, max 500)
+          - name: cursor
+            in: query
+            type: string
+            description: next_cursor from the previous page
         responses:
           200:
             description: List of leave requests
@@ -2601,8 +2610,15 @@ def create_app():
         if status:
             query = query.filter_by(leaveRequestStatus=status)
         
-        requests = query.order_by(LeaveRequest.leaveRequestCreatedAt.desc()).all()
-        return jsonify({"success": True, "requests": [r.to_dict() for r in requests]})
+        try:
+            limit, cursor = page_args(request.args)
+            requests, next_cursor = paginate(query, [
+                (LeaveRequest.leaveRequestCreatedAt, True),
+                (LeaveRequest.leaveRequestId, True),
+            ], limit, cursor)
+        except PaginationError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        return jsonify({"success": True, "requests": serialize_all(requests), "next_cursor": next_cursor})
 
     @app.route("/api/leave-requests", methods=["POST"])
     @token_required
@@ -2690,12 +2706,7 @@ def create_app():
         if not allotment:
             return jsonify({"success": False, "error": "No leave allotment found"}), 400
         
-        used_leaves = db.session.query(func.sum(LeaveRequest.leaveRequestDays)).filter(
-            LeaveRequest.leaveRequestUserId == user_id,
-            LeaveRequest.leaveRequestLeaveTypeId == leave_type_id,
-            LeaveRequest.leaveRequestStatus == 'approved',
-            func.extract('year', LeaveRequest.leaveRequestFromDate) == year
-        ).scalar() or 0
+        used_leaves = ledger_used([(user_id, leave_type_id, year)])[(int(user_id), int(leave_type_id), year)]
         
         remaining = float(allotment.allotmentTotal) - float(used_leaves)
         if remaining < days:
@@ -2739,18 +2750,17 @@ def create_app():
           200:
             description: Leave request approved
         """
-        from models import LeaveRequest, UserLeaveBalance
         data = request.get_json() or {}
         approved_by = data.get('approved_by')
         
-        leave_request = LeaveRequest.query.get(request_id)
+        leave_request = lock_leave_request(request_id)
         if not leave_request:
             return jsonify({"success": False, "error": "Request not found"}), 404
         
         if leave_request.leaveRequestStatus != 'pending':
             return jsonify({"success": False, "error": "Request already processed"}), 400
         
-        leave_request.leaveRequestStatus = 'approved'
+        set_leave_status(leave_request, 'approved')
         leave_request.leaveRequestApprovedBy = approved_by
         leave_request.leaveRequestApprovedAt = get_ist_now()
         
@@ -2781,24 +2791,53 @@ def create_app():
           200:
             description: Leave request rejected
         """
-        from models import LeaveRequest
         data = request.get_json() or {}
         approved_by = data.get('approved_by')
         
-        leave_request = LeaveRequest.query.get(request_id)
+        leave_request = lock_leave_request(request_id)
         if not leave_request:
             return jsonify({"success": False, "error": "Request not found"}), 404
         
         if leave_request.leaveRequestStatus != 'pending':
             return jsonify({"success": False, "error": "Request already processed"}), 400
         
-        leave_request.leaveRequestStatus = 'rejected'
+        set_leave_status(leave_request, 'rejected')
         leave_request.leaveRequestApprovedBy = approved_by
         leave_request.leaveRequestApprovedAt = get_ist_now()
         
         db.session.commit()
         return jsonify({"success": True, "request": leave_request.to_dict()})
 
+    @app.route("/api/leave-requests/<int:request_id>/cancel", methods=["POST"])
+    @token_required
+    def api_cancel_leave_request(request_id):
+        """
+        Cancel Leave Request
+        ---
+        tags:
+          - Leave Management
+        parameters:
+          - name: request_id
+            in: path
+            type: integer
+            required: true
+        responses:
+          200:
+            description: Leave request cancelled (approved days are returned to the balance)
+          400:
+            description: Request already rejected or cancelled
+        """
+        leave_request = lock_leave_request(request_id)
+        if not leave_request:
+            return jsonify({"success": False, "error": "Request not found"}), 404
+        
+        if leave_request.leaveRequestStatus not in ('pending', 'approved'):
+            return jsonify({"success": False, "error": "Request already processed"}), 400
+        
+        set_leave_status(leave_request, 'cancelled')
+        db.session.commit()
+        return jsonify({"success": True, "request": leave_request.to_dict()})
+
     #  --- Leave Allotment APIs ---
     @app.route("/api/leave-allotments", methods=["GET"])
     @token_required
@@ -2815,11 +2854,18 @@ def create_app():
           - name: year
             in: query
             type: integer
+          - name: limit
+            in: query
+            type: integer
+            description: Page size (default 100, max 500)
+          - name: cursor
+            in: query
+            type: string
+            description: next_cursor from the previous page
         responses:
           200:
             description: List of leave allotments with used/remaining
         """
-        from models import LeaveRequest
         user_id = request.args.get('user_id', type=int)
         year = request.args.get('year', get_ist_now().year, type=int)
         
@@ -2829,20 +2875,24 @@ def create_app():
         if year:
             query = query.filter_by(allotmentYear=year)
         
-        allotments = query.order_by(LeaveAllotment.allotmentAssignedAt.desc()).all()
+        try:
+            limit, cursor = page_args(request.args)
+            allotments, next_cursor = paginate(query, [
+                (LeaveAllotment.allotmentAssignedAt, True),
+                (LeaveAllotment.allotmentId, True),
+            ], limit, cursor)
+        except PaginationError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        usage = ledger_used(
+            (a.allotmentUserId, a.allotmentLeaveTypeId, a.allotmentYear) for a in allotments
+        )
         result = []
-        for a in allotments:
-            used = db.session.query(func.sum(LeaveRequest.leaveRequestDays)).filter(
-                LeaveRequest.leaveRequestUserId == a.allotmentUserId,
-                LeaveRequest.leaveRequestLeaveTypeId == a.allotmentLeaveTypeId,
-                LeaveRequest.leaveRequestStatus == 'approved',
-                func.extract('year', LeaveRequest.leaveRequestFromDate) == a.allotmentYear
-            ).scalar() or 0
-            data = a.to_dict()
+        for a, data in zip(allotments, serialize_all(allotments)):
+            used = usage[(a.allotmentUserId, a.allotmentLeaveTypeId, a.allotmentYear)]
             data['used'] = float(used)
             data['remaining'] = float(a.allotmentTotal) - float(used)
             result.append(data)
-        return jsonify({"success": True, "allotments": result})
+        return jsonify({"success": True, "allotments": result, "next_cursor": next_cursor})
 
     @app.route("/api/leave-allotments", methods=["POST"])
     @token_required
@@ -2949,37 +2999,40 @@ def create_app():
         if not user_ids or not leave_type_id:
             return jsonify({"success": False, "error": "user_ids and leave_type_id required"}), 400
         
-        results = []
-        for user_id in user_ids:
-            existing = LeaveAllotment.query.filter_by(
-                allotmentUserId=user_id,
-                allotmentLeaveTypeId=leave_type_id,
-                allotmentYear=year
-            ).first()
-            
-            if existing:
-                existing.allotmentTotal = total
-                existing.allotmentAssignedBy = assigned_by
-                existing.allotmentUpdatedAt = get_ist_now()
-                results.append(existing)
-            else:
-                allotment = LeaveAllotment(
-                    allotmentUserId=user_id,
-                    allotmentLeaveTypeId=leave_type_id,
-                    allotmentTotal=total,
-                    allotmentYear=year,
-                    allotmentAssignedBy=assigned_by
-                )
-                db.session.add(allotment)
-                results.append(allotment)
+        # Keys must be ints to match the rows sync_rows reads back
+        try:
+            user_ids = [int(uid) for uid in user_ids]
+            leave_type_id, year = int(leave_type_id), int(year)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "user_ids, leave_type_id and year must be integers"}), 400
         
-        db.session.flush()
+        now = get_ist_now()
+        rows = [{
+            "allotmentUserId": user_id,
+            "allotmentLeaveTypeId": leave_type_id,
+            "allotmentYear": year,
+            "allotmentTotal": total,
+            "allotmentAssignedBy": assigned_by,
+            "allotmentAssignedAt": now,
+            "allotmentUpdatedAt": now,
+        } for user_id in user_ids]
+        
+        counts = sync_rows(
+            LeaveAllotment, rows, ("allotmentUserId", "allotmentLeaveTypeId", "allotmentYear"),
+            ("allotmentTotal", "allotmentAssignedBy"), ("allotmentUpdatedAt",)
+        )
         db.session.commit()
         
+        results = LeaveAllotment.query.filter(
+            LeaveAllotment.allotmentUserId.in_(user_ids),
+            LeaveAllotment.allotmentLeaveTypeId == leave_type_id,
+            LeaveAllotment.allotmentYear == year
+        ).all()
+        
         # Verify data was written
         verify_count = LeaveAllotment.query.filter_by(allotmentYear=year, allotmentLeaveTypeId=leave_type_id).count()
         
-        return jsonify({"success": True, "count": len(results), "verified_in_db": verify_count, "allotments": [a.to_dict() for a in results]})
+        return jsonify({"success": True, "count": len(results), **counts, "verified_in_db": verify_count, "allotments": serialize_all(results)})
 
     @app.route("/api/leave-allotments/<int:allotment_id>", methods=["DELETE"])
     @token_required
@@ -3041,11 +3094,15 @@ def create_app():
         """
         from models import LeaveType
         data = request.get_json() or {}
-        year = data.get('year', get_ist_now().year)
+        # Keys must be ints to match the rows sync_rows reads back
+        try:
+            year = int(data.get('year', get_ist_now().year))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "year must be an integer"}), 400
         defaults = data.get('defaults', {'casual': 4, 'sick': 7, 'celebratory': 0.5})
         assigned_by = data.get('assigned_by')
         
-        users = User.query.filter_by(userIsActive='1').all()
+        users = user_directory.active_users()
         if not users:
             return jsonify({"success": False, "error": "No users found"}), 404
         
@@ -3064,33 +3121,23 @@ def create_app():
             'Celebratory Leave': defaults.get('celebratory', 0.5)
         }
         
-        count = 0
-        for user in users:
-            for leave_name, total in mapping.items():
-                leave_type = leave_types[leave_name]
-                allotment = LeaveAllotment.query.filter_by(
-                    allotmentUserId=user.userId,
-                    allotmentLeaveTypeId=leave_type.leaveTypeId,
-                    allotmentYear=year
-                ).first()
-                
-                if allotment:
-                    allotment.allotmentTotal = total
-                    allotment.allotmentAssignedBy = assigned_by
-                    allotment.allotmentUpdatedAt = get_ist_now()
-                else:
-                    allotment = LeaveAllotment(
-                        allotmentUserId=user.userId,
-                        allotmentLeaveTypeId=leave_type.leaveTypeId,
-                        allotmentTotal=total,
-                        allotmentYear=year,
-                        allotmentAssignedBy=assigned_by
-                    )
-                    db.session.add(allotment)
-                count += 1
-        
+        now = get_ist_now()
+        rows = [{
+            "allotmentUserId": user.userId,
+            "allotmentLeaveTypeId": leave_types[leave_name].leaveTypeId,
+            "allotmentYear": year,
+            "allotmentTotal": total,
+            "allotmentAssignedBy": assigned_by,
+            "allotmentAssignedAt": now,
+            "allotmentUpdatedAt": now,
+        } for user in users for leave_name, total in mapping.items()]
+        
+        counts = sync_rows(
+            LeaveAllotment, rows, ("allotmentUserId", "allotmentLeaveTypeId", "allotmentYear"),
+            ("allotmentTotal", "allotmentAssignedBy"), ("allotmentUpdatedAt",)
+        )
         db.session.commit()
-        return jsonify({"success": True, "count": count, "users": len(users)})
+        return jsonify({"success": True, "count": len(rows), "users": len(users), **counts})
 
     @app.route("/api/attendance/monthly-report", methods=["GET"])
     @token_required
@@ -3120,9 +3167,6 @@ def create_app():
           200:
             description: Monthly report generated and saved
         """
-        from models import LeaveRequest
-        from calendar import monthrange
-        
         user_id = request.args.get('user_id', type=int)
         month = request.args.get('month', type=int)
         year = request.args.get('year', type=int)
@@ -3130,122 +3174,16 @@ def create_app():
         if not user_id or not month or not year:
             return jsonify({"success": False, "error": "user_id, month, year required"}), 400
         
-        month_start = dt(year, month, 1, tzinfo=IST)
-        days_in_month = monthrange(year, month)[1]
-        month_end = dt(year, month, days_in_month, 23, 59, 59, tzinfo=IST)
-        
-        records = Attendance.query.filter(
-            Attendance.attendanceUserId == user_id,
-            Attendance.attendanceTimestamp >= month_start,
-            Attendance.attendanceTimestamp <= month_end,
-            Attendance.attendanceClockInTime.isnot(None)
-        ).all()
-        
-        holidays = Holiday.query.filter(
-            func.extract('year', Holiday.holidayDate) == year,
-            func.extract('month', Holiday.holidayDate) == month
-        ).all()
-        holiday_dates = {h.holidayDate for h in holidays}
-        weekoff_dates = {h.holidayDate for h in holidays if h.holidayIsWeekoff}
-        
-        leaves = LeaveRequest.query.filter(
-            LeaveRequest.leaveRequestUserId == user_id,
-            LeaveRequest.leaveRequestStatus == 'approved',
-            LeaveRequest.leaveRequestFromDate <= month_end.date(),
-            LeaveRequest.leaveRequestToDate >= month_start.date()
-        ).all()
-        leave_days = sum(l.leaveRequestDays for l in leaves)
-        
-        # Group leaves by type
-        leave_summary = {}
-        for l in leaves:
-            lt = LeaveType.query.get(l.leaveRequestLeaveTypeId)
-            if lt:
-                if lt.leaveTypeName not in leave_summary:
-                    leave_summary[lt.leaveTypeName] = {
-                        'type': lt.leaveTypeName,
-                        'days': 0,
-                        'is_paid': bool(lt.leaveTypeIsPaid)
-                    }
-                leave_summary[lt.leaveTypeName]['days'] += float(l.leaveRequestDays)
-        
-        leave_details = list(leave_summary.values())
-        
-        total_hours = 0
-        on_time = 0
-        late_in = 0
-        early_out = 0
-        
-        for r in records:
-            if r.attendanceClockInTime and r.attendanceClockOutTime:
-                break_duration = 0
-                if r.attendanceBreakInTime and r.attendanceBreakOutTime:
-                    break_duration = (r.attendanceBreakOutTime - r.attendanceBreakInTime).total_seconds() / 3600
-                work_duration = (r.attendanceClockOutTime - r.attendanceClockInTime).total_seconds() / 3600 - break_duration
-                total_hours += work_duration
-            
-            if r.attendanceClockInTime and r.attendanceClockInTime.hour < 10:
-                on_time += 1
-            elif r.attendanceClockInTime:
-                late_in += 1
-            
-            if r.attendanceClockOutTime and r.attendanceClockOutTime.hour < 18:
-                early_out += 1
-        
-        worked_days = len(records)
-        total_weekoffs = len(weekoff_dates)
-        total_holidays = len(holiday_dates) - total_weekoffs
-        working_days = days_in_month - total_weekoffs - total_holidays
-        absent_days = working_days - worked_days - leave_days
-        
-        report_data = {
-            "user_id": user_id,
-            "month": month,
-            "year": year,
-            "total_working_hours": round(total_hours, 2),
-            "worked_days": worked_days,
-            "total_weekly_off": total_weekoffs,
-            "holidays": total_holidays,
-            "leaves_taken": leave_days,
-            "leave_details": leave_details,
-            "on_time_entries": on_time,
-            "early_out": early_out,
-            "late_in": late_in,
-            "absent_days": max(0, absent_days)
-        }
-        
-        import json
-        leave_details_json = json.dumps(leave_details)
-        
-        existing = MonthlyReport.query.filter_by(reportUserId=user_id, reportMonth=month, reportYear=year).first()
-        if existing:
-            existing.reportTotalWorkingHours = report_data['total_working_hours']
-            existing.reportWorkedDays = report_data['worked_days']
-            existing.reportTotalWeeklyOff = report_data['total_weekly_off']
-            existing.reportHolidays = report_data['holidays']
-            existing.reportLeavesTaken = report_data['leaves_taken']
-            existing.reportLeaveDetails = leave_details_json
-            existing.reportOnTimeEntries = report_data['on_time_entries']
-            existing.reportEarlyOut = report_data['early_out']
-            existing.reportLateIn = report_data['late_in']
-            existing.reportAbsentDays = report_data['absent_days']
-        else:
-            existing = MonthlyReport(
-                reportUserId=user_id, reportMonth=month, reportYear=year,
-                reportTotalWorkingHours=report_data['total_working_hours'],
-                reportWorkedDays=report_data['worked_days'],
-                reportTotalWeeklyOff=report_data['total_weekly_off'],
-                reportHolidays=report_data['holidays'],
-                reportLeavesTaken=report_data['leaves_taken'],
-                reportLeaveDetails=leave_details_json,
-                reportOnTimeEntries=report_data['on_time_entries'],
-                reportEarlyOut=report_data['early_out'],
-                reportLateIn=report_data['late_in'],
-                reportAbsentDays=report_data['absent_days']
-            )
-            db.session.add(existing)
-        db.session.commit()
-        return jsonify({"success": True, "report": report_data})
+        def build():
+            report_data = build_monthly_reports(year, month, [user_id])[0]
+            save_monthly_reports([report_data])
+            return json.dumps({"success": True, "report": report_data})
+
+        first_day = date(year, month, 1)
+        return cached_report(
+            "attendance-monthly-report", [user_id, year, month],
+            month_scopes(user_id, first_day, first_day) + [CALENDAR_SCOPE], build
+        )
     
     @app.route("/api/monthly-reports", methods=["GET"])
     @token_required
@@ -3264,19 +3202,42 @@ def create_app():
             in: query
             type: integer
             description: Filter by year
+          - name: limit
+            in: query
+            type: integer
+            description: Page size (default 100, max 500)
+          - name: cursor
+            in: query
+            type: string
+            description: next_cursor from the previous page
         responses:
           200:
             description: List of saved monthly reports
         """
         user_id = request.args.get('user_id', type=int)
         year = request.args.get('year', type=int)
-        query = MonthlyReport.query
-        if user_id:
-            query = query.filter_by(reportUserId=user_id)
-        if year:
-            query = query.filter_by(reportYear=year)
-        reports = query.order_by(MonthlyReport.reportYear.desc(), MonthlyReport.reportMonth.desc()).all()
-        return jsonify({"success": True, "reports": [r.to_dict() for r in reports]})
+
+        def build():
+            query = MonthlyReport.query
+            if user_id:
+                query = query.filter_by(reportUserId=user_id)
+            if year:
+                query = query.filter_by(reportYear=year)
+            try:
+                limit, cursor = page_args(request.args)
+                reports, next_cursor = paginate(query, [
+                    (MonthlyReport.reportYear, True),
+                    (MonthlyReport.reportMonth, True),
+                    (MonthlyReport.reportId, True),
+                ], limit, cursor)
+            except PaginationError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            return json.dumps({"success": True, "reports": serialize_all(reports), "next_cursor": next_cursor})
+
+        return cached_report(
+            "monthly-reports", [user_id, year, request.args.get('limit'), request.args.get('cursor')],
+            [SAVED_MONTHLY_SCOPE], build
+        )
     
     @app.route("/monthly-reports")
     def monthly_reports_view():
@@ -3284,7 +3245,7 @@ def create_app():
 
     @app.route("/user-attendance-detail")
     def user_attendance_detail_view():
-        users = User.query.filter_by(userIsActive='1').order_by(User.userFirstName.asc()).all()
+        users = sorted(user_directory.active_users(), key=lambda u: u.userFirstName or '')
         return render_template("user_attendance_detail.html", users=users)
 
     @app.route("/api/attendance/user-detail", methods=["GET"])
@@ -3299,7 +3260,7 @@ def create_app():
         if not user_id:
             return jsonify({"success": False, "error": "userId required"}), 400
         
-        user = User.query.filter_by(userId=user_id, userIsActive='1').first()
+        user = user_directory.get_active(user_id)
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
         
@@ -3307,71 +3268,42 @@ def create_app():
         now = get_ist_now()
         
         if date_param and month and year:
-            start_date = datetime(year, month, date_param, 0, 0, 0, tzinfo=IST)
-            end_date = datetime(year, month, date_param, 23, 59, 59, tzinfo=IST)
+            start_date, end_date = day_bounds(date(year, month, date_param), date(year, month, date_param))
         elif month and year:
             days_in_month = monthrange(year, month)[1]
-            start_date = datetime(year, month, 1, 0, 0, 0, tzinfo=IST)
-            end_date = datetime(year, month, days_in_month, 23, 59, 59, tzinfo=IST)
+            start_date, end_date = day_bounds(date(year, month, 1), date(year, month, days_in_month))
         elif date_param:
-            start_date = datetime(now.year, now.month, date_param, 0, 0, 0, tzinfo=IST)
-            end_date = datetime(now.year, now.month, date_param, 23, 59, 59, tzinfo=IST)
+            start_date, end_date = day_bounds(date(now.year, now.month, date_param), date(now.year, now.month, date_param))
         elif month:
             days_in_month = monthrange(now.year, month)[1]
-            start_date = datetime(now.year, month, 1, 0, 0, 0, tzinfo=IST)
-            end_date = datetime(now.year, month, days_in_month, 23, 59, 59, tzinfo=IST)
+            start_date, end_date = day_bounds(date(now.year, month, 1), date(now.year, month, days_in_month))
         else:
-            start_date = (now - timedelta(days=6)).replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = now
-        
-        records = Attendance.query.filter(
-            Attendance.attendanceUserId == user_id,
-            Attendance.attendanceTimestamp >= start_date,
-            Attendance.attendanceTimestamp <= end_date,
-            Attendance.attendanceClockInTime.isnot(None)
-        ).order_by(Attendance.attendanceTimestamp.asc()).all()
-        
-        details = []
-        for r in records:
-            worked_hours = 0
-            pending_hours = 0
+            start_date, end_date = day_bounds((now - timedelta(days=6)).date(), now.date())
+        
+        def build():
+            # Summaries are maintained on every punch and manual entry write
+            summaries = DailyAttendanceSummary.query.filter(
+                DailyAttendanceSummary.summaryUserId == user_id,
+                DailyAttendanceSummary.summaryDate >= start_date.date(),
+                DailyAttendanceSummary.summaryDate < end_date.date()
+            ).order_by(DailyAttendanceSummary.summaryDate.asc()).all()
             
-            if r.attendanceClockInTime and r.attendanceClockOutTime:
-                break_duration = 0
-                if r.attendanceBreakInTime and r.attendanceBreakOutTime:
-                    break_duration = (r.attendanceBreakOutTime - r.attendanceBreakInTime).total_seconds() / 3600
-                worked_hours = (r.attendanceClockOutTime - r.attendanceClockInTime).total_seconds() / 3600 - break_duration
-                standard_hours = float(Settings.get('standard_working_hours', 9))
-                pending_hours = worked_hours - standard_hours
-                
-                summary = DailyAttendanceSummary.query.filter_by(
-                    summaryUserId=user_id,
-                    summaryDate=r.attendanceTimestamp.date()
-                ).first()
-                if not summary:
-                    summary = DailyAttendanceSummary(
-                        summaryUserId=user_id,
-                        summaryDate=r.attendanceTimestamp.date(),
-                        summaryClockInTime=r.attendanceClockInTime,
-                        summaryClockOutTime=r.attendanceClockOutTime,
-                        summaryWorkedHours=round(worked_hours, 2),
-                        summaryPendingHours=round(pending_hours, 2)
-                    )
-                    db.session.add(summary)
-            
-            details.append(OrderedDict([
-                ("user_full_name", user_name),
-                ("date", r.attendanceTimestamp.strftime("%Y-%m-%d")),
-                ("clock_in_time", r.attendanceClockInTime.strftime("%H:%M:%S") if r.attendanceClockInTime else None),
-                ("clock_out_time", r.attendanceClockOutTime.strftime("%H:%M:%S") if r.attendanceClockOutTime else None),
-                ("worked_hours", round(worked_hours, 2)),
-                ("pending_hours", round(pending_hours, 2))
-            ]))
+            details = []
+            for summary in summaries:
+                details.append(OrderedDict([
+                    ("user_full_name", user_name),
+                    ("date", summary.summaryDate.strftime("%Y-%m-%d")),
+                    ("clock_in_time", summary.summaryClockInTime.strftime("%H:%M:%S") if summary.summaryClockInTime else None),
+                    ("clock_out_time", summary.summaryClockOutTime.strftime("%H:%M:%S") if summary.summaryClockOutTime else None),
+                    ("worked_hours", float(summary.summaryWorkedHours or 0)),
+                    ("pending_hours", float(summary.summaryPendingHours or 0))
+                ]))
+            return json.dumps({"success": True, "user_name": user_name, "details": details})
         
-        db.session.commit()
-        return Response(
-            json.dumps({"success": True, "user_name": user_name, "details": details}),
-            mimetype='application/json'
+        last_day = (end_date - timedelta(days=1)).date()
+        return cached_report(
+            "user-detail", [user_id, user_name, start_date.date(), last_day],
+            month_scopes(user_id, start_date.date(), last_day), build
         )
 
     return app
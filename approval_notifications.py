@@ -0,0 +1,342 @@
+"""
+Approval notifications
+Approval changes write events to mtpl_approval_outbox in the same transaction. A
+background dispatcher claims the outbox in batches (a short transaction that
+only marks the rows), delivers each event outside any transaction to the
+recipient's open SSE streams, an optional webhook and optional e-mail (SMTP),
+then records which channels each event reached, so approvers no longer need to
+poll their inbox. A retry only repeats the channels that failed.
+
+SSE streams are fanned out in-process, so the dispatcher and the streams must
+run in the same (single) app process.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import urllib.request
+from datetime import timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import insert, or_, update
+
+from database import db
+from models import get_ist_now
+from multilevel_models import LeaveApprover, LeaveApproval, ApprovalOutbox
+
+DISPATCH_INTERVAL = 2  # seconds between outbox scans when nothing wakes the dispatcher
+DISPATCH_BATCH_SIZE = 200
+MAX_ATTEMPTS = 5  # events failing this often stay in the outbox for inspection
+CLAIM_TIMEOUT = 20 * 60  # seconds before a batch claimed by a dead dispatcher is retried
+WEBHOOK_URL = os.environ.get('APPROVAL_WEBHOOK_URL')
+WEBHOOK_TIMEOUT = 5
+SMTP_HOST = os.environ.get('SMTP_HOST')  # e.g. a local stand-in: python -m aiosmtpd -n -l localhost:1025
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 1025))
+MAIL_FROM = os.environ.get('NOTIFY_MAIL_FROM', 'attendance@localhost')
+MAIL_DOMAIN = os.environ.get('NOTIFY_EMAIL_DOMAIN')  # recipient is <userLogin>@<domain>
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+SSE_QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_events(events):
+    """Add (event_type, recipient_user_id, payload) events to the outbox. Does not commit."""
+    if not events:
+        return 0
+    now = get_ist_now()
+    db.session.execute(insert(ApprovalOutbox).values([{
+        "outboxEventType": event_type,
+        "outboxRecipientUserId": recipient,
+        "outboxPayload": json.dumps(payload),
+        "outboxAttempts": 0,
+        "outboxCreatedAt": now,
+    } for event_type, recipient, payload in events]))
+    return len(events)
+
+
+def notify_ready_approvers(leave_request_id, unlock_count, event_type):
+    """Queue event_type for the approvers of a request whose level just became decidable"""
+    rows = db.session.query(
+        LeaveApproval.approvalId, LeaveApproval.approvalLevel, LeaveApprover.approverUserId
+    ).join(
+        LeaveApprover, LeaveApprover.approverId == LeaveApproval.approvalApproverId
+    ).filter(
+        LeaveApproval.approvalLeaveRequestId == leave_request_id,
+        LeaveApproval.approvalStatus == 'pending',
+        LeaveApproval.approvalUnlockCount == unlock_count
+    ).all()
+    return enqueue_events([(event_type, approver_user_id, {
+        "leave_request_id": leave_request_id,
+        "approval_id": approval_id,
+        "level": level,
+    }) for approval_id, level, approver_user_id in rows])
+
+
+def notify_requester(leave_request):
+    """Queue the final decision on a leave request for the employee who asked for it"""
+    return enqueue_events([(f"leave_request.{leave_request.leaveRequestStatus}", leave_request.leaveRequestUserId, {
+        "leave_request_id": leave_request.leaveRequestId,
+        "status": leave_request.leaveRequestStatus,
+        "from_date": leave_request.leaveRequestFromDate.isoformat(),
+        "to_date": leave_request.leaveRequestToDate.isoformat(),
+    })])
+
+
+class EventBroker:
+    """In-process fan-out to open SSE streams, keyed by recipient user id"""
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set(queue.Queue)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client misses events; it can still reload its inbox
+
+
+def _post_webhook(event):
+    req = urllib.request.Request(
+        WEBHOOK_URL, data=json.dumps(event).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    with urllib.request.urlopen(req, timeout=WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+
+def _send_emails(smtp, events):
+    """Send one mail per event; returns {outboxId: error} for the messages that failed"""
+    from user_directory import user_directory
+
+    users = user_directory.get_many({e["recipient_user_id"] for e in events})
+    failed = {}
+    for event in events:
+        user = users.get(event["recipient_user_id"])
+        if user is None or not user.userLogin:
+            continue
+        message = EmailMessage()
+        message['From'] = MAIL_FROM
+        message['To'] = f"{user.userLogin}@{MAIL_DOMAIN}"
+        message['Subject'] = f"Leave request {event['data']['leave_request_id']}: {event['type']}"
+        message.set_content(json.dumps(event['data'], indent=2))
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPException as e:
+            failed[event["id"]] = e
+    return failed
+
+
+def _channels():
+    """Channels every event has to reach before it counts as dispatched"""
+    channels = {'sse'}
+    if WEBHOOK_URL:
+        channels.add('webhook')
+    if SMTP_HOST and MAIL_DOMAIN:
+        channels.add('email')
+    return channels
+
+
+class OutboxDispatcher:
+    """Drains mtpl_approval_outbox in batches on a background thread"""
+
+    def __init__(self, interval=DISPATCH_INTERVAL, batch_size=DISPATCH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._app = None
+        self._thread = None
+
+    def start(self, app):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name='approval-outbox', daemon=True)
+            self._thread.start()
+        atexit.register(self.drain)
+
+    def wake(self):
+        """Dispatch now instead of at the next interval (call after committing events)"""
+        self._wakeup.set()
+
+    def _deliver(self, claimed):
+        """Deliver (event, channels already reached) pairs on their missing channels.
+
+        Returns {outboxId: (channels reached, [errors])}.
+        """
+        channels = _channels()
+        results = {}
+        mail = []
+        for event, reached in claimed:
+            reached, errors = set(reached), []
+            if 'sse' not in reached:
+                broker.publish(event["recipient_user_id"], event)
+                reached.add('sse')
+            if 'webhook' in channels and 'webhook' not in reached:
+                try:
+                    _post_webhook(event)
+                    reached.add('webhook')
+                except Exception as e:
+                    errors.append(f"webhook: {e}")
+            if 'email' in channels and 'email' not in reached:
+                mail.append(event)
+            results[event["id"]] = (reached, errors)
+        if mail:
+            try:
+                with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=WEBHOOK_TIMEOUT) as smtp:
+                    mail_failed = _send_emails(smtp, mail)
+            except Exception as e:
+                # No connection: none of the mails went out
+                mail_failed = {event["id"]: e for event in mail}
+            for event in mail:
+                reached, errors = results[event["id"]]
+                if event["id"] in mail_failed:
+                    errors.append(f"smtp: {mail_failed[event['id']]}")
+                else:
+                    reached.add('email')
+        return results
+
+    def _claim(self):
+        """Mark one batch as in flight and commit, so no lock is held while delivering"""
+        now = get_ist_now()
+        # Streams are in-process, so one app process dispatches (see the module
+        # docstring); the lock only keeps a stray second dispatcher off this batch
+        rows = ApprovalOutbox.query.filter(
+            ApprovalOutbox.outboxDispatchedAt.is_(None),
+            ApprovalOutbox.outboxAttempts < MAX_ATTEMPTS,
+            or_(ApprovalOutbox.outboxClaimedUntil.is_(None), ApprovalOutbox.outboxClaimedUntil < now)
+        ).order_by(ApprovalOutbox.outboxId).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        for row in rows:
+            row.outboxAttempts += 1
+            row.outboxClaimedUntil = now + timedelta(seconds=CLAIM_TIMEOUT)
+        claimed = [(row.to_event(), row.delivered_channels()) for row in rows]
+        db.session.commit()
+        return claimed
+
+    def _record(self, results):
+        now = get_ist_now()
+        channels = _channels()
+        dispatched = [outbox_id for outbox_id, (reached, _) in results.items() if channels <= reached]
+        if dispatched:
+            db.session.execute(
+                update(ApprovalOutbox).where(ApprovalOutbox.outboxId.in_(dispatched))
+                .values(outboxDispatchedAt=now, outboxClaimedUntil=None, outboxLastError=None,
+                        outboxDeliveredChannels=",".join(sorted(channels))),
+                execution_options={"synchronize_session": False}
+            )
+        for outbox_id, (reached, errors) in results.items():
+            if outbox_id in dispatched:
+                continue
+            db.session.execute(
+                update(ApprovalOutbox).where(ApprovalOutbox.outboxId == outbox_id)
+                .values(outboxClaimedUntil=None, outboxLastError="; ".join(errors)[:500],
+                        outboxDeliveredChannels=",".join(sorted(reached))),
+                execution_options={"synchronize_session": False}
+            )
+        db.session.commit()
+
+    def drain(self):
+        """Dispatch one batch of pending events; returns the number claimed"""
+        if self._app is None:
+            return 0
+        with self._app.app_context():
+            try:
+                claimed = self._claim()
+                if not claimed:
+                    return 0
+                # No transaction is open here: slow webhooks or SMTP never block outbox inserts
+                self._record(self._deliver(claimed))
+                return len(claimed)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Approval outbox dispatch failed: %s", e)
+                return 0
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            # Keep going while full batches come back
+            while self.drain() >= self.batch_size:
+                pass
+
+
+broker = EventBroker()
+approval_dispatcher = OutboxDispatcher()
+
+
+def add_approval_notification_routes(app, db):
+    from flask import Response, jsonify, request, stream_with_context
+    from auth import token_required
+
+    @app.route("/api/approval-events/stream/<int:user_id>", methods=["GET"])
+    @token_required
+    def api_approval_event_stream(user_id):
+        """
+        Approval Event Stream
+        ---
+        tags:
+          - Multi-Level Approval
+        parameters:
+          - name: user_id
+            in: path
+            type: integer
+            required: true
+            description: Approver (or requester) user ID; must be the authenticated user
+        produces:
+          - text/event-stream
+        responses:
+          200:
+            description: Server-sent events (approval.assigned, approval.unlocked, leave_request.approved, leave_request.rejected)
+          403:
+            description: user_id is not the authenticated user
+        """
+        if request.user_id != user_id:
+            return jsonify({"success": False, "error": "You can only subscribe to your own approval events"}), 403
+        # The stream stays open for long; give the pooled connection back first
+        db.session.close()
+        q = broker.subscribe(user_id)
+
+        def stream():
+            try:
+                yield "retry: 5000\n\n"
+                while True:
+                    try:
+                        event = q.get(timeout=SSE_HEARTBEAT)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            finally:
+                broker.unsubscribe(user_id, q)
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
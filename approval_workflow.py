@@ -0,0 +1,116 @@
+"""
+Multi-level approval workflow
+Each leave request carries counters of required, approved and rejected approvals.
+A decision claims its approval row and bumps a counter with single UPDATEs; the
+request's final move to approved/rejected is a conditional UPDATE on
+status = 'pending', so exactly one decision performs it and no sibling approvals
+are reloaded. Approvals have levels: a level can only be decided once every
+approval at the earlier levels is approved. Approvers whose level becomes
+decidable, and the requester on the final decision, are notified through the
+approval outbox.
+"""
+from sqlalchemy import insert, update
+
+from approval_notifications import notify_ready_approvers, notify_requester
+from database import db
+from leave_balances import apply_ledger
+from models import LeaveRequest, get_ist_now
+from multilevel_models import LeaveApproval
+
+
+class ApprovalError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def build_approvals(leave_request, approver_ids, sequential=False):
+    """Approval rows for approver_ids (dicts for insert_approvals); resets leave_request's counters.
+
+    With sequential=True the approvers form an ordered chain (level 1, 2, ...);
+    otherwise they all sit on level 1 and may decide in any order.
+    """
+    now = get_ist_now()
+    rows = [{
+        "approvalLeaveRequestId": leave_request.leaveRequestId,
+        "approvalApproverId": approver_id,
+        "approvalUserId": leave_request.leaveRequestUserId,
+        "approvalStatus": 'pending',
+        "approvalLevel": index + 1 if sequential else 1,
+        "approvalUnlockCount": index if sequential else 0,
+        "approvalCreatedAt": now,
+    } for index, approver_id in enumerate(approver_ids)]
+    leave_request.leaveRequestApprovalsRequired = len(rows)
+    leave_request.leaveRequestApprovalsApproved = 0
+    leave_request.leaveRequestApprovalsRejected = 0
+    return rows
+
+
+def insert_approvals(rows):
+    """Write approval rows with one multi-row INSERT and notify the first level. Does not commit."""
+    if rows:
+        db.session.execute(insert(LeaveApproval).values(rows))
+        notify_ready_approvers(rows[0]["approvalLeaveRequestId"], 0, 'approval.assigned')
+    return len(rows)
+
+
+def decide_approval(approval_id, decision, comments=''):
+    """Record an approver's decision ('approved' or 'rejected').
+
+    Returns (approval, leave_request) reloaded after the update; raises
+    ApprovalError when the approval is missing, already decided, still waiting
+    for an earlier level, or its request is no longer pending. Does not commit.
+    """
+    approval = db.session.get(LeaveApproval, approval_id)
+    if not approval:
+        raise ApprovalError("Approval not found", 404)
+    leave_request = db.session.get(LeaveRequest, approval.approvalLeaveRequestId)
+    if not leave_request:
+        raise ApprovalError("Leave request not found", 404)
+    if leave_request.leaveRequestStatus != 'pending':
+        raise ApprovalError(f"Leave request already {leave_request.leaveRequestStatus}")
+    # The approved counter only grows, so a stale read can only refuse too early
+    if approval.approvalUnlockCount > leave_request.leaveRequestApprovalsApproved:
+        raise ApprovalError("Waiting for an earlier approval level")
+
+    now = get_ist_now()
+    claimed = db.session.execute(
+        update(LeaveApproval).where(
+            LeaveApproval.approvalId == approval_id,
+            LeaveApproval.approvalStatus == 'pending'
+        ).values(approvalStatus=decision, approvalComments=comments, approvalApprovedAt=now),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    if not claimed:
+        raise ApprovalError("Already processed")
+
+    request_id = leave_request.leaveRequestId
+    counter = LeaveRequest.leaveRequestApprovalsApproved if decision == 'approved' else LeaveRequest.leaveRequestApprovalsRejected
+    db.session.execute(
+        update(LeaveRequest).where(LeaveRequest.leaveRequestId == request_id).values({counter: counter + 1}),
+        execution_options={"synchronize_session": False}
+    )
+
+    final = update(LeaveRequest).where(
+        LeaveRequest.leaveRequestId == request_id,
+        LeaveRequest.leaveRequestStatus == 'pending'
+    )
+    if decision == 'approved':
+        final = final.where(
+            LeaveRequest.leaveRequestApprovalsRejected == 0,
+            LeaveRequest.leaveRequestApprovalsApproved >= LeaveRequest.leaveRequestApprovalsRequired
+        )
+    transitioned = db.session.execute(
+        final.values(leaveRequestStatus=decision, leaveRequestApprovedAt=now),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+
+    db.session.expire(approval)
+    db.session.expire(leave_request)
+    if transitioned:
+        apply_ledger(leave_request, 'pending', decision)
+        notify_requester(leave_request)
+    elif decision == 'approved':
+        # Sequential chains: the next level may just have been unlocked
+        notify_ready_approvers(request_id, leave_request.leaveRequestApprovalsApproved, 'approval.unlocked')
+    return approval, leave_request
@@ -0,0 +1,48 @@
+"""
+Approver routing table
+Keeps userId -> ordered approver ids (from mtpl_user_approvers) in memory so leave
+submission does not query the assignments for every request. Reloaded in one
+query after the user-approver endpoints change it, and periodically to pick up
+edits made by other processes.
+"""
+import threading
+import time
+
+from database import db
+from user_approvers_model import UserApprover
+
+ROUTING_REFRESH_INTERVAL = 300  # seconds
+
+
+class ApproverRouting:
+    def __init__(self):
+        self._routes = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        rows = db.session.query(
+            UserApprover.userApproverUserId, UserApprover.userApproverApproverId
+        ).filter(
+            UserApprover.userApproverIsActive == True
+        ).order_by(UserApprover.userApproverUserId, UserApprover.userApproverId).all()
+        routes = {}
+        for user_id, approver_id in rows:
+            routes.setdefault(user_id, []).append(approver_id)
+        with self._lock:
+            self._routes = {user_id: tuple(ids) for user_id, ids in routes.items()}
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Reload the table on next access"""
+        with self._lock:
+            self._loaded_at = None
+
+    def approvers_for(self, user_id):
+        """Approver ids assigned to user_id, in assignment order"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ROUTING_REFRESH_INTERVAL:
+            self.load()
+        return self._routes.get(int(user_id), ())
+
+
+approver_routing = ApproverRouting()
@@ -0,0 +1,114 @@
+"""
+Live attendance events
+Clock-in/out, break and live-mark writes publish the serialized attendance row to
+an in-process ring buffer of recent events with consecutive ids. Viewers pass the
+last id they saw (since=<event_id>) and get only the newer events, read from the
+end of the buffer in O(new); with wait=<seconds> the request blocks until an
+event arrives (long-poll), and /api/attendance/events/stream pushes them as
+server-sent events. A since that the buffer no longer covers (evicted, or from
+before a restart) is answered with reset=true so the viewer reloads in full.
+"""
+import json
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+EVENT_BUFFER_SIZE = 1000
+MAX_WAIT = 30  # seconds a long-poll may block
+SSE_HEARTBEAT = 15
+
+
+class AttendanceEventBus:
+    def __init__(self, maxlen=EVENT_BUFFER_SIZE):
+        self._events = deque(maxlen=maxlen)
+        # Ids continue from the start time (ms) so ids from an earlier process are
+        # always older than this buffer and never mistaken for a current position
+        self._last_id = int(time.time() * 1000)
+        self._changed = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event_type, attendance):
+        """Append an event for a committed attendance row (its to_dict()); returns the event id"""
+        with self._changed:
+            self._last_id += 1
+            self._events.append({"id": self._last_id, "type": event_type, "attendance": attendance})
+            self._changed.notify_all()
+            return self._last_id
+
+    def _since(self, event_id):
+        new = self._last_id - event_id
+        if new < 0 or new > len(self._events):
+            return None
+        return list(islice(reversed(self._events), new))[::-1]
+
+    def since(self, event_id):
+        """Events after event_id, oldest first; None when the buffer no longer covers event_id"""
+        with self._changed:
+            return self._since(event_id)
+
+    def wait(self, event_id, timeout):
+        """since(), blocking up to timeout seconds while there is nothing newer"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._last_id != event_id, timeout)
+            return self._since(event_id)
+
+
+attendance_events = AttendanceEventBus()
+
+
+def add_attendance_event_routes(app, db):
+    from flask import Response, request, stream_with_context
+    from auth import token_required
+
+    @app.route("/api/attendance/events/stream", methods=["GET"])
+    @token_required
+    def api_attendance_event_stream():
+        """
+        Attendance Event Stream
+        ---
+        tags:
+          - Attendance
+        parameters:
+          - name: since
+            in: query
+            type: integer
+            required: false
+            description: Last event id already seen (the Last-Event-ID header is used on reconnect)
+        produces:
+          - text/event-stream
+        responses:
+          200:
+            description: Server-sent events (clock_in, clock_out, break_in, break_out, live_mark, reset)
+        """
+        last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', type=int)
+        if last_id is None:
+            last_id = attendance_events.last_id
+        # The stream stays open for long; give the pooled connection back first
+        db.session.close()
+
+        def stream():
+            position = last_id
+            yield "retry: 5000\n\n"
+            while True:
+                events = attendance_events.wait(position, SSE_HEARTBEAT)
+                if events is None:
+                    # Missed events: the client reloads /api/attendance/latest and carries on from here
+                    position = attendance_events.last_id
+                    yield f"id: {position}\nevent: reset\ndata: {{}}\n\n"
+                    continue
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                position = events[-1]["id"]
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
@@ -0,0 +1,181 @@
+"""
+Per-day attendance rollups
+mtpl_daily_attendance_rollups keeps one row of dashboard counts per day (clock-ins,
+present, late, overtime, headcount). Rows are incremented on clock-in/clock-out and
+missing days are computed with a single GROUP BY DATE(...) query. Computed rows are
+only inserted, never written over a row, so no increment is lost.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+
+from bulk_ops import upsert_rows, increment_rows
+from database import db
+from models import Attendance, DailyAttendanceRollup, Person, get_ist_now, day_bounds
+from work_hours import LATE_HOUR, OVERTIME_HOUR
+
+ROLLUP_COLUMNS = (
+    "rollupClockIns", "rollupPresent", "rollupLate", "rollupOvertime", "rollupHeadcount", "rollupUpdatedAt",
+)
+
+
+def _late():
+    return func.sum(case((func.extract('hour', Attendance.attendanceClockInTime) >= LATE_HOUR, 1), else_=0))
+
+
+def _overtime():
+    return func.sum(case((func.extract('hour', Attendance.attendanceClockOutTime) >= OVERTIME_HOUR, 1), else_=0))
+
+
+def day_counts(work_date):
+    """Live counts for one day with conditional sums: (all punches, clock-ins, present, late, overtime)"""
+    clocked_in = Attendance.attendanceClockInTime.isnot(None)
+    total, clock_ins, present, late, overtime = db.session.query(
+        func.count(Attendance.attendanceId),
+        func.sum(case((clocked_in, 1), else_=0)),
+        func.count(func.distinct(case((clocked_in, Attendance.attendanceUserId)))),
+        _late(),
+        _overtime(),
+    ).filter(Attendance.in_period(*day_bounds(work_date, work_date))).one()
+    return total, int(clock_ins or 0), present, int(late or 0), int(overtime or 0)
+
+
+def compute_rollups(start_date, end_date):
+    """{date: rollup row} for every day in start_date..end_date, from one grouped query"""
+    range_start, range_end = day_bounds(start_date, end_date)
+    day = func.date(Attendance.attendanceTimestamp)
+    grouped = db.session.query(
+        day,
+        func.count(Attendance.attendanceId),
+        func.count(func.distinct(Attendance.attendanceUserId)),
+        _late(),
+        _overtime(),
+    ).filter(
+        Attendance.in_period(range_start, range_end),
+        Attendance.attendanceClockInTime.isnot(None)
+    ).group_by(day).all()
+
+    counts = {}
+    for row_day, clock_ins, present, late, overtime in grouped:
+        if isinstance(row_day, str):
+            row_day = datetime.strptime(row_day, "%Y-%m-%d").date()
+        counts[row_day] = (clock_ins, present, int(late or 0), int(overtime or 0))
+
+    headcount = Person.query.count()
+    now = get_ist_now()
+    rows = {}
+    current = start_date
+    while current <= end_date:
+        clock_ins, present, late, overtime = counts.get(current, (0, 0, 0, 0))
+        rows[current] = {
+            "rollupDate": current,
+            "rollupClockIns": clock_ins,
+            "rollupPresent": present,
+            "rollupLate": late,
+            "rollupOvertime": overtime,
+            "rollupHeadcount": headcount,
+            "rollupUpdatedAt": now,
+        }
+        current += timedelta(days=1)
+    return rows
+
+
+def _insert_missing(rows):
+    # Re-setting the key is a no-op: a row a concurrent punch already counted into is kept
+    upsert_rows(DailyAttendanceRollup, rows, ("rollupDate",), ("rollupDate",))
+
+
+def get_rollups(start_date, end_date):
+    """{date: DailyAttendanceRollup} for start_date..end_date; days not stored yet are computed and saved"""
+    rollups = {r.rollupDate: r for r in DailyAttendanceRollup.query.filter(
+        DailyAttendanceRollup.rollupDate >= start_date,
+        DailyAttendanceRollup.rollupDate <= end_date
+    )}
+    missing = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    missing = [d for d in missing if d not in rollups]
+    if missing:
+        computed = compute_rollups(min(missing), max(missing))
+        _insert_missing([computed[d] for d in missing])
+        db.session.commit()
+        rollups.update({r.rollupDate: r for r in DailyAttendanceRollup.query.filter(
+            DailyAttendanceRollup.rollupDate.in_(missing)
+        )})
+    return rollups
+
+
+def _apply(work_date, deltas):
+    """Add deltas (the change of the flushed row) to the day's rollup"""
+    exists = db.session.query(DailyAttendanceRollup.rollupId).filter_by(rollupDate=work_date).first()
+    if exists is None:
+        # First punch of the day (or a day never rolled up): start from the committed rows.
+        # Concurrent first punches insert the same baseline, only one row is kept and
+        # each of them still adds its own deltas below.
+        row = compute_rollups(work_date, work_date)[work_date]
+        for column, delta in deltas.items():
+            row[column] -= delta
+        _insert_missing([row])
+    increment_rows(DailyAttendanceRollup, [dict(deltas, rollupDate=work_date)], ("rollupDate",), tuple(deltas))
+
+
+def record_clock_in(record):
+    """Count a new clock-in Attendance row. Call after adding it, before commit."""
+    db.session.flush()
+    work_date = record.attendanceTimestamp.date()
+    already_present = db.session.query(Attendance.attendanceId).filter(
+        Attendance.attendanceUserId == record.attendanceUserId,
+        Attendance.in_period(*day_bounds(work_date, work_date)),
+        Attendance.attendanceClockInTime.isnot(None),
+        Attendance.attendanceId != record.attendanceId
+    ).first() is not None
+    _apply(work_date, {
+        "rollupClockIns": 1,
+        "rollupPresent": 0 if already_present else 1,
+        "rollupLate": 1 if record.attendanceClockInTime.hour >= LATE_HOUR else 0,
+    })
+
+
+def record_clock_out(record):
+    """Count the clock-out just set on an Attendance row. Call before commit."""
+    db.session.flush()
+    _apply(record.attendanceTimestamp.date(), {
+        "rollupOvertime": 1 if record.attendanceClockOutTime.hour >= OVERTIME_HOUR else 0,
+    })
+
+
+def recount_rollups(days):
+    """Recompute the stored rollups of days after attendance rows were deleted. Does not commit.
+
+    Days without a stored row are left to get_rollups(), which computes them on read.
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+    stored = {day for day, in db.session.query(DailyAttendanceRollup.rollupDate).filter(
+        DailyAttendanceRollup.rollupDate.in_(days)
+    )}
+    computed = compute_rollups(days[0], days[-1])
+    rows = [computed[day] for day in days if day in stored]
+    upsert_rows(DailyAttendanceRollup, rows, ("rollupDate",), ROLLUP_COLUMNS)
+    return len(rows)
+
+
+def backfill_rollups(start_date, end_date):
+    """Recompute and store rollups for start_date..end_date (inclusive). Commits."""
+    rows = compute_rollups(start_date, end_date)
+    upsert_rows(DailyAttendanceRollup, list(rows.values()), ("rollupDate",), ROLLUP_COLUMNS)
+    db.session.commit()
+    return len(rows)
+
+
+def add_attendance_rollup_commands(app):
+    import click
+
+    @app.cli.command("backfill-attendance-rollups")
+    @click.option("--from", "from_date", required=True, help="First date (YYYY-MM-DD)")
+    @click.option("--to", "to_date", default=None, help="Last date (YYYY-MM-DD), defaults to today")
+    def backfill_attendance_rollups_command(from_date, to_date):
+        """Rebuild per-day dashboard rollups from attendance history."""
+        start = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end = datetime.strptime(to_date, "%Y-%m-%d").date() if to_date else get_ist_now().date()
+        count = backfill_rollups(start, end)
+        click.echo(f"Done: {count} days")
@@ -1,14 +1,76 @@
 import jwt
 import os
+import hashlib
+import secrets
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
+from sqlalchemy import event
+from database import after_commit
 from models import User
+from ttl_cache import TTLCache
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
 
 ACCESS_TOKEN_EXPIRY = 60  # minutes
 REFRESH_TOKEN_EXPIRY = 30  # days
+TOKEN_CACHE_TTL = 60  # seconds, upper bound on how stale a cached user can be
+TOKEN_CACHE_SIZE = 10000
+
+# (kind, sha256(token)) -> AuthUser snapshot, tagged with the user id for eviction
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
+class AuthUser:
+    """Detached snapshot of an active user, safe to share across requests"""
+    __slots__ = ('userId', 'userFirstName', 'userLastName', 'userLogin', 'userIsActive')
+
+    def __init__(self, user):
+        self.userId = user.userId
+        self.userFirstName = user.userFirstName
+        self.userLastName = user.userLastName
+        self.userLogin = user.userLogin
+        self.userIsActive = user.userIsActive
+
+    @property
+    def name(self):
+        return f"{self.userFirstName} {self.userLastName}"
+
+    @property
+    def employee_code(self):
+        return self.userLogin
+
+
+def token_digest(token):
+    """Fixed-length SHA-256 hex digest stored in mtpl_users.userAccessTokenDigest"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def token_cache_key(token, kind='jwt'):
+    return (kind, token_digest(token))
+
+
+def evict_user_tokens(user_id):
+    """Drop every cached token of a user (login, logout, deactivation)"""
+    _token_cache.evict_tag(int(user_id))
+
+
+@event.listens_for(User.userIsActive, 'set')
+def _evict_deactivated_user(target, value, oldvalue, initiator):
+    # After the commit, otherwise a concurrent request could cache the user as active again
+    if value != '1' and target.userId is not None:
+        user_id = target.userId
+        after_commit(target, lambda: evict_user_tokens(user_id))
+
+
+@event.listens_for(User.userAccessToken, 'set')
+def _evict_rotated_db_token(target, value, oldvalue, initiator):
+    # A cleared or replaced database token must stop resolving as soon as that is committed
+    if target.userId is not None:
+        user_id = target.userId
+        after_commit(target, lambda: evict_user_tokens(user_id))
+
 def generate_access_token(user_id):
     payload = {
         'user_id': user_id,
@@ -19,8 +81,11 @@ def generate_access_token(user_id):
 def generate_refresh_token(user_id):
     payload = {
         'user_id': user_id,
+        'iat': int(time.time()),
         'exp': datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRY),
-        'type': 'refresh'
+        'type': 'refresh',
+        # Tokens issued in the same second must still differ for rotation to work
+        'jti': secrets.token_hex(8)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 def verify_token(token, token_type='access'):
@@ -41,16 +106,38 @@ def token_required(f):
             return jsonify({'success': False, 'error': 'Token required'}), 401
         if token.startswith('Bearer '):
             token = token[7:]
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
-        user = User.query.filter_by(userId=payload['user_id'], userIsActive='1').first()
-        if not user:
-            return jsonify({'success': False, 'error': 'User not found'}), 401
-        request.user_id = payload['user_id']
+        cache_key = token_cache_key(token)
+        user = _token_cache.get(cache_key)
+        if user is None:
+            payload = verify_token(token)
+            if not payload:
+                return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
+            db_user = User.query.filter_by(userId=payload['user_id'], userIsActive='1').first()
+            if not db_user:
+                return jsonify({'success': False, 'error': 'User not found'}), 401
+            user = AuthUser(db_user)
+            # Never keep a token cached past its own expiry
+            _token_cache.set(cache_key, user, ttl=payload['exp'] - time.time(), tag=user.userId)
+        request.user_id = user.userId
         request.user = user
         return f(*args, **kwargs)
     return decorated
+def resolve_db_token(token):
+    """Find the active user owning a database stored access token.
+
+    Looks the token up by its indexed digest instead of scanning the TEXT
+    userAccessToken column, and caches the result for TOKEN_CACHE_TTL. Writes
+    to userAccessToken through the ORM evict the entry once committed.
+    """
+    cache_key = token_cache_key(token, kind='db')
+    user = _token_cache.get(cache_key)
+    if user is None:
+        db_user = User.query.filter_by(userAccessTokenDigest=token_digest(token), userIsActive='1').first()
+        if not db_user or db_user.userAccessToken != token:
+            return None
+        user = AuthUser(db_user)
+        _token_cache.set(cache_key, user, tag=user.userId)
+    return user
 def simple_token_required(f):
     """Simple auth using database stored tokens"""
     @wraps(f)
@@ -60,8 +147,7 @@ def simple_token_required(f):
             return jsonify({'success': False, 'error': 'Token required'}), 401
         if token.startswith('Bearer '):
             token = token[7:]
-        # Check token directly in database
-        user = User.query.filter_by(userAccessToken=token, userIsActive='1').first()
+        user = resolve_db_token(token)
         if not user:
             return jsonify({'success': False, 'error': 'Invalid token'}), 401
         request.user_id = user.userId
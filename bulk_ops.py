@@ -0,0 +1,134 @@
+"""
+Bulk write helpers
+Multi-row upserts (MySQL INSERT ... ON DUPLICATE KEY UPDATE) for report tables, and
+sync_rows for admin bulk assignments: prefetch existing rows, diff in memory and
+write only new or changed rows.
+"""
+from decimal import Decimal
+
+from database import db
+
+UPSERT_CHUNK_SIZE = 500
+
+
+def _dialect_insert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return dialect, insert
+
+
+def upsert_rows(model, rows, key_columns, update_columns, chunk_size=UPSERT_CHUNK_SIZE):
+    """Insert rows, updating update_columns where key_columns already exist.
+
+    rows are dicts keyed by model attribute names; key_columns must be backed
+    by a unique index. Writes chunk_size rows per statement and returns the
+    number of rows sent. Does not commit.
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    dialect, insert = _dialect_insert()
+
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert(table).values(rows[start:start + chunk_size])
+        if dialect == 'mysql':
+            stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={c: stmt.excluded[c] for c in update_columns},
+            )
+        db.session.execute(stmt)
+    return len(rows)
+
+
+def increment_rows(model, rows, key_columns, counter_columns):
+    """Insert rows, or add their counter_columns values to the existing row's counters.
+
+    Same conventions as upsert_rows: key_columns must be backed by a unique
+    index and nothing is committed.
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    dialect, insert = _dialect_insert()
+
+    stmt = insert(table).values(rows)
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in counter_columns})
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={c: table.c[c] + stmt.excluded[c] for c in counter_columns},
+        )
+    db.session.execute(stmt)
+    return len(rows)
+
+
+def _comparable(value):
+    # Numeric(5,1) columns come back as Decimal while request payloads carry int/float
+    if isinstance(value, (Decimal, float, int)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def fetch_existing(model, rows, key_columns, columns, chunk_size=UPSERT_CHUNK_SIZE):
+    """{key tuple: {column: value}} for the rows whose key_columns already exist.
+
+    Reads with IN lists per key column (chunked on the first one) and keeps only
+    exact key matches.
+    """
+    keys = {tuple(row[c] for c in key_columns) for row in rows}
+    if not keys:
+        return {}
+    table = model.__table__
+    selected = [table.c[c] for c in key_columns] + [table.c[c] for c in columns if c not in key_columns]
+    first_values = sorted({key[0] for key in keys})
+    other_filters = [
+        table.c[c].in_({key[i] for key in keys}) for i, c in enumerate(key_columns) if i
+    ]
+
+    existing = {}
+    for start in range(0, len(first_values), chunk_size):
+        stmt = db.select(*selected).where(
+            table.c[key_columns[0]].in_(first_values[start:start + chunk_size]), *other_filters
+        )
+        for row in db.session.execute(stmt).mappings():
+            key = tuple(row[c] for c in key_columns)
+            if key in keys:
+                existing[key] = dict(row)
+    return existing
+
+
+def sync_rows(model, rows, key_columns, compare_columns, touch_columns=(), chunk_size=UPSERT_CHUNK_SIZE):
+    """Upsert rows, skipping those whose compare_columns already hold the same values.
+
+    touch_columns (e.g. an updated-at timestamp) are written with changed rows but
+    not compared. Rows repeating a key are collapsed, last one wins. Returns
+    {"inserted": n, "updated": n, "unchanged": n}. Does not commit.
+    """
+    rows = list({tuple(row[c] for c in key_columns): row for row in rows}.values())
+    existing = fetch_existing(model, rows, key_columns, compare_columns, chunk_size)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    changed = []
+    for row in rows:
+        current = existing.get(tuple(row[c] for c in key_columns))
+        if current is None:
+            counts["inserted"] += 1
+        elif any(_comparable(current[c]) != _comparable(row[c]) for c in compare_columns):
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        changed.append(row)
+
+    # Insert-only syncs still need an update clause; re-setting a key column is a no-op
+    update_columns = tuple(compare_columns) + tuple(touch_columns) or tuple(key_columns[:1])
+    upsert_rows(model, changed, key_columns, update_columns, chunk_size)
+    return counts
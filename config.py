@@ -62,3 +62,11 @@ class Config:
         # "203.0.113.45",      # Example office IP
         # "198.51.100.0/24",   # Example IP range
     ]
+    
+    # ============================================
+    # ANALYTICS CONFIGURATION
+    # ============================================
+    DASHBOARD_CACHE_TTL = 30  # seconds a computed dashboard response is reused
+    REPORT_CACHE_SIZE = 512  # report responses kept in memory
+    REPORT_CACHE_PATH = os.environ.get("REPORT_CACHE_PATH")  # optional SQLite file for a shared disk tier
+    REPORT_CACHE_DISK_ROWS = 20000
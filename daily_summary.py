@@ -0,0 +1,194 @@
+"""
+Daily attendance summaries
+Keeps mtpl_daily_attendance_summary (one row per user and day) up to date from
+clock/break punches and manual time entries so reports can read one pre-aggregated
+row per day instead of rescanning raw attendance.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_
+
+from bulk_ops import upsert_rows
+from database import db
+from models import Attendance, ManualTimeEntry, DailyAttendanceSummary, Settings, get_ist_now, day_bounds
+from report_cache import bump, bump_user, month_scopes
+from work_hours import compute_rows
+
+SUMMARY_COLUMNS = (
+    "summaryClockInTime", "summaryClockOutTime", "summaryWorkedHours",
+    "summaryPendingHours", "summaryUpdatedAt",
+)
+
+
+def _wall_clock(value):
+    # Rows written in this request still carry the IST tzinfo from get_ist_now()
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+def _summarize(attendance_rows, manual_entries, standard_hours):
+    """{(userId, date): summary row} from attendance rows, falling back to manual entries"""
+    attendance_rows = list(attendance_rows)
+    worked_hours = compute_rows(
+        (r.attendanceClockInTime, r.attendanceClockOutTime, r.attendanceBreakInTime, r.attendanceBreakOutTime)
+        for r in attendance_rows
+    )["worked_hours"]
+
+    days = {}
+    for i, r in enumerate(attendance_rows):
+        clock_in, clock_out = _wall_clock(r.attendanceClockInTime), _wall_clock(r.attendanceClockOutTime)
+        key = (r.attendanceUserId, r.attendanceTimestamp.date())
+        day = days.setdefault(key, {"in": None, "out": None, "hours": 0.0, "open": False, "closed": False})
+        if day["in"] is None or clock_in < day["in"]:
+            day["in"] = clock_in
+        if clock_out:
+            day["closed"] = True
+            day["hours"] += float(worked_hours[i])
+            if day["out"] is None or clock_out > day["out"]:
+                day["out"] = clock_out
+        else:
+            day["open"] = True
+
+    now = get_ist_now()
+    rows = {}
+    for (user_id, work_date), day in days.items():
+        worked = day["hours"]
+        rows[(user_id, work_date)] = {
+            "summaryUserId": user_id,
+            "summaryDate": work_date,
+            "summaryClockInTime": day["in"].time(),
+            # An open session means the user is still clocked in
+            "summaryClockOutTime": day["out"].time() if day["out"] and not day["open"] else None,
+            "summaryWorkedHours": round(worked, 2),
+            "summaryPendingHours": round(worked - standard_hours, 2) if day["closed"] else 0,
+            "summaryCreatedAt": now,
+            "summaryUpdatedAt": now,
+        }
+
+    fallbacks = {}
+    for entry in manual_entries:
+        key = (entry.entryUserId, entry.entryWorkingDate)
+        if key not in rows and entry.entryCheckInTime:
+            fallbacks.setdefault(key, entry)
+    manual = compute_rows(
+        [(e.entryCheckInTime, e.entryCheckOutTime, e.entryBreakInTime, e.entryBreakOutTime) for e in fallbacks.values()],
+        standard_hours,
+        days=[e.entryWorkingDate for e in fallbacks.values()]
+    )
+    for i, (key, entry) in enumerate(fallbacks.items()):
+        complete = bool(manual["complete"][i])
+        rows[key] = {
+            "summaryUserId": entry.entryUserId,
+            "summaryDate": entry.entryWorkingDate,
+            "summaryClockInTime": entry.entryCheckInTime,
+            "summaryClockOutTime": entry.entryCheckOutTime,
+            "summaryWorkedHours": round(float(manual["worked_hours"][i]), 2) if complete else 0,
+            "summaryPendingHours": round(float(manual["difference"][i]), 2) if complete else 0,
+            "summaryCreatedAt": now,
+            "summaryUpdatedAt": now,
+        }
+    return rows
+
+
+def _standard_hours():
+    return float(Settings.get('standard_working_hours', 9))
+
+
+def refresh_daily_summary(user_id, work_date):
+    """Recompute one user-day summary after a punch or manual entry write. Does not commit."""
+    user_id = int(user_id)
+    day_start, day_end = day_bounds(work_date, work_date)
+    attendance_rows = Attendance.query.filter(
+        Attendance.attendanceUserId == user_id,
+        Attendance.in_period(day_start, day_end),
+        Attendance.attendanceClockInTime.isnot(None)
+    ).all()
+    manual_entries = [] if attendance_rows else ManualTimeEntry.query.filter_by(
+        entryUserId=user_id, entryWorkingDate=work_date
+    ).all()
+
+    row = _summarize(attendance_rows, manual_entries, _standard_hours()).get((user_id, work_date))
+    bump_user(user_id, work_date)
+    if row is None:
+        DailyAttendanceSummary.query.filter_by(summaryUserId=user_id, summaryDate=work_date).delete()
+        return None
+    upsert_rows(DailyAttendanceSummary, [row], ("summaryUserId", "summaryDate"), SUMMARY_COLUMNS)
+    return row
+
+
+def refresh_user_days(user_id, days):
+    """Recompute one user's summaries for days, e.g. after their punches were deleted. Does not commit."""
+    days = sorted(set(days))
+    if not days:
+        return 0
+    user_id = int(user_id)
+    range_start, range_end = day_bounds(days[0], days[-1])
+    attendance_rows = Attendance.query.filter(
+        Attendance.attendanceUserId == user_id,
+        Attendance.in_period(range_start, range_end),
+        Attendance.attendanceClockInTime.isnot(None)
+    ).all()
+    manual_entries = ManualTimeEntry.query.filter(
+        ManualTimeEntry.entryUserId == user_id,
+        ManualTimeEntry.entryWorkingDate.in_(days)
+    ).all()
+
+    wanted = set(days)
+    rows = [row for (_, day), row in _summarize(attendance_rows, manual_entries, _standard_hours()).items() if day in wanted]
+    bump({scope for day in days for scope in month_scopes(user_id, day, day)})
+    DailyAttendanceSummary.query.filter(
+        DailyAttendanceSummary.summaryUserId == user_id,
+        DailyAttendanceSummary.summaryDate.in_(days)
+    ).delete(synchronize_session=False)
+    upsert_rows(DailyAttendanceSummary, rows, ("summaryUserId", "summaryDate"), SUMMARY_COLUMNS)
+    return len(rows)
+
+
+def backfill_daily_summaries(start_date, end_date):
+    """Rebuild every summary between start_date and end_date (inclusive) from history. Commits."""
+    range_start, range_end = day_bounds(start_date, end_date)
+    attendance_rows = Attendance.query.filter(
+        Attendance.in_period(range_start, range_end),
+        Attendance.attendanceClockInTime.isnot(None)
+    ).all()
+    manual_entries = ManualTimeEntry.query.filter(
+        and_(
+            ManualTimeEntry.entryWorkingDate >= start_date,
+            ManualTimeEntry.entryWorkingDate <= end_date
+        )
+    ).all()
+
+    rows = _summarize(attendance_rows, manual_entries, _standard_hours())
+    stale_users = db.session.query(DailyAttendanceSummary.summaryUserId).filter(
+        DailyAttendanceSummary.summaryDate >= start_date,
+        DailyAttendanceSummary.summaryDate <= end_date
+    ).distinct().all()
+    user_ids = {user_id for user_id, in stale_users} | {user_id for user_id, _ in rows}
+    bump([scope for user_id in user_ids for scope in month_scopes(user_id, start_date, end_date)])
+    DailyAttendanceSummary.query.filter(
+        DailyAttendanceSummary.summaryDate >= start_date,
+        DailyAttendanceSummary.summaryDate <= end_date
+    ).delete(synchronize_session=False)
+    upsert_rows(DailyAttendanceSummary, list(rows.values()), ("summaryUserId", "summaryDate"), SUMMARY_COLUMNS)
+    db.session.commit()
+    return len(rows)
+
+
+def add_daily_summary_commands(app):
+    import click
+
+    @app.cli.command("backfill-daily-summaries")
+    @click.option("--from", "from_date", required=True, help="First date (YYYY-MM-DD)")
+    @click.option("--to", "to_date", default=None, help="Last date (YYYY-MM-DD), defaults to today")
+    def backfill_daily_summaries_command(from_date, to_date):
+        """Rebuild daily attendance summaries from attendance history."""
+        start = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end = datetime.strptime(to_date, "%Y-%m-%d").date() if to_date else get_ist_now().date()
+        total = 0
+        # One month per pass keeps each read and upsert bounded
+        while start <= end:
+            chunk_end = min(end, start + timedelta(days=30))
+            count = backfill_daily_summaries(start, chunk_end)
+            click.echo(f"  {start} to {chunk_end}: {count} summaries")
+            total += count
+            start = chunk_end + timedelta(days=1)
+        click.echo(f"Done: {total} summaries")
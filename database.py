@@ -1,3 +1,30 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 db = SQLAlchemy()
+
+_AFTER_COMMIT_KEY = 'after_commit_callbacks'
+
+
+def after_commit(target, callback):
+    """Run callback() once the transaction that changed target commits; dropped on rollback.
+
+    Objects that are not in a session have nothing to wait for and run it right away.
+    """
+    session = object_session(target)
+    if session is None:
+        callback()
+    else:
+        session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, ()):
+        callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_after_commit(session):
+    session.info.pop(_AFTER_COMMIT_KEY, None)
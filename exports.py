@@ -0,0 +1,312 @@
+"""
+Streaming exports
+CSV / NDJSON (and XLSX when openpyxl is installed) downloads of attendance, working
+reports and monthly reports. Rows are read with a server-side cursor and written
+as they arrive, so memory stays flat regardless of the date range. Working
+reports are merged from attendance and manual entries like the report page,
+a batch of users at a time, so days never materialized are exported too.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, date, time
+from decimal import Decimal
+
+from sqlalchemy import select
+
+try:
+    from openpyxl import Workbook
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+EXPORT_BATCH_SIZE = 1000  # rows fetched per round trip from the server-side cursor
+EXPORT_USER_BATCH = 50  # users whose working days are merged per round of queries
+EXPORT_FORMATS = ('csv', 'ndjson', 'xlsx')
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _stream_rows(db, stmt, user_id_key, to_row):
+    """Yield export rows for stmt, resolving user names once per fetched batch"""
+    from user_directory import user_directory
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        users = user_directory.get_many({row._mapping[user_id_key] for row in partition})
+        for row in partition:
+            user = users.get(row._mapping[user_id_key])
+            yield to_row(row, user.name if user else None)
+
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_cell(v) for v in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(header, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(header, (_cell(v) for v in row)))))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def _xlsx_chunks(header, rows):
+    # write_only workbooks keep rows on disk, the finished file is streamed back in blocks
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append([_cell(v) for v in row])
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, 'rb') as fh:
+            while True:
+                block = fh.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+def add_export_routes(app, db):
+    from flask import request, jsonify, Response, stream_with_context
+    from auth import token_required
+    from models import Attendance, MonthlyReport, day_bounds
+    from user_directory import user_directory
+    from working_reports import iter_working_days
+
+    def parse_common():
+        fmt = (request.args.get('format') or 'csv').lower()
+        if fmt not in EXPORT_FORMATS:
+            return None, None, f"format must be one of {', '.join(EXPORT_FORMATS)}"
+        if fmt == 'xlsx' and not XLSX_AVAILABLE:
+            return None, None, "XLSX export requires openpyxl (pip install openpyxl)"
+        raw_ids = request.args.get('user_ids')
+        try:
+            user_ids = [int(uid) for uid in raw_ids.split(',') if uid.strip()] if raw_ids else None
+        except ValueError:
+            return None, None, "user_ids must be a comma separated list of integers"
+        return fmt, user_ids, None
+
+    def parse_date_range():
+        try:
+            start = datetime.strptime(request.args.get('from', ''), "%Y-%m-%d").date()
+            end = datetime.strptime(request.args.get('to', ''), "%Y-%m-%d").date()
+        except ValueError:
+            return None, None, "from and to are required (YYYY-MM-DD)"
+        if end < start:
+            return None, None, "to must not be before from"
+        return start, end, None
+
+    def export_response(name, fmt, header, rows):
+        if fmt == 'ndjson':
+            chunks, mimetype = _ndjson_chunks(header, rows), 'application/x-ndjson'
+        elif fmt == 'xlsx':
+            chunks, mimetype = _xlsx_chunks(header, rows), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            chunks, mimetype = _csv_chunks(header, rows), 'text/csv'
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'}
+        )
+
+    @app.route("/api/exports/attendance", methods=["GET"])
+    @token_required
+    def api_export_attendance():
+        """
+        Export Attendance Punches
+        ---
+        tags:
+          - Exports
+        parameters:
+          - name: from
+            in: query
+            type: string
+            required: true
+            description: First date (YYYY-MM-DD)
+          - name: to
+            in: query
+            type: string
+            required: true
+            description: Last date (YYYY-MM-DD)
+          - name: user_ids
+            in: query
+            type: string
+            description: Comma separated user IDs (default all users)
+          - name: format
+            in: query
+            type: string
+            enum: [csv, ndjson, xlsx]
+            default: csv
+        responses:
+          200:
+            description: Streamed export file
+          400:
+            description: Invalid parameters
+        """
+        fmt, user_ids, error = parse_common()
+        start, end, range_error = parse_date_range()
+        if error or range_error:
+            return jsonify({"success": False, "error": error or range_error}), 400
+
+        range_start, range_end = day_bounds(start, end)
+        stmt = select(
+            Attendance.attendanceId, Attendance.attendanceUserId, Attendance.attendanceTimestamp,
+            Attendance.attendanceAction, Attendance.attendanceStatus, Attendance.attendanceSource,
+            Attendance.attendanceClockInTime, Attendance.attendanceClockOutTime,
+            Attendance.attendanceBreakInTime, Attendance.attendanceBreakOutTime,
+        ).where(Attendance.in_period(range_start, range_end))
+        if user_ids:
+            stmt = stmt.where(Attendance.attendanceUserId.in_(user_ids))
+        stmt = stmt.order_by(Attendance.attendanceTimestamp, Attendance.attendanceId)
+
+        header = ["id", "user_id", "user_name", "timestamp", "action", "status", "source",
+                  "clock_in_time", "clock_out_time", "break_in_time", "break_out_time"]
+        rows = _stream_rows(db, stmt, 'attendanceUserId', lambda r, name: (
+            r.attendanceId, r.attendanceUserId, name, r.attendanceTimestamp, r.attendanceAction,
+            r.attendanceStatus, r.attendanceSource, r.attendanceClockInTime, r.attendanceClockOutTime,
+            r.attendanceBreakInTime, r.attendanceBreakOutTime,
+        ))
+        return export_response(f"attendance_{start}_{end}", fmt, header, rows)
+
+    @app.route("/api/exports/working-reports", methods=["GET"])
+    @token_required
+    def api_export_working_reports():
+        """
+        Export Working Reports
+        Rows are ordered by user and date and merged like the working report: the
+        first attendance of the day, else the manual entry, else the stored record.
+        ---
+        tags:
+          - Exports
+        parameters:
+          - name: from
+            in: query
+            type: string
+            required: true
+            description: First date (YYYY-MM-DD)
+          - name: to
+            in: query
+            type: string
+            required: true
+            description: Last date (YYYY-MM-DD)
+          - name: user_ids
+            in: query
+            type: string
+            description: Comma separated user IDs (default all users)
+          - name: format
+            in: query
+            type: string
+            enum: [csv, ndjson, xlsx]
+            default: csv
+        responses:
+          200:
+            description: Streamed export file
+          400:
+            description: Invalid parameters
+        """
+        fmt, user_ids, error = parse_common()
+        start, end, range_error = parse_date_range()
+        if error or range_error:
+            return jsonify({"success": False, "error": error or range_error}), 400
+
+        header = ["user_id", "user_full_name", "date", "clock_in_time", "clock_out_time",
+                  "worked_hours", "total_hours_difference"]
+
+        def rows():
+            # Same per-day precedence as the working report: attendance, manual entry, stored record
+            user_id, name = None, None
+            for row in iter_working_days(start, end, user_ids, batch_size=EXPORT_USER_BATCH):
+                if row[0] != user_id:
+                    user = user_directory.get(row[0])
+                    user_id, name = row[0], user.name if user else None
+                yield (user_id, name) + row[1:]
+
+        return export_response(f"working_reports_{start}_{end}", fmt, header, rows())
+
+    @app.route("/api/exports/monthly-reports", methods=["GET"])
+    @token_required
+    def api_export_monthly_reports():
+        """
+        Export Monthly Reports
+        ---
+        tags:
+          - Exports
+        parameters:
+          - name: year
+            in: query
+            type: integer
+            required: true
+          - name: month
+            in: query
+            type: integer
+            description: Month (1-12), default all months of the year
+          - name: user_ids
+            in: query
+            type: string
+            description: Comma separated user IDs (default all users)
+          - name: format
+            in: query
+            type: string
+            enum: [csv, ndjson, xlsx]
+            default: csv
+        responses:
+          200:
+            description: Streamed export file
+          400:
+            description: Invalid parameters
+        """
+        fmt, user_ids, error = parse_common()
+        year = request.args.get('year', type=int)
+        month = request.args.get('month', type=int)
+        if error or not year:
+            return jsonify({"success": False, "error": error or "year required"}), 400
+
+        stmt = select(
+            MonthlyReport.reportUserId, MonthlyReport.reportMonth, MonthlyReport.reportYear,
+            MonthlyReport.reportTotalWorkingHours, MonthlyReport.reportWorkedDays,
+            MonthlyReport.reportTotalWeeklyOff, MonthlyReport.reportHolidays,
+            MonthlyReport.reportLeavesTaken, MonthlyReport.reportOnTimeEntries,
+            MonthlyReport.reportEarlyOut, MonthlyReport.reportLateIn, MonthlyReport.reportAbsentDays,
+        ).where(MonthlyReport.reportYear == year)
+        if month:
+            stmt = stmt.where(MonthlyReport.reportMonth == month)
+        if user_ids:
+            stmt = stmt.where(MonthlyReport.reportUserId.in_(user_ids))
+        stmt = stmt.order_by(MonthlyReport.reportMonth, MonthlyReport.reportUserId)
+
+        header = ["user_id", "user_name", "month", "year", "total_working_hours", "worked_days",
+                  "total_weekly_off", "holidays", "leaves_taken", "on_time_entries", "early_out",
+                  "late_in", "absent_days"]
+        rows = _stream_rows(db, stmt, 'reportUserId', lambda r, name: (
+            r.reportUserId, name, r.reportMonth, r.reportYear, r.reportTotalWorkingHours,
+            r.reportWorkedDays, r.reportTotalWeeklyOff, r.reportHolidays, r.reportLeavesTaken,
+            r.reportOnTimeEntries, r.reportEarlyOut, r.reportLateIn, r.reportAbsentDays,
+        ))
+        name = f"monthly_reports_{year}" + (f"_{month:02d}" if month else "")
+        return export_response(name, fmt, header, rows)
@@ -0,0 +1,47 @@
+"""
+HTTP conditional requests
+Polling endpoints compute a cheap version of their data first; clients that send
+back the ETag (If-None-Match) or Last-Modified (If-Modified-Since) they were
+given get 304 Not Modified before any rows are loaded or serialized.
+"""
+import pytz
+from flask import Response, request
+
+from config import IST
+
+
+def _http_date(value):
+    """Stored (naive IST) datetime as aware UTC, truncated to seconds like HTTP dates"""
+    if value.tzinfo is None:
+        value = IST.localize(value)
+    return value.astimezone(pytz.utc).replace(microsecond=0)
+
+
+def is_current(etag, last_modified=None):
+    """True when the request's validators match etag / last_modified"""
+    if request.if_none_match:
+        # An ETag check takes precedence over the date
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _http_date(last_modified) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    # Clients must revalidate, which is a 304 until the data changes
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def json_with_etag(response):
+    """Add an ETag of the body to a built JSON response; 304 when the client already has it"""
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
@@ -0,0 +1,170 @@
+"""
+Leave balances
+mtpl_user_leave_balance.balanceUsed is the leave ledger: every status change of a
+leave request into or out of 'approved' adjusts the (user, leave type, year) row
+under a row lock. reconcile_ledger recomputes the same figure from the approved
+request history and reports (or fixes) the rows that drifted.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from bulk_ops import upsert_rows
+from database import db
+from models import LeaveRequest, LeaveAllotment, UserLeaveBalance
+from report_cache import bump_user
+
+USED_STATUS = 'approved'  # the only status whose days count against the balance
+BALANCE_KEY = ("balanceUserId", "balanceLeaveTypeId", "balanceYear")
+
+
+def _approved_history(year=None):
+    """{(userId, leaveTypeId, year): approved days} for every user, optionally one year"""
+    row_year = func.extract('year', LeaveRequest.leaveRequestFromDate)
+    query = db.session.query(
+        LeaveRequest.leaveRequestUserId,
+        LeaveRequest.leaveRequestLeaveTypeId,
+        row_year,
+        func.sum(LeaveRequest.leaveRequestDays),
+    ).filter(LeaveRequest.leaveRequestStatus == USED_STATUS)
+    if year:
+        query = query.filter(
+            LeaveRequest.leaveRequestFromDate >= date(year, 1, 1),
+            LeaveRequest.leaveRequestFromDate < date(year + 1, 1, 1)
+        )
+    rows = query.group_by(
+        LeaveRequest.leaveRequestUserId, LeaveRequest.leaveRequestLeaveTypeId, row_year
+    ).all()
+    return {(u, t, int(y)): float(used or 0) for u, t, y, used in rows}
+
+
+def ledger_used(keys):
+    """{(userId, leaveTypeId, year): used days} read from the ledger (0 when no row yet)"""
+    keys = {(int(u), int(t), int(y)) for u, t, y in keys}
+    if not keys:
+        return {}
+    rows = db.session.query(
+        UserLeaveBalance.balanceUserId, UserLeaveBalance.balanceLeaveTypeId,
+        UserLeaveBalance.balanceYear, UserLeaveBalance.balanceUsed,
+    ).filter(
+        UserLeaveBalance.balanceUserId.in_({k[0] for k in keys}),
+        UserLeaveBalance.balanceLeaveTypeId.in_({k[1] for k in keys}),
+        UserLeaveBalance.balanceYear.in_({k[2] for k in keys})
+    ).all()
+    used = {key: 0.0 for key in keys}
+    for user_id, type_id, year, balance_used in rows:
+        if (user_id, type_id, year) in used:
+            used[(user_id, type_id, year)] = float(balance_used or 0)
+    return used
+
+
+def lock_leave_request(request_id):
+    """Load a leave request with a row lock so concurrent status changes serialize"""
+    return db.session.get(LeaveRequest, request_id, with_for_update=True)
+
+
+def _lock_balance(user_id, leave_type_id, year):
+    def locked():
+        return UserLeaveBalance.query.filter_by(
+            balanceUserId=user_id, balanceLeaveTypeId=leave_type_id, balanceYear=year
+        ).with_for_update().first()
+
+    balance = locked()
+    if balance is None:
+        allotment = LeaveAllotment.query.filter_by(
+            allotmentUserId=user_id, allotmentLeaveTypeId=leave_type_id, allotmentYear=year
+        ).first()
+        # Upsert so two first approvals for the same key cannot both insert
+        upsert_rows(UserLeaveBalance, [{
+            "balanceUserId": user_id,
+            "balanceLeaveTypeId": leave_type_id,
+            "balanceYear": year,
+            "balanceTotal": allotment.allotmentTotal if allotment else 0,
+            "balanceUsed": 0,
+        }], BALANCE_KEY, ("balanceUserId",))
+        balance = locked()
+    return balance
+
+
+def apply_ledger(leave_request, old_status, new_status):
+    """Adjust the ledger for leave_request moving from old_status to new_status.
+
+    For status changes written directly (e.g. a conditional UPDATE); set_leave_status
+    calls this itself.
+    """
+    was_used = old_status == USED_STATUS
+    now_used = new_status == USED_STATUS
+    if was_used != now_used:
+        balance = _lock_balance(
+            leave_request.leaveRequestUserId,
+            leave_request.leaveRequestLeaveTypeId,
+            leave_request.leaveRequestFromDate.year,
+        )
+        days = Decimal(str(leave_request.leaveRequestDays))
+        balance.balanceUsed = Decimal(str(balance.balanceUsed or 0)) + (days if now_used else -days)
+        # Approved leaves feed the monthly reports
+        bump_user(leave_request.leaveRequestUserId, leave_request.leaveRequestFromDate, leave_request.leaveRequestToDate)
+
+
+def set_leave_status(leave_request, status):
+    """Move leave_request to status, adjusting the ledger when it enters or leaves 'approved'.
+
+    The caller should have loaded leave_request with lock_leave_request and commits afterwards.
+    """
+    apply_ledger(leave_request, leave_request.leaveRequestStatus, status)
+    leave_request.leaveRequestStatus = status
+
+
+def reconcile_ledger(year=None, fix=False):
+    """Compare ledger balanceUsed with approved request history.
+
+    Returns the mismatching keys as dicts; with fix=True the ledger is overwritten
+    with the history figures and committed.
+    """
+    history = _approved_history(year)
+    query = db.session.query(
+        UserLeaveBalance.balanceUserId, UserLeaveBalance.balanceLeaveTypeId,
+        UserLeaveBalance.balanceYear, UserLeaveBalance.balanceUsed,
+    )
+    if year:
+        query = query.filter(UserLeaveBalance.balanceYear == year)
+    ledger = {(u, t, y): float(used or 0) for u, t, y, used in query}
+
+    mismatches = []
+    for key in sorted(set(history) | set(ledger)):
+        expected, recorded = history.get(key, 0.0), ledger.get(key, 0.0)
+        if abs(expected - recorded) > 0.001:
+            mismatches.append({
+                "user_id": key[0], "leave_type_id": key[1], "year": key[2],
+                "ledger_used": recorded, "history_used": expected,
+            })
+
+    if fix and mismatches:
+        upsert_rows(UserLeaveBalance, [{
+            "balanceUserId": m["user_id"],
+            "balanceLeaveTypeId": m["leave_type_id"],
+            "balanceYear": m["year"],
+            "balanceTotal": 0,
+            "balanceUsed": m["history_used"],
+        } for m in mismatches], BALANCE_KEY, ("balanceUsed",))
+        db.session.commit()
+    return mismatches
+
+
+def add_leave_ledger_commands(app):
+    import click
+
+    @app.cli.command("reconcile-leave-ledger")
+    @click.option("--year", type=int, default=None, help="Only check this year")
+    @click.option("--fix", is_flag=True, help="Overwrite mismatching ledger rows with the request history")
+    def reconcile_leave_ledger_command(year, fix):
+        """Verify leave balance ledger against approved leave requests."""
+        mismatches = reconcile_ledger(year=year, fix=fix)
+        for m in mismatches:
+            click.echo(
+                f"  user {m['user_id']} type {m['leave_type_id']} {m['year']}: "
+                f"ledger {m['ledger_used']} != history {m['history_used']}"
+            )
+        action = "fixed" if fix else "found"
+        click.echo(f"Done: {len(mismatches)} mismatches {action}")
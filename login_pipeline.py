@@ -0,0 +1,182 @@
+"""
+Login pipeline
+Bounded password-hash verification, write-behind persistence of the refresh
+tokens issued at login, and atomic refresh token rotation.
+
+Write-behind trades durability for fewer writes: tokens queued in the last
+REFRESH_FLUSH_INTERVAL are flushed on a normal exit, but lost if the process is
+killed or crashes, and the users concerned have to log in again. Until its
+flush, a token is also unknown to other app processes, so a refresh sent to
+another process within that window is rejected the same way.
+"""
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from sqlalchemy import update
+from werkzeug.security import check_password_hash
+
+from database import db
+from models import User
+
+HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 4))
+HASH_MAX_PENDING = int(os.environ.get('LOGIN_HASH_MAX_PENDING', 64))
+HASH_TIMEOUT = 10  # seconds a request waits for its verification
+REFRESH_FLUSH_INTERVAL = 0.5  # seconds between write-behind flushes
+REFRESH_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordVerifier:
+    """Runs check_password_hash on a fixed pool so a login burst cannot
+    occupy every request thread with CPU-bound hashing."""
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def verify(self, password_hash, password, timeout=HASH_TIMEOUT):
+        """Return True/False, or None when the pool is saturated or too slow"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        future = self._executor.submit(check_password_hash, password_hash, password)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+
+
+class RefreshTokenWriter:
+    """Coalesces the refresh token writes of logins and persists them in batches.
+
+    Only the latest token per user is kept, so a user logging in twice
+    between flushes costs a single UPDATE row. A queued token stays visible
+    to pending_token() until its write has committed.
+    """
+
+    def __init__(self, flush_interval=REFRESH_FLUSH_INTERVAL, batch_size=REFRESH_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}  # user_id -> refresh token
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # an older batch must never commit over a newer one
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._app = None
+        self._thread = None
+
+    def start(self, app):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name='refresh-token-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, user_id, refresh_token):
+        with self._lock:
+            self._pending[user_id] = refresh_token
+            size = len(self._pending)
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_token(self, user_id):
+        """Refresh token queued for user_id that has not been written yet"""
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def write_now(self, user_id, queued_token, new_token):
+        """Write new_token for user_id in place of its queued, unwritten queued_token. Commits.
+
+        Returns False when queued_token is no longer the queued one (already
+        written, taken by a concurrent refresh or replaced by a newer login).
+        """
+        with self._lock:
+            if self._pending.get(user_id) != queued_token:
+                return False
+            del self._pending[user_id]
+        # Serialized with flush(): a login queued after this point is written after us
+        with self._flush_lock:
+            try:
+                db.session.execute(
+                    update(User).where(User.userId == user_id).values(userRefreshToken=new_token),
+                    execution_options={"synchronize_session": False}
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._pending.setdefault(user_id, queued_token)
+                raise
+        return True
+
+    def flush(self):
+        if self._app is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return 0
+            rows = [{'userId': user_id, 'userRefreshToken': token} for user_id, token in batch.items()]
+            with self._app.app_context():
+                try:
+                    for start in range(0, len(rows), self.batch_size):
+                        db.session.execute(update(User), rows[start:start + self.batch_size])
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning("Refresh token flush failed, keeping %d rows queued: %s", len(rows), e)
+                    return 0
+                finally:
+                    db.session.remove()
+            with self._lock:
+                for user_id, token in batch.items():
+                    # A login queued during the commit keeps its newer token
+                    if self._pending.get(user_id) == token:
+                        del self._pending[user_id]
+        return len(rows)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+password_verifier = PasswordVerifier()
+refresh_token_writer = RefreshTokenWriter()
+
+
+def rotate_refresh_token(user_id, old_token, new_token):
+    """Replace old_token with new_token if it is still the user's current one. Commits.
+
+    The swap is a single conditional UPDATE of the user's row (or, for a
+    token still queued by a login in this process, a take from the queue),
+    so of two concurrent refreshes with the same token exactly one succeeds.
+    Returns False when old_token has been rotated or superseded by a newer
+    login.
+    """
+    pending = refresh_token_writer.pending_token(user_id)
+    if pending is not None:
+        # The queued token is the newest one; the stored row is older
+        return pending == old_token and refresh_token_writer.write_now(user_id, old_token, new_token)
+
+    rotated = db.session.execute(
+        update(User).where(
+            User.userId == user_id,
+            User.userRefreshToken == old_token
+        ).values(userRefreshToken=new_token),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    db.session.commit()
+    if rotated:
+        return True
+    # A login may have queued old_token between the two checks
+    return refresh_token_writer.pending_token(user_id) == old_token \
+        and refresh_token_writer.write_now(user_id, old_token, new_token)
@@ -0,0 +1,8 @@
+-- The approval outbox dispatcher records which channels (sse, webhook, email)
+-- each event reached, so a retry only repeats the channels that failed.
+USE mtpl_website;
+
+ALTER TABLE mtpl_approval_outbox ADD COLUMN IF NOT EXISTS outboxDeliveredChannels VARCHAR(50) NULL AFTER outboxClaimedUntil;
+
+-- Verify structure
+SHOW COLUMNS FROM mtpl_approval_outbox LIKE 'outboxDeliveredChannels';
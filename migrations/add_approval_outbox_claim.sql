@@ -0,0 +1,9 @@
+-- The approval outbox dispatcher claims a batch (outboxClaimedUntil) and commits
+-- before delivering, so webhook/SMTP calls never hold row or gap locks that
+-- would block the outbox inserts of approval transactions.
+USE mtpl_website;
+
+ALTER TABLE mtpl_approval_outbox ADD COLUMN IF NOT EXISTS outboxClaimedUntil DATETIME NULL AFTER outboxDispatchedAt;
+
+-- Verify structure
+SHOW COLUMNS FROM mtpl_approval_outbox LIKE 'outboxClaimedUntil';
@@ -0,0 +1,25 @@
+-- Composite indexes for the attendance query layer. All attendance range
+-- filters are half-open on the raw column (attendanceTimestamp >= start AND
+-- attendanceTimestamp < end), never DATE(attendanceTimestamp), so they can use these.
+USE mtpl_website;
+
+-- Per-user ranges: working reports, user detail, monthly report, today's record
+CREATE INDEX idx_attendance_user_timestamp ON mtpl_attendance (attendanceUserId, attendanceTimestamp);
+
+-- Org-wide day ranges filtered on clock-in: dashboard and analytics counts
+CREATE INDEX idx_attendance_timestamp_clock_in ON mtpl_attendance (attendanceTimestamp, attendanceClockInTime);
+
+-- Regression check: each plan must show one of the indexes above in `key`
+-- with type `range`, not `ALL`.
+EXPLAIN SELECT * FROM mtpl_attendance
+WHERE attendanceUserId = 1
+  AND attendanceTimestamp >= '2025-01-01 00:00:00'
+  AND attendanceTimestamp < '2025-02-01 00:00:00'
+ORDER BY attendanceTimestamp;
+
+EXPLAIN SELECT COUNT(*) FROM mtpl_attendance
+WHERE attendanceTimestamp >= '2025-01-01 00:00:00'
+  AND attendanceTimestamp < '2025-01-02 00:00:00'
+  AND attendanceClockInTime IS NOT NULL;
+
+SHOW INDEX FROM mtpl_attendance;
@@ -0,0 +1,26 @@
+-- attendanceUpdatedAt records the last write to each attendance row. Polling
+-- endpoints read MAX(attendanceId) and MAX(attendanceUpdatedAt) as their
+-- version, both answered from an index, and return 304 when nothing changed.
+-- DATETIME(6) keeps microseconds so two writes within one second still
+-- produce different versions.
+USE mtpl_website;
+
+ALTER TABLE mtpl_attendance ADD COLUMN IF NOT EXISTS attendanceUpdatedAt DATETIME(6) NULL AFTER attendanceBreakOutTime;
+
+-- Backfill with the latest punch on each row
+UPDATE mtpl_attendance
+SET attendanceUpdatedAt = GREATEST(
+    attendanceTimestamp,
+    COALESCE(attendanceClockInTime, attendanceTimestamp),
+    COALESCE(attendanceClockOutTime, attendanceTimestamp),
+    COALESCE(attendanceBreakInTime, attendanceTimestamp),
+    COALESCE(attendanceBreakOutTime, attendanceTimestamp)
+)
+WHERE attendanceUpdatedAt IS NULL;
+
+CREATE INDEX ix_mtpl_attendance_attendanceUpdatedAt ON mtpl_attendance (attendanceUpdatedAt);
+
+-- Verify: the maxima read "Select tables optimized away"; COUNT(*) scans the smallest index
+EXPLAIN SELECT MAX(attendanceId), MAX(attendanceUpdatedAt) FROM mtpl_attendance;
+
+SHOW COLUMNS FROM mtpl_attendance LIKE 'attendanceUpdatedAt';
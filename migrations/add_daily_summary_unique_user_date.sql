@@ -0,0 +1,18 @@
+-- One daily attendance summary per user and day. Summaries are upserted on every
+-- clock/break punch and manual time entry write (daily_summary.py).
+USE mtpl_website;
+
+-- Remove duplicates created by the old lazy summary code, keeping the oldest row
+DELETE s1 FROM mtpl_daily_attendance_summary s1
+JOIN mtpl_daily_attendance_summary s2
+  ON s1.summaryUserId = s2.summaryUserId
+ AND s1.summaryDate = s2.summaryDate
+ AND s1.summaryId > s2.summaryId;
+
+ALTER TABLE mtpl_daily_attendance_summary ADD UNIQUE KEY unique_summary_user_date (summaryUserId, summaryDate);
+
+-- Verify structure
+SHOW INDEX FROM mtpl_daily_attendance_summary;
+
+-- Then rebuild summaries from history (older rows were never updated after clock-out):
+--   flask --app app backfill-daily-summaries --from 2024-01-01
@@ -0,0 +1,17 @@
+-- One leave allotment per user, leave type and year. The bulk/default allotment
+-- endpoints write with INSERT ... ON DUPLICATE KEY UPDATE (bulk_ops.sync_rows).
+USE mtpl_website;
+
+-- Remove duplicates, keeping the most recently assigned row
+DELETE a1 FROM mtpl_leave_allotment a1
+JOIN mtpl_leave_allotment a2
+  ON a1.allotmentUserId = a2.allotmentUserId
+ AND a1.allotmentLeaveTypeId = a2.allotmentLeaveTypeId
+ AND a1.allotmentYear = a2.allotmentYear
+ AND a1.allotmentId < a2.allotmentId;
+
+ALTER TABLE mtpl_leave_allotment
+    ADD UNIQUE KEY unique_allotment_user_type_year (allotmentUserId, allotmentLeaveTypeId, allotmentYear);
+
+-- Verify structure
+SHOW INDEX FROM mtpl_leave_allotment;
@@ -0,0 +1,31 @@
+-- Multi-level approval counters and levels (approval_workflow.py). Decisions bump
+-- the counters on mtpl_leave_requests and the final approved/rejected transition
+-- is a conditional UPDATE, so sibling approvals are never rescanned.
+USE mtpl_website;
+
+ALTER TABLE mtpl_leave_requests
+    ADD COLUMN leaveRequestApprovalsRequired INT NOT NULL DEFAULT 0,
+    ADD COLUMN leaveRequestApprovalsApproved INT NOT NULL DEFAULT 0,
+    ADD COLUMN leaveRequestApprovalsRejected INT NOT NULL DEFAULT 0;
+
+ALTER TABLE mtpl_leave_approvals
+    ADD COLUMN approvalLevel INT NOT NULL DEFAULT 1,
+    ADD COLUMN approvalUnlockCount INT NOT NULL DEFAULT 0;
+
+-- Existing approvals are all parallel (level 1); seed the counters from them
+UPDATE mtpl_leave_requests r
+JOIN (
+    SELECT approvalLeaveRequestId,
+           COUNT(*) AS required,
+           SUM(approvalStatus = 'approved') AS approved,
+           SUM(approvalStatus = 'rejected') AS rejected
+    FROM mtpl_leave_approvals
+    GROUP BY approvalLeaveRequestId
+) a ON a.approvalLeaveRequestId = r.leaveRequestId
+SET r.leaveRequestApprovalsRequired = a.required,
+    r.leaveRequestApprovalsApproved = a.approved,
+    r.leaveRequestApprovalsRejected = a.rejected;
+
+-- Verify structure
+SHOW COLUMNS FROM mtpl_leave_requests LIKE 'leaveRequestApprovals%';
+SHOW COLUMNS FROM mtpl_leave_approvals LIKE 'approval%';
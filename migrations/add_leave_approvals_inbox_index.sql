@@ -0,0 +1,13 @@
+-- Composite index for an approver's pending-approvals inbox
+-- (/api/my-pending-approvals), which filters on approver and status and pages
+-- by approvalCreatedAt, approvalId.
+USE mtpl_website;
+
+CREATE INDEX idx_leave_approvals_inbox
+    ON mtpl_leave_approvals (approvalApproverId, approvalStatus, approvalCreatedAt);
+
+-- Verify the inbox query uses the index (key = idx_leave_approvals_inbox)
+EXPLAIN SELECT approvalId FROM mtpl_leave_approvals
+WHERE approvalApproverId = 1 AND approvalStatus = 'pending'
+ORDER BY approvalCreatedAt, approvalId
+LIMIT 101;
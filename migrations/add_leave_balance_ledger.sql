@@ -0,0 +1,41 @@
+-- mtpl_user_leave_balance.balanceUsed becomes the leave ledger: approvals, rejections
+-- and cancellations adjust it under a row lock (leave_balances.set_leave_status), so
+-- balance checks read one row instead of summing leave request history.
+USE mtpl_website;
+
+-- Half-day leaves need one decimal place
+ALTER TABLE mtpl_user_leave_balance
+    MODIFY balanceTotal DECIMAL(5,1) DEFAULT 0,
+    MODIFY balanceUsed DECIMAL(5,1) DEFAULT 0;
+
+-- Remove duplicate rows, keeping the oldest
+DELETE b1 FROM mtpl_user_leave_balance b1
+JOIN mtpl_user_leave_balance b2
+  ON b1.balanceUserId = b2.balanceUserId
+ AND b1.balanceLeaveTypeId = b2.balanceLeaveTypeId
+ AND b1.balanceYear = b2.balanceYear
+ AND b1.balanceId > b2.balanceId;
+
+ALTER TABLE mtpl_user_leave_balance
+    ADD UNIQUE KEY unique_user_type_year (balanceUserId, balanceLeaveTypeId, balanceYear);
+
+-- Seed the ledger from approved leave requests
+UPDATE mtpl_user_leave_balance SET balanceUsed = 0;
+
+INSERT INTO mtpl_user_leave_balance (balanceUserId, balanceLeaveTypeId, balanceYear, balanceTotal, balanceUsed)
+SELECT r.leaveRequestUserId, r.leaveRequestLeaveTypeId, YEAR(r.leaveRequestFromDate),
+       COALESCE(MAX(a.allotmentTotal), 0), SUM(r.leaveRequestDays)
+FROM mtpl_leave_requests r
+LEFT JOIN mtpl_leave_allotment a
+  ON a.allotmentUserId = r.leaveRequestUserId
+ AND a.allotmentLeaveTypeId = r.leaveRequestLeaveTypeId
+ AND a.allotmentYear = YEAR(r.leaveRequestFromDate)
+WHERE r.leaveRequestStatus = 'approved'
+GROUP BY r.leaveRequestUserId, r.leaveRequestLeaveTypeId, YEAR(r.leaveRequestFromDate)
+ON DUPLICATE KEY UPDATE balanceUsed = VALUES(balanceUsed);
+
+-- Verify structure
+SHOW INDEX FROM mtpl_user_leave_balance;
+
+-- Then check the ledger against request history (prints any mismatches):
+--   flask --app app reconcile-leave-ledger
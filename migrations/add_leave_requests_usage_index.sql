@@ -0,0 +1,15 @@
+-- Composite index for approved leave usage per (user, leave type, year).
+-- Backs the grouped SUM(leaveRequestDays) in leave_balances.approved_usage, which
+-- filters on user/type/status and a leaveRequestFromDate range.
+USE mtpl_website;
+
+CREATE INDEX idx_leave_requests_usage
+    ON mtpl_leave_requests (leaveRequestUserId, leaveRequestLeaveTypeId, leaveRequestStatus, leaveRequestFromDate);
+
+-- Verify the usage query uses the index (key = idx_leave_requests_usage)
+EXPLAIN SELECT leaveRequestUserId, leaveRequestLeaveTypeId, YEAR(leaveRequestFromDate), SUM(leaveRequestDays)
+FROM mtpl_leave_requests
+WHERE leaveRequestUserId IN (1, 2) AND leaveRequestLeaveTypeId IN (1)
+  AND leaveRequestStatus = 'approved'
+  AND leaveRequestFromDate >= '2025-01-01' AND leaveRequestFromDate < '2026-01-01'
+GROUP BY leaveRequestUserId, leaveRequestLeaveTypeId, YEAR(leaveRequestFromDate);
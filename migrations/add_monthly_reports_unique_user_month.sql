@@ -0,0 +1,16 @@
+-- One monthly report per user and month, required by the batch generator's
+-- bulk upsert (INSERT ... ON DUPLICATE KEY UPDATE) in monthly_reports.py
+USE mtpl_website;
+
+-- Remove duplicate reports, keeping the most recent one
+DELETE r1 FROM mtpl_monthly_reports r1
+JOIN mtpl_monthly_reports r2
+  ON r1.reportUserId = r2.reportUserId
+ AND r1.reportMonth = r2.reportMonth
+ AND r1.reportYear = r2.reportYear
+ AND r1.reportId < r2.reportId;
+
+ALTER TABLE mtpl_monthly_reports ADD UNIQUE KEY unique_user_month_year (reportUserId, reportMonth, reportYear);
+
+-- Verify structure
+SHOW INDEX FROM mtpl_monthly_reports;
@@ -0,0 +1,35 @@
+-- Indexed SHA-256 digest of userAccessToken so database-token auth
+-- does not full-scan mtpl_users on every request
+USE mtpl_website;
+
+ALTER TABLE mtpl_users ADD COLUMN IF NOT EXISTS userAccessTokenDigest CHAR(64) NULL AFTER userAccessToken;
+
+-- Backfill digests for tokens that were issued before this migration
+UPDATE mtpl_users
+SET userAccessTokenDigest = SHA2(userAccessToken, 256)
+WHERE userAccessToken IS NOT NULL AND userAccessToken <> '';
+
+CREATE UNIQUE INDEX idx_user_access_token_digest ON mtpl_users (userAccessTokenDigest);
+
+-- Tokens are also issued outside this service, keep the digest in sync at write time
+DROP TRIGGER IF EXISTS trg_users_token_digest_insert;
+DROP TRIGGER IF EXISTS trg_users_token_digest_update;
+
+DELIMITER //
+CREATE TRIGGER trg_users_token_digest_insert BEFORE INSERT ON mtpl_users
+FOR EACH ROW
+BEGIN
+    SET NEW.userAccessTokenDigest = IF(NEW.userAccessToken IS NULL OR NEW.userAccessToken = '', NULL, SHA2(NEW.userAccessToken, 256));
+END//
+
+CREATE TRIGGER trg_users_token_digest_update BEFORE UPDATE ON mtpl_users
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.userAccessToken <=> OLD.userAccessToken) THEN
+        SET NEW.userAccessTokenDigest = IF(NEW.userAccessToken IS NULL OR NEW.userAccessToken = '', NULL, SHA2(NEW.userAccessToken, 256));
+    END IF;
+END//
+DELIMITER ;
+
+-- Verify structure
+SHOW INDEX FROM mtpl_users WHERE Key_name = 'idx_user_access_token_digest';
@@ -0,0 +1,15 @@
+-- One working report row per user and day, required by the bulk upsert
+-- (INSERT ... ON DUPLICATE KEY UPDATE) in working_reports.py
+USE mtpl_website;
+
+-- Remove duplicates left by the old per-day upsert loop, keeping the oldest row
+DELETE r1 FROM mtpl_working_reports r1
+JOIN mtpl_working_reports r2
+  ON r1.recordUserId = r2.recordUserId
+ AND r1.recordDate = r2.recordDate
+ AND r1.recordId > r2.recordId;
+
+ALTER TABLE mtpl_working_reports ADD UNIQUE KEY unique_user_date (recordUserId, recordDate);
+
+-- Verify structure
+SHOW INDEX FROM mtpl_working_reports;
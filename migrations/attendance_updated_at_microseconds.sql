@@ -0,0 +1,8 @@
+-- For databases that ran add_attendance_updated_at.sql while the column was
+-- DATETIME: store microseconds so two writes within one second still produce
+-- different polling versions. The index is rebuilt by the ALTER.
+USE mtpl_website;
+
+ALTER TABLE mtpl_attendance MODIFY COLUMN attendanceUpdatedAt DATETIME(6) NULL;
+
+SHOW COLUMNS FROM mtpl_attendance LIKE 'attendanceUpdatedAt';
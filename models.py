@@ -1,6 +1,7 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from database import db
 from sqlalchemy import and_
+from sqlalchemy.dialects import mysql
 import pytz
 
 IST = pytz.timezone('Asia/Kolkata')
@@ -9,6 +10,67 @@ def get_ist_now():
     return datetime.now(IST)
 
 
+def day_bounds(start_date, end_date):
+    """Half-open [start, end) datetime range covering start_date..end_date inclusive"""
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+    return start, end
+
+
+def load_users(user_ids):
+    """Resolve many user ids from the process-wide user directory -> {userId: UserRecord}"""
+    from user_directory import user_directory
+    return user_directory.get_many(user_ids)
+
+
+def get_row_user(row, user_id):
+    """User for user_id, taken from the batch prefetched by serialize_all when present"""
+    if user_id is None:
+        return None
+    users = row.__dict__.get('_prefetched_users')
+    if users is not None:
+        return users.get(user_id)
+    from user_directory import user_directory
+    return user_directory.get(user_id)
+
+
+def prefetch_users(rows):
+    """Attach the users referenced by rows (via their _user_id_fields) in one lookup"""
+    user_ids = set()
+    for row in rows:
+        for field in getattr(row, '_user_id_fields', ()):
+            user_ids.add(getattr(row, field))
+    users = load_users(user_ids)
+    for row in rows:
+        # A missing key means the user does not exist, so to_dict never queries again
+        row.__dict__['_prefetched_users'] = users
+    return users
+
+
+def serialize_all(rows):
+    """to_dict() a whole result set with a constant number of queries.
+
+    Users are resolved from the user directory; leave types (via a leave_type
+    relationship) and leave approvers are loaded up front into the identity map,
+    so none of them is fetched per row.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    prefetch_users(rows)
+    # Held until serialization: the identity map only keeps weak references, so
+    # related rows nobody references could be dropped and fetched again per row
+    preloaded = []
+    leave_type_ids = {getattr(r, r._leave_type_id_field) for r in rows if getattr(r, '_leave_type_id_field', None)}
+    if leave_type_ids:
+        preloaded += LeaveType.query.filter(LeaveType.leaveTypeId.in_(leave_type_ids)).all()
+    approver_ids = {getattr(r, r._approver_id_field) for r in rows if getattr(r, '_approver_id_field', None)}
+    if approver_ids:
+        from multilevel_models import LeaveApprover
+        preloaded += LeaveApprover.query.filter(LeaveApprover.approverId.in_(approver_ids)).all()
+    return [r.to_dict() for r in rows]
+
+
 class Settings(db.Model):
     __tablename__ = "mtpl_attendance_settings"
 
@@ -67,6 +129,8 @@ class Person(db.Model):
     biometricCreatedAt = db.Column('biometricCreatedAt', db.DateTime, default=get_ist_now)
     biometricIsActive = db.Column('biometricIsActive', db.Boolean, default=True)
 
+    _user_id_fields = ('biometricUserId',)
+
     @property
     def id(self):
         return self.biometricId
@@ -86,7 +150,7 @@ class Person(db.Model):
     @property
     def name(self):
         """Get user's full name from User table"""
-        user = User.query.filter_by(userId=self.biometricUserId).first()
+        user = get_row_user(self, self.biometricUserId)
         if user and user.userFirstName and user.userLastName:
             return f"{user.userFirstName} {user.userLastName}".strip()
         elif user and user.userFirstName:
@@ -97,14 +161,14 @@ class Person(db.Model):
     @property
     def employee_code(self):
         """Get employee code from User table"""
-        user = User.query.filter_by(userId=self.biometricUserId).first()
+        user = get_row_user(self, self.biometricUserId)
         if user and user.userLogin:
             return user.userLogin
         else:
             return str(self.biometricUserId)
 
     def to_dict(self):
-        user = User.query.filter_by(userId=self.biometricUserId).first()
+        user = get_row_user(self, self.biometricUserId)
         if user and user.userFirstName and user.userLastName:
             user_name = f"{user.userFirstName} {user.userLastName}".strip()
             employee_code = user.userLogin if user.userLogin else str(self.biometricUserId)
@@ -131,6 +195,7 @@ class User(db.Model):
     userLogin = db.Column('userLogin', db.String(16))
     userPassword = db.Column('userPassword', db.String(255))
     userAccessToken = db.Column('userAccessToken', db.Text)
+    userAccessTokenDigest = db.Column('userAccessTokenDigest', db.CHAR(64), unique=True, nullable=True)
     userRefreshToken = db.Column('userRefreshToken', db.Text)
     userIsActive = db.Column('userIsActive', db.String(1), default='1')
 
@@ -205,20 +270,25 @@ class LeaveType(db.Model):
 
 class UserLeaveBalance(db.Model):
     __tablename__ = "mtpl_user_leave_balance"
+    __table_args__ = (
+        db.UniqueConstraint('balanceUserId', 'balanceLeaveTypeId', 'balanceYear', name='unique_user_type_year'),
+    )
 
     balanceId = db.Column('balanceId', db.Integer, primary_key=True)
     balanceUserId = db.Column('balanceUserId', db.Integer, nullable=False, index=True)
     balanceLeaveTypeId = db.Column('balanceLeaveTypeId', db.Integer, db.ForeignKey('mtpl_leave_types.leaveTypeId'), nullable=False)
-    balanceTotal = db.Column('balanceTotal', db.Integer, default=0)
-    balanceUsed = db.Column('balanceUsed', db.Integer, default=0)
+    balanceTotal = db.Column('balanceTotal', db.Numeric(5, 1), default=0)
+    balanceUsed = db.Column('balanceUsed', db.Numeric(5, 1), default=0)
     balanceYear = db.Column('balanceYear', db.Integer, nullable=False, index=True)
     balanceUpdatedAt = db.Column('balanceUpdatedAt', db.DateTime, default=get_ist_now, onupdate=get_ist_now)
 
     leave_type = db.relationship('LeaveType', backref='balances')
 
+    _leave_type_id_field = 'balanceLeaveTypeId'
+
     @property
     def remaining(self):
-        return self.balanceTotal - self.balanceUsed
+        return (self.balanceTotal or 0) - (self.balanceUsed or 0)
 
     def to_dict(self):
         return {
@@ -226,15 +296,18 @@ class UserLeaveBalance(db.Model):
             "user_id": self.balanceUserId,
             "leave_type_id": self.balanceLeaveTypeId,
             "leave_type_name": self.leave_type.leaveTypeName,
-            "total": self.balanceTotal,
-            "used": self.balanceUsed,
-            "remaining": self.remaining,
+            "total": float(self.balanceTotal or 0),
+            "used": float(self.balanceUsed or 0),
+            "remaining": float(self.remaining),
             "year": self.balanceYear
         }
 
 
 class LeaveAllotment(db.Model):
     __tablename__ = "mtpl_leave_allotment"
+    __table_args__ = (
+        db.UniqueConstraint('allotmentUserId', 'allotmentLeaveTypeId', 'allotmentYear', name='unique_allotment_user_type_year'),
+    )
 
     allotmentId = db.Column('allotmentId', db.Integer, primary_key=True)
     allotmentUserId = db.Column('allotmentUserId', db.Integer, nullable=False, index=True)
@@ -247,11 +320,14 @@ class LeaveAllotment(db.Model):
 
     leave_type = db.relationship('LeaveType', backref='allotments')
 
+    _user_id_fields = ('allotmentUserId', 'allotmentAssignedBy')
+    _leave_type_id_field = 'allotmentLeaveTypeId'
+
     def to_dict(self):
-        user = User.query.filter_by(userId=self.allotmentUserId).first()
+        user = get_row_user(self, self.allotmentUserId)
         user_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.allotmentUserId)
         
-        assigned_by_user = User.query.filter_by(userId=self.allotmentAssignedBy).first() if self.allotmentAssignedBy else None
+        assigned_by_user = get_row_user(self, self.allotmentAssignedBy) if self.allotmentAssignedBy else None
         assigned_by_name = f"{assigned_by_user.userFirstName} {assigned_by_user.userLastName}" if assigned_by_user else None
         
         return {
@@ -271,6 +347,10 @@ class LeaveAllotment(db.Model):
 
 class LeaveRequest(db.Model):
     __tablename__ = "mtpl_leave_requests"
+    __table_args__ = (
+        db.Index('idx_leave_requests_usage', 'leaveRequestUserId', 'leaveRequestLeaveTypeId',
+                 'leaveRequestStatus', 'leaveRequestFromDate'),
+    )
     leaveRequestId = db.Column('leaveRequestId', db.Integer, primary_key=True)
     leaveRequestUserId = db.Column('leaveRequestUserId', db.Integer, nullable=False, index=True)
     leaveRequestLeaveTypeId = db.Column('leaveRequestLeaveTypeId', db.Integer, db.ForeignKey('mtpl_leave_types.leaveTypeId'), nullable=False)
@@ -279,14 +359,22 @@ class LeaveRequest(db.Model):
     leaveRequestDays = db.Column('leaveRequestDays', db.Numeric(5, 1), nullable=False)
     leaveRequestDayType = db.Column('leaveRequestDayType', db.String(10), default='full')
     leaveRequestReason = db.Column('leaveRequestReason', db.Text)
-    leaveRequestStatus = db.Column('leaveRequestStatus', db.String(20), default='pending')  # pending, approved, rejected
+    leaveRequestStatus = db.Column('leaveRequestStatus', db.String(20), default='pending')  # pending, approved, rejected, cancelled
     leaveRequestApprovedBy = db.Column('leaveRequestApprovedBy', db.Integer, nullable=True)
     leaveRequestApprovedAt = db.Column('leaveRequestApprovedAt', db.DateTime, nullable=True)
     leaveRequestRejectionReason = db.Column('leaveRequestRejectionReason', db.Text, nullable=True)
     leaveRequestCreatedAt = db.Column('leaveRequestCreatedAt', db.DateTime, default=get_ist_now)
+    # Multi-level approval counters, kept by approval_workflow
+    leaveRequestApprovalsRequired = db.Column('leaveRequestApprovalsRequired', db.Integer, nullable=False, default=0)
+    leaveRequestApprovalsApproved = db.Column('leaveRequestApprovalsApproved', db.Integer, nullable=False, default=0)
+    leaveRequestApprovalsRejected = db.Column('leaveRequestApprovalsRejected', db.Integer, nullable=False, default=0)
     leave_type = db.relationship('LeaveType', backref='requests')
+
+    _user_id_fields = ('leaveRequestUserId',)
+    _leave_type_id_field = 'leaveRequestLeaveTypeId'
+
     def to_dict(self):
-        user = User.query.filter_by(userId=self.leaveRequestUserId).first()
+        user = get_row_user(self, self.leaveRequestUserId)
         user_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.leaveRequestUserId)
         return {
             "id": self.leaveRequestId,
@@ -308,6 +396,9 @@ class LeaveRequest(db.Model):
 
 class MonthlyReport(db.Model):
     __tablename__ = "mtpl_monthly_reports"
+    __table_args__ = (
+        db.UniqueConstraint('reportUserId', 'reportMonth', 'reportYear', name='unique_user_month_year'),
+    )
 
     reportId = db.Column('reportId', db.Integer, primary_key=True)
     reportUserId = db.Column('reportUserId', db.Integer, nullable=False, index=True)
@@ -326,9 +417,11 @@ class MonthlyReport(db.Model):
     reportGeneratedAt = db.Column('reportGeneratedAt', db.DateTime, default=get_ist_now)
     reportUpdatedAt = db.Column('reportUpdatedAt', db.DateTime, default=get_ist_now, onupdate=get_ist_now)
 
+    _user_id_fields = ('reportUserId',)
+
     def to_dict(self):
         import json
-        user = User.query.filter_by(userId=self.reportUserId).first()
+        user = get_row_user(self, self.reportUserId)
         user_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.reportUserId)
         
         leave_details = []
@@ -361,6 +454,10 @@ class MonthlyReport(db.Model):
 
 class Attendance(db.Model):
     __tablename__ = "mtpl_attendance"
+    __table_args__ = (
+        db.Index('idx_attendance_user_timestamp', 'attendanceUserId', 'attendanceTimestamp'),
+        db.Index('idx_attendance_timestamp_clock_in', 'attendanceTimestamp', 'attendanceClockInTime'),
+    )
 
     attendanceId = db.Column('attendanceId', db.Integer, primary_key=True)
     attendanceUserId = db.Column('attendanceUserId', db.Integer, nullable=False)
@@ -375,6 +472,19 @@ class Attendance(db.Model):
     attendanceClockOutTime = db.Column('attendanceClockOutTime', db.DateTime, nullable=True)
     attendanceBreakInTime = db.Column('attendanceBreakInTime', db.DateTime, nullable=True)
     attendanceBreakOutTime = db.Column('attendanceBreakOutTime', db.DateTime, nullable=True)
+    # Last insert or punch on the row; MAX() of it versions the polling endpoints.
+    # Microsecond precision on MySQL, or two writes in the same second would share a version.
+    attendanceUpdatedAt = db.Column(
+        'attendanceUpdatedAt', db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql'),
+        default=get_ist_now, onupdate=get_ist_now, index=True
+    )
+
+    _user_id_fields = ('attendanceUserId',)
+
+    @classmethod
+    def in_period(cls, start, end):
+        """Index-friendly attendanceTimestamp filter for the half-open range [start, end)"""
+        return and_(cls.attendanceTimestamp >= start, cls.attendanceTimestamp < end)
 
     @property
     def id(self):
@@ -413,7 +523,7 @@ class Attendance(db.Model):
         return Person.query.filter_by(biometricUserId=self.attendanceUserId).first()
     
     def to_dict(self):
-        user = User.query.filter_by(userId=self.attendanceUserId).first()
+        user = get_row_user(self, self.attendanceUserId)
         person_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.attendanceUserId)
         employee_code = user.userLogin if user else str(self.attendanceUserId)
         
@@ -438,6 +548,9 @@ class Attendance(db.Model):
 
 class DailyAttendanceSummary(db.Model):
     __tablename__ = "mtpl_daily_attendance_summary"
+    __table_args__ = (
+        db.UniqueConstraint('summaryUserId', 'summaryDate', name='unique_summary_user_date'),
+    )
 
     summaryId = db.Column('summaryId', db.Integer, primary_key=True)
     summaryUserId = db.Column('summaryUserId', db.Integer, nullable=False, index=True)
@@ -461,6 +574,41 @@ class DailyAttendanceSummary(db.Model):
         }
 
 
+class DailyAttendanceRollup(db.Model):
+    __tablename__ = "mtpl_daily_attendance_rollups"
+
+    rollupId = db.Column('rollupId', db.Integer, primary_key=True)
+    rollupDate = db.Column('rollupDate', db.Date, unique=True, nullable=False)
+    rollupClockIns = db.Column('rollupClockIns', db.Integer, default=0)
+    rollupPresent = db.Column('rollupPresent', db.Integer, default=0)
+    rollupLate = db.Column('rollupLate', db.Integer, default=0)
+    rollupOvertime = db.Column('rollupOvertime', db.Integer, default=0)
+    rollupHeadcount = db.Column('rollupHeadcount', db.Integer, default=0)
+    rollupUpdatedAt = db.Column('rollupUpdatedAt', db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+
+    @property
+    def absent(self):
+        return max(0, (self.rollupHeadcount or 0) - (self.rollupPresent or 0))
+
+    def to_dict(self):
+        return {
+            "date": self.rollupDate.isoformat(),
+            "clock_ins": self.rollupClockIns,
+            "present": self.rollupPresent,
+            "late": self.rollupLate,
+            "overtime": self.rollupOvertime,
+            "absent": self.absent
+        }
+
+
+class ReportVersion(db.Model):
+    """Data-version counter per report scope (e.g. one user's month), bumped by writes"""
+    __tablename__ = "mtpl_report_versions"
+
+    versionScope = db.Column('versionScope', db.String(64), primary_key=True)
+    versionValue = db.Column('versionValue', db.Integer, nullable=False, default=0)
+
+
 class ManualTimeEntry(db.Model):
     __tablename__ = "mtpl_manual_time_entries"
 
@@ -475,8 +623,10 @@ class ManualTimeEntry(db.Model):
     entryUpdatedAt = db.Column("entryUpdatedAt", db.DateTime, default=get_ist_now, onupdate=get_ist_now)
     entryCreatedBy = db.Column("entryCreatedBy", db.Integer, nullable=True)
 
+    _user_id_fields = ('entryUserId',)
+
     def to_dict(self):
-        user = User.query.filter_by(userId=self.entryUserId).first()
+        user = get_row_user(self, self.entryUserId)
         user_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.entryUserId)
         employee_code = user.userLogin if user else str(self.entryUserId)
 
@@ -498,6 +648,9 @@ class ManualTimeEntry(db.Model):
 
 class WorkingRecord(db.Model):
     __tablename__ = "mtpl_working_reports"
+    __table_args__ = (
+        db.UniqueConstraint('recordUserId', 'recordDate', name='unique_user_date'),
+    )
 
     recordId = db.Column("recordId", db.Integer, primary_key=True)
     recordUserId = db.Column("recordUserId", db.Integer, nullable=False, index=True)
@@ -509,8 +662,10 @@ class WorkingRecord(db.Model):
     recordCreatedAt = db.Column("recordCreatedAt", db.DateTime, default=get_ist_now)
     recordUpdatedAt = db.Column("recordUpdatedAt", db.DateTime, default=get_ist_now, onupdate=get_ist_now)
 
+    _user_id_fields = ('recordUserId',)
+
     def to_dict(self):
-        user = User.query.filter_by(userId=self.recordUserId).first()
+        user = get_row_user(self, self.recordUserId)
         user_name = f"{user.userFirstName} {user.userLastName}" if user else str(self.recordUserId)
 
         return {
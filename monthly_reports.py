@@ -0,0 +1,264 @@
+"""
+Monthly report engine
+Computes mtpl_monthly_reports rows for many users at once: the month's attendance
+and approved leaves are read with one query each, holidays come from the work
+calendar, metrics are grouped per user with numpy and the results are written
+with bulk upserts.
+"""
+import json
+import logging
+import time
+from calendar import monthrange
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select
+
+from bulk_ops import upsert_rows, UPSERT_CHUNK_SIZE
+from database import db
+from models import Attendance, LeaveRequest, LeaveType, MonthlyReport, get_ist_now, day_bounds
+from report_cache import bump, SAVED_MONTHLY_SCOPE
+from work_calendar import work_calendar
+from work_hours import compute, to_datetime64
+
+USER_FILTER_LIMIT = 500  # below this many users, filter attendance by user instead of scanning the month
+
+logger = logging.getLogger(__name__)
+
+
+def _attendance_metrics(user_ids, month_start, month_end):
+    """Per-user (total hours, worked days, on time, late in, early out) arrays aligned with user_ids"""
+    stmt = select(
+        Attendance.attendanceUserId,
+        Attendance.attendanceClockInTime,
+        Attendance.attendanceClockOutTime,
+        Attendance.attendanceBreakInTime,
+        Attendance.attendanceBreakOutTime,
+    ).where(
+        Attendance.in_period(month_start, month_end),
+        Attendance.attendanceClockInTime.isnot(None),
+    )
+    if len(user_ids) < USER_FILTER_LIMIT:
+        stmt = stmt.where(Attendance.attendanceUserId.in_(user_ids.tolist()))
+    rows = db.session.execute(stmt).all()
+
+    n = len(user_ids)
+    if not rows:
+        zeros = np.zeros(n, dtype=np.int64)
+        return np.zeros(n), zeros, zeros, zeros, zeros
+
+    owners = np.array([r[0] for r in rows], dtype=np.int64)
+    known = np.isin(owners, user_ids)
+    idx = np.searchsorted(user_ids, owners[known])
+    metrics = compute(*(to_datetime64(column)[known] for column in list(zip(*rows))[1:]))
+    late = metrics["late"]
+
+    return (
+        np.bincount(idx, weights=metrics["worked_hours"], minlength=n),
+        np.bincount(idx, minlength=n),
+        np.bincount(idx, weights=~late, minlength=n).astype(np.int64),
+        np.bincount(idx, weights=late, minlength=n).astype(np.int64),
+        np.bincount(idx, weights=metrics["early_out"], minlength=n).astype(np.int64),
+    )
+
+
+def _leave_summaries(user_ids, first_day, last_day):
+    """{userId: (days, [{type, days, is_paid}, ...])} for approved leaves overlapping the month"""
+    query = db.session.query(
+        LeaveRequest.leaveRequestUserId,
+        LeaveRequest.leaveRequestDays,
+        LeaveType.leaveTypeName,
+        LeaveType.leaveTypeIsPaid,
+    ).join(
+        LeaveType, LeaveType.leaveTypeId == LeaveRequest.leaveRequestLeaveTypeId
+    ).filter(
+        LeaveRequest.leaveRequestStatus == 'approved',
+        LeaveRequest.leaveRequestFromDate <= last_day,
+        LeaveRequest.leaveRequestToDate >= first_day,
+        LeaveRequest.leaveRequestUserId.in_(user_ids.tolist()),
+    ).order_by(LeaveRequest.leaveRequestId)
+
+    totals, by_user = {}, {}
+    for user_id, days, type_name, is_paid in query:
+        by_type = by_user.setdefault(user_id, {})
+        entry = by_type.setdefault(type_name, {'type': type_name, 'days': 0, 'is_paid': bool(is_paid)})
+        entry['days'] += float(days)
+        totals[user_id] = totals.get(user_id, 0) + float(days)
+    return {uid: (totals[uid], list(by_type.values())) for uid, by_type in by_user.items()}
+
+
+def build_monthly_reports(year, month, user_ids):
+    """Compute report dicts (same shape as /api/attendance/monthly-report) for user_ids"""
+    user_ids = np.unique(np.array([int(uid) for uid in user_ids], dtype=np.int64))
+    days_in_month = monthrange(year, month)[1]
+    first_day, last_day = date(year, month, 1), date(year, month, days_in_month)
+    month_start, month_end = day_bounds(first_day, last_day)
+
+    working_days, total_holidays, total_weekoffs = work_calendar.counts(first_day, last_day)
+
+    hours, worked_days, on_time, late_in, early_out = _attendance_metrics(user_ids, month_start, month_end)
+    leaves = _leave_summaries(user_ids, first_day, last_day)
+
+    reports = []
+    for i, user_id in enumerate(user_ids.tolist()):
+        leave_days, leave_details = leaves.get(user_id, (0, []))
+        reports.append({
+            "user_id": user_id,
+            "month": month,
+            "year": year,
+            "total_working_hours": round(float(hours[i]), 2),
+            "worked_days": int(worked_days[i]),
+            "total_weekly_off": total_weekoffs,
+            "holidays": total_holidays,
+            "leaves_taken": leave_days,
+            "leave_details": leave_details,
+            "on_time_entries": int(on_time[i]),
+            "early_out": int(early_out[i]),
+            "late_in": int(late_in[i]),
+            "absent_days": max(0, working_days - int(worked_days[i]) - leave_days),
+        })
+    return reports
+
+
+def save_monthly_reports(reports, progress=None):
+    """Bulk upsert report dicts into mtpl_monthly_reports; progress(done, total) after each chunk"""
+    now = get_ist_now()
+    rows = [{
+        "reportUserId": r["user_id"],
+        "reportMonth": r["month"],
+        "reportYear": r["year"],
+        "reportTotalWorkingHours": r["total_working_hours"],
+        "reportWorkedDays": r["worked_days"],
+        "reportTotalWeeklyOff": r["total_weekly_off"],
+        "reportHolidays": r["holidays"],
+        "reportLeavesTaken": r["leaves_taken"],
+        "reportLeaveDetails": json.dumps(r["leave_details"]),
+        "reportOnTimeEntries": r["on_time_entries"],
+        "reportEarlyOut": r["early_out"],
+        "reportLateIn": r["late_in"],
+        "reportAbsentDays": r["absent_days"],
+        "reportGeneratedAt": now,
+        "reportUpdatedAt": now,
+    } for r in reports]
+    update_columns = [c for c in rows[0] if c not in ("reportUserId", "reportMonth", "reportYear", "reportGeneratedAt")] if rows else []
+
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        upsert_rows(
+            MonthlyReport, rows[start:start + UPSERT_CHUNK_SIZE],
+            key_columns=("reportUserId", "reportMonth", "reportYear"),
+            update_columns=update_columns,
+        )
+        if progress:
+            progress(min(start + UPSERT_CHUNK_SIZE, len(rows)), len(rows))
+    if rows:
+        bump([SAVED_MONTHLY_SCOPE])
+    db.session.commit()
+    return len(rows)
+
+
+def generate_monthly_reports(year, month, user_ids=None, progress=None):
+    """Build and store the month's reports for user_ids (default: every active user).
+
+    Returns a summary with the number of reports written and per-phase timings in seconds.
+    """
+    from user_directory import user_directory
+
+    started = time.perf_counter()
+    if user_ids is None:
+        user_ids = [u.userId for u in user_directory.active_users()]
+
+    reports = build_monthly_reports(year, month, user_ids)
+    computed = time.perf_counter()
+    saved = save_monthly_reports(reports, progress=progress)
+    finished = time.perf_counter()
+
+    summary = {
+        "month": month,
+        "year": year,
+        "users": len(reports),
+        "saved": saved,
+        "timings": {
+            "compute_seconds": round(computed - started, 3),
+            "save_seconds": round(finished - computed, 3),
+            "total_seconds": round(finished - started, 3),
+        },
+    }
+    logger.info("Monthly reports %02d/%d: %d users in %.2fs", month, year, saved, finished - started)
+    return summary
+
+
+def add_monthly_report_routes(app, db):
+    import click
+    from flask import request, jsonify
+    from auth import token_required
+
+    @app.route("/api/monthly-reports/generate", methods=["POST"])
+    @token_required
+    def api_generate_monthly_reports():
+        """
+        Generate Monthly Reports For All Users
+        ---
+        tags:
+          - Reports
+        parameters:
+          - name: body
+            in: body
+            required: true
+            schema:
+              type: object
+              required:
+                - month
+                - year
+              properties:
+                month:
+                  type: integer
+                  example: 1
+                year:
+                  type: integer
+                  example: 2025
+                user_ids:
+                  type: array
+                  items:
+                    type: integer
+                  description: Optional subset of users (defaults to every active user)
+        responses:
+          200:
+            description: Reports generated with timing information
+          400:
+            description: Invalid month, year or user_ids
+        """
+        data = request.get_json() or {}
+        try:
+            month = int(data.get('month'))
+            year = int(data.get('year'))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "month and year required"}), 400
+        if not 1 <= month <= 12:
+            return jsonify({"success": False, "error": "month must be between 1 and 12"}), 400
+
+        user_ids = data.get('user_ids')
+        if user_ids is not None and (
+            not isinstance(user_ids, list)
+            or not all(isinstance(uid, int) and not isinstance(uid, bool) for uid in user_ids)
+        ):
+            return jsonify({"success": False, "error": "user_ids must be a list of integers"}), 400
+
+        summary = generate_monthly_reports(year, month, user_ids=user_ids)
+        return jsonify({"success": True, **summary})
+
+    @app.cli.command("generate-monthly-reports")
+    @click.option("--month", type=click.IntRange(1, 12), required=True, help="Month (1-12)")
+    @click.option("--year", type=int, required=True, help="Year")
+    def generate_monthly_reports_command(month, year):
+        """Generate and store monthly reports for every active user."""
+        def progress(done, total):
+            click.echo(f"  saved {done}/{total}")
+
+        click.echo(f"Generating monthly reports for {month:02d}/{year}...")
+        summary = generate_monthly_reports(year, month, progress=progress)
+        timings = summary["timings"]
+        click.echo(
+            f"Done: {summary['saved']} reports "
+            f"(compute {timings['compute_seconds']}s, save {timings['save_seconds']}s, "
+            f"total {timings['total_seconds']}s)"
+        )
@@ -3,8 +3,14 @@
 def add_multilevel_approval_routes(app, db):
     from flask import request, jsonify
     from multilevel_models import LeaveApprover, LeaveApproval
-    from models import LeaveRequest, get_ist_now
+    from datetime import datetime
+    from models import LeaveRequest, LeaveType, User, serialize_all
+    from leave_balances import lock_leave_request
+    from approval_workflow import build_approvals, insert_approvals, decide_approval, ApprovalError
+    from approval_notifications import approval_dispatcher
+    from pagination import paginate, page_args, PaginationError
     from sqlalchemy import and_
+    from sqlalchemy.orm import aliased
 
     # ===== APPROVER MANAGEMENT =====
     
@@ -106,40 +112,41 @@ def add_multilevel_approval_routes(app, db):
                   type: array
                   items:
                     type: integer
+                sequential:
+                  type: boolean
+                  description: Approvers decide in the given order (one level each)
         responses:
           200:
             description: Approvers assigned to request
         """
         data = request.get_json() or {}
         approver_ids = data.get('approver_ids', [])
+        sequential = bool(data.get('sequential', False))
         
         if not approver_ids:
             return jsonify({"success": False, "error": "approver_ids required"}), 400
         
-        leave_request = LeaveRequest.query.get(request_id)
+        leave_request = lock_leave_request(request_id)
         if not leave_request:
             return jsonify({"success": False, "error": "Leave request not found"}), 404
         
+        if leave_request.leaveRequestStatus != 'pending':
+            return jsonify({"success": False, "error": "Request already processed"}), 400
+        
         # Clear existing approvals
         LeaveApproval.query.filter_by(approvalLeaveRequestId=request_id).delete()
         
         # Add new approvals
-        approvals = []
-        for approver_id in approver_ids:
-            approval = LeaveApproval(
-                approvalLeaveRequestId=request_id,
-                approvalApproverId=approver_id,
-                approvalUserId=leave_request.leaveRequestUserId
-            )
-            db.session.add(approval)
-            approvals.append(approval)
-        
+        insert_approvals(build_approvals(leave_request, approver_ids, sequential))
         db.session.commit()
+        approval_dispatcher.wake()
+        
+        approvals = LeaveApproval.query.filter_by(approvalLeaveRequestId=request_id).order_by(LeaveApproval.approvalId).all()
         
         return jsonify({
             "success": True, 
             "count": len(approvals),
-            "approvals": [a.to_dict() for a in approvals]
+            "approvals": serialize_all(approvals)
         })
 
     @app.route("/api/leave-requests/<int:request_id>/approvals", methods=["GET"])
@@ -176,7 +183,7 @@ def add_multilevel_approval_routes(app, db):
         
         return jsonify({
             "success": True,
-            "approvals": [a.to_dict() for a in approvals],
+            "approvals": serialize_all(approvals),
             "summary": {
                 "total": total_approvals,
                 "approved": approved_count,
@@ -212,39 +219,19 @@ def add_multilevel_approval_routes(app, db):
         data = request.get_json() or {}
         comments = data.get('comments', '')
         
-        approval = LeaveApproval.query.get(approval_id)
-        if not approval:
-            return jsonify({"success": False, "error": "Approval not found"}), 404
-        
-        if approval.approvalStatus != 'pending':
-            return jsonify({"success": False, "error": "Already processed"}), 400
-        
-        approval.approvalStatus = 'approved'
-        approval.approvalComments = comments
-        approval.approvalApprovedAt = get_ist_now()
-        
-        # Check if all approvals are done
-        all_approvals = LeaveApproval.query.filter_by(
-            approvalLeaveRequestId=approval.approvalLeaveRequestId
-        ).all()
-        
-        all_approved = all([a.approvalStatus == 'approved' for a in all_approvals])
-        any_rejected = any([a.approvalStatus == 'rejected' for a in all_approvals])
-        
-        # Update leave request status
-        leave_request = LeaveRequest.query.get(approval.approvalLeaveRequestId)
-        if any_rejected:
-            leave_request.leaveRequestStatus = 'rejected'
-        elif all_approved:
-            leave_request.leaveRequestStatus = 'approved'
-            # Deduct from balance here if needed
+        try:
+            approval, leave_request = decide_approval(approval_id, 'approved', comments)
+        except ApprovalError as e:
+            db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), e.status_code
         
         db.session.commit()
+        approval_dispatcher.wake()
         
         return jsonify({
             "success": True,
             "approval": approval.to_dict(),
-            "all_approved": all_approved,
+            "all_approved": leave_request.leaveRequestStatus == 'approved',
             "request_status": leave_request.leaveRequestStatus
         })
 
@@ -274,22 +261,15 @@ def add_multilevel_approval_routes(app, db):
         data = request.get_json() or {}
         comments = data.get('comments', '')
         
-        approval = LeaveApproval.query.get(approval_id)
-        if not approval:
-            return jsonify({"success": False, "error": "Approval not found"}), 404
-        
-        if approval.approvalStatus != 'pending':
-            return jsonify({"success": False, "error": "Already processed"}), 400
-        
-        approval.approvalStatus = 'rejected'
-        approval.approvalComments = comments
-        approval.approvalApprovedAt = get_ist_now()
-        
-        # Reject the entire leave request
-        leave_request = LeaveRequest.query.get(approval.approvalLeaveRequestId)
-        leave_request.leaveRequestStatus = 'rejected'
+        # A single rejection rejects the entire leave request
+        try:
+            approval, leave_request = decide_approval(approval_id, 'rejected', comments)
+        except ApprovalError as e:
+            db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), e.status_code
         
         db.session.commit()
+        approval_dispatcher.wake()
         
         return jsonify({
             "success": True,
@@ -299,7 +279,39 @@ def add_multilevel_approval_routes(app, db):
 
     @app.route("/api/my-pending-approvals/<int:approver_user_id>", methods=["GET"])
     def api_get_my_pending_approvals(approver_user_id):
-        """Get Pending Approvals for Specific Approver"""
+        """
+        Get Pending Approvals for Specific Approver
+        ---
+        tags:
+          - Multi-Level Approval
+        parameters:
+          - name: approver_user_id
+            in: path
+            type: integer
+            required: true
+          - name: from
+            in: query
+            type: string
+            description: Only leaves ending on or after this date (YYYY-MM-DD)
+          - name: to
+            in: query
+            type: string
+            description: Only leaves starting on or before this date (YYYY-MM-DD)
+          - name: leave_type_id
+            in: query
+            type: integer
+          - name: limit
+            in: query
+            type: integer
+            description: Page size (default 100, max 500)
+          - name: cursor
+            in: query
+            type: string
+            description: next_cursor from the previous page
+        responses:
+          200:
+            description: Pending approvals with their leave requests, oldest first
+        """
         # Find approver
         approver = LeaveApprover.query.filter_by(
             approverUserId=approver_user_id,
@@ -309,25 +321,102 @@ def add_multilevel_approval_routes(app, db):
         if not approver:
             return jsonify({"success": False, "error": "Not an approver"}), 404
         
-        # Get pending approvals
-        pending_approvals = LeaveApproval.query.filter_by(
-            approvalApproverId=approver.approverId,
-            approvalStatus='pending'
-        ).all()
+        # One joined query: approval, leave request, leave type and both users
+        requester = aliased(User)
+        approval_user = aliased(User)
+        query = db.session.query(
+            LeaveApproval.approvalId, LeaveApproval.approvalLeaveRequestId, LeaveApproval.approvalUserId,
+            LeaveApproval.approvalStatus, LeaveApproval.approvalLevel, LeaveApproval.approvalComments,
+            LeaveApproval.approvalApprovedAt, LeaveApproval.approvalCreatedAt,
+            LeaveRequest.leaveRequestUserId, LeaveRequest.leaveRequestLeaveTypeId,
+            LeaveRequest.leaveRequestFromDate, LeaveRequest.leaveRequestToDate,
+            LeaveRequest.leaveRequestDays, LeaveRequest.leaveRequestDayType,
+            LeaveRequest.leaveRequestReason, LeaveRequest.leaveRequestStatus,
+            LeaveRequest.leaveRequestApprovedBy, LeaveRequest.leaveRequestApprovedAt,
+            LeaveRequest.leaveRequestRejectionReason, LeaveRequest.leaveRequestCreatedAt,
+            LeaveType.leaveTypeName,
+            requester.userFirstName.label('requesterFirstName'),
+            requester.userLastName.label('requesterLastName'),
+            approval_user.userFirstName.label('approvalUserFirstName'),
+            approval_user.userLastName.label('approvalUserLastName'),
+        ).join(
+            LeaveRequest, LeaveRequest.leaveRequestId == LeaveApproval.approvalLeaveRequestId
+        ).join(
+            LeaveType, LeaveType.leaveTypeId == LeaveRequest.leaveRequestLeaveTypeId
+        ).outerjoin(
+            requester, requester.userId == LeaveRequest.leaveRequestUserId
+        ).outerjoin(
+            approval_user, approval_user.userId == LeaveApproval.approvalUserId
+        ).filter(
+            LeaveApproval.approvalApproverId == approver.approverId,
+            LeaveApproval.approvalStatus == 'pending',
+            LeaveRequest.leaveRequestStatus == 'pending',
+            # Sequential chains: only levels whose earlier approvals are all in
+            LeaveApproval.approvalUnlockCount <= LeaveRequest.leaveRequestApprovalsApproved
+        )
         
-        # Get leave request details
-        results = []
-        for approval in pending_approvals:
-            leave_request = LeaveRequest.query.get(approval.approvalLeaveRequestId)
-            if leave_request:
-                result = approval.to_dict()
-                result['leave_request'] = leave_request.to_dict()
-                results.append(result)
+        try:
+            if request.args.get('from'):
+                from_date = datetime.strptime(request.args['from'], "%Y-%m-%d").date()
+                query = query.filter(LeaveRequest.leaveRequestToDate >= from_date)
+            if request.args.get('to'):
+                to_date = datetime.strptime(request.args['to'], "%Y-%m-%d").date()
+                query = query.filter(LeaveRequest.leaveRequestFromDate <= to_date)
+        except ValueError:
+            return jsonify({"success": False, "error": "from and to must be YYYY-MM-DD"}), 400
+        leave_type_id = request.args.get('leave_type_id', type=int)
+        if leave_type_id:
+            query = query.filter(LeaveRequest.leaveRequestLeaveTypeId == leave_type_id)
+        
+        try:
+            limit, cursor = page_args(request.args)
+            rows, next_cursor = paginate(query, [
+                (LeaveApproval.approvalCreatedAt, False),
+                (LeaveApproval.approvalId, False),
+            ], limit, cursor)
+        except PaginationError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        def iso(value):
+            return value.isoformat() + "Z" if value else None
+        
+        results = [{
+            "id": r.approvalId,
+            "leave_request_id": r.approvalLeaveRequestId,
+            "approver_id": approver.approverId,
+            "approver_name": approver.approverName,
+            "approver_role": approver.approverRole,
+            "user_id": r.approvalUserId,
+            "user_name": f"{r.approvalUserFirstName} {r.approvalUserLastName}" if r.approvalUserFirstName is not None else "Unknown",
+            "status": r.approvalStatus,
+            "level": r.approvalLevel,
+            "comments": r.approvalComments,
+            "approved_at": iso(r.approvalApprovedAt),
+            "created_at": iso(r.approvalCreatedAt),
+            "leave_request": {
+                "id": r.approvalLeaveRequestId,
+                "user_id": r.leaveRequestUserId,
+                "user_name": f"{r.requesterFirstName} {r.requesterLastName}" if r.requesterFirstName is not None else str(r.leaveRequestUserId),
+                "leave_type_id": r.leaveRequestLeaveTypeId,
+                "leave_type_name": r.leaveTypeName,
+                "from_date": r.leaveRequestFromDate.isoformat(),
+                "to_date": r.leaveRequestToDate.isoformat(),
+                "days": float(r.leaveRequestDays),
+                "day_type": r.leaveRequestDayType,
+                "reason": r.leaveRequestReason,
+                "status": r.leaveRequestStatus,
+                "approved_by": r.leaveRequestApprovedBy,
+                "approved_at": iso(r.leaveRequestApprovedAt),
+                "rejection_reason": r.leaveRequestRejectionReason,
+                "created_at": iso(r.leaveRequestCreatedAt)
+            }
+        } for r in rows]
         
         return jsonify({
             "success": True,
             "approver": approver.to_dict(),
-            "pending_approvals": results
+            "pending_approvals": results,
+            "next_cursor": next_cursor
         })
 
     return app
\ No newline at end of file
@@ -1,4 +1,5 @@
 """Multi-Level Approval Models"""
+import json
 from datetime import datetime
 from database import db
 import pytz
@@ -32,20 +33,29 @@ class LeaveApprover(db.Model):
 
 class LeaveApproval(db.Model):
     __tablename__ = "mtpl_leave_approvals"
+    __table_args__ = (
+        db.Index('idx_leave_approvals_inbox', 'approvalApproverId', 'approvalStatus', 'approvalCreatedAt'),
+    )
 
     approvalId = db.Column('approvalId', db.Integer, primary_key=True)
     approvalLeaveRequestId = db.Column('approvalLeaveRequestId', db.Integer, nullable=False, index=True)
     approvalApproverId = db.Column('approvalApproverId', db.Integer, nullable=False, index=True)
     approvalUserId = db.Column('approvalUserId', db.Integer, nullable=True, index=True)
     approvalStatus = db.Column('approvalStatus', db.Enum('pending', 'approved', 'rejected'), default='pending')
+    approvalLevel = db.Column('approvalLevel', db.Integer, nullable=False, default=1)
+    # Approvals at earlier levels; this one can be decided once the request has that many approvals
+    approvalUnlockCount = db.Column('approvalUnlockCount', db.Integer, nullable=False, default=0)
     approvalComments = db.Column('approvalComments', db.Text)
     approvalApprovedAt = db.Column('approvalApprovedAt', db.DateTime, nullable=True)
     approvalCreatedAt = db.Column('approvalCreatedAt', db.DateTime, default=get_ist_now)
 
+    _user_id_fields = ('approvalUserId',)
+    _approver_id_field = 'approvalApproverId'
+
     def to_dict(self):
         approver = LeaveApprover.query.get(self.approvalApproverId)
-        from models import User
-        user = User.query.get(self.approvalUserId) if self.approvalUserId else None
+        from models import get_row_user
+        user = get_row_user(self, self.approvalUserId)
         
         return {
             "id": self.approvalId,
@@ -56,7 +66,40 @@ class LeaveApproval(db.Model):
             "user_id": self.approvalUserId,
             "user_name": f"{user.userFirstName} {user.userLastName}" if user else "Unknown",
             "status": self.approvalStatus,
+            "level": self.approvalLevel,
             "comments": self.approvalComments,
             "approved_at": self.approvalApprovedAt.isoformat() + "Z" if self.approvalApprovedAt else None,
             "created_at": self.approvalCreatedAt.isoformat() + "Z"
-        }
\ No newline at end of file
+        }
+
+class ApprovalOutbox(db.Model):
+    """Approval notifications waiting for the dispatcher (approval_notifications.py)"""
+    __tablename__ = "mtpl_approval_outbox"
+    __table_args__ = (
+        db.Index('idx_approval_outbox_pending', 'outboxDispatchedAt', 'outboxId'),
+    )
+
+    outboxId = db.Column('outboxId', db.Integer, primary_key=True)
+    outboxEventType = db.Column('outboxEventType', db.String(50), nullable=False)
+    outboxRecipientUserId = db.Column('outboxRecipientUserId', db.Integer, nullable=False)
+    outboxPayload = db.Column('outboxPayload', db.Text, nullable=False)
+    outboxAttempts = db.Column('outboxAttempts', db.Integer, nullable=False, default=0)
+    outboxLastError = db.Column('outboxLastError', db.String(500), nullable=True)
+    outboxCreatedAt = db.Column('outboxCreatedAt', db.DateTime, default=get_ist_now)
+    outboxDispatchedAt = db.Column('outboxDispatchedAt', db.DateTime, nullable=True)
+    # Set while a dispatcher delivers the event; an expired claim is picked up again
+    outboxClaimedUntil = db.Column('outboxClaimedUntil', db.DateTime, nullable=True)
+    # Comma separated channels (sse, webhook, email) the event already reached
+    outboxDeliveredChannels = db.Column('outboxDeliveredChannels', db.String(50), nullable=True)
+
+    def delivered_channels(self):
+        return set(filter(None, (self.outboxDeliveredChannels or '').split(',')))
+
+    def to_event(self):
+        return {
+            "id": self.outboxId,
+            "type": self.outboxEventType,
+            "recipient_user_id": self.outboxRecipientUserId,
+            "data": json.loads(self.outboxPayload),
+            "created_at": self.outboxCreatedAt.isoformat() + "Z"
+        }
@@ -0,0 +1,99 @@
+"""
+Keyset pagination for list endpoints
+Pages are addressed by an opaque cursor holding the sort key values of the last row
+returned, so each page is an index range read and rows inserted between requests
+never shift or duplicate later pages.
+"""
+import base64
+import json
+from datetime import datetime, date
+
+from sqlalchemy import and_, or_, false
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        return [_load(column, value) for (column, _), value in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+
+def page_args(args):
+    """(limit, cursor) from request args; raises PaginationError for a bad limit"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE), args.get('cursor') or None
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _after(column, value, descending):
+    """Rows sorting strictly after value; NULL sorts before every value, as in MySQL and SQLite"""
+    if value is None:
+        return false() if descending else column.isnot(None)
+    if descending:
+        return or_(column < value, column.is_(None)) if column.nullable else column < value
+    return column > value
+
+
+def paginate(query, keys, limit, cursor=None):
+    """Return (rows, next_cursor) for one page of query.
+
+    keys is the sort order as [(column, descending), ...] and must end with a
+    unique column (the primary key) so that the order is total. Nullable sort
+    columns are allowed. next_cursor is None on the last page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        clauses = []
+        for i, (column, descending) in enumerate(keys):
+            step = _after(column, values[i], descending)
+            clauses.append(and_(*[_equal(keys[j][0], values[j]) for j in range(i)], step))
+        query = query.filter(or_(*clauses))
+
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in keys])
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column, _ in keys])
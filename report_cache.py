@@ -0,0 +1,183 @@
+"""
+Report response cache
+Report endpoints cache their JSON body keyed by (endpoint, params) plus the data
+versions of the scopes the report reads: one counter per user and month, and
+shared counters for the holiday calendar, the saved monthly reports and the
+settings reports compute with.
+Attendance, manual-entry, leave and holiday writes bump the matching counters in
+mtpl_report_versions inside their own transaction, so a report is recomputed
+only after its data really changed. Bodies live in an in-memory LRU and, when
+REPORT_CACHE_PATH is set, in a local SQLite file shared by the app processes on
+the host. The versioned key doubles as the ETag, so If-None-Match gets a 304
+without touching the report tables.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response
+
+from bulk_ops import increment_rows
+from database import db
+from http_cache import is_current, not_modified, with_validators
+from models import ReportVersion
+
+CALENDAR_SCOPE = 'calendar'  # holidays and week-offs
+SAVED_MONTHLY_SCOPE = 'monthly-reports'  # rows in mtpl_monthly_reports
+SETTINGS_SCOPE = 'settings'  # options reports compute with, e.g. standard working hours
+DISK_PRUNE_EVERY = 500  # writes between trims of the SQLite tier
+
+logger = logging.getLogger(__name__)
+
+
+def month_scopes(user_id, start_date, end_date):
+    """Scopes 'user:<id>:<yyyy-mm>' for every month from start_date to end_date"""
+    scopes = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        scopes.append(f"user:{int(user_id)}:{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return scopes
+
+
+def bump(scopes):
+    """Increment the data version of scopes in the current transaction. Does not commit."""
+    # Sorted so concurrent writers lock version rows in the same order
+    rows = [{"versionScope": scope, "versionValue": 1} for scope in sorted(set(scopes))]
+    return increment_rows(ReportVersion, rows, ("versionScope",), ("versionValue",))
+
+
+def bump_user(user_id, start_date, end_date=None):
+    """bump() every month of one user's data between start_date and end_date"""
+    return bump(month_scopes(user_id, start_date, end_date or start_date))
+
+
+def versions(scopes):
+    """Current version of each scope (0 for scopes never written)"""
+    found = dict(db.session.query(ReportVersion.versionScope, ReportVersion.versionValue).filter(
+        ReportVersion.versionScope.in_(scopes)
+    ).all()) if scopes else {}
+    return [found.get(scope, 0) for scope in scopes]
+
+
+class _DiskTier:
+    """SQLite file of etag -> body, one connection per thread"""
+
+    def __init__(self, path, max_rows):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = itertools.count(1)  # next() is atomic, set() runs on many threads
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_cache "
+                "(etag TEXT PRIMARY KEY, body TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, etag):
+        row = self._conn().execute("SELECT body FROM report_cache WHERE etag = ?", (etag,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, etag, body):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO report_cache (etag, body, stored_at) VALUES (?, ?, ?)",
+            (etag, body, time.time())
+        )
+        if next(self._writes) % DISK_PRUNE_EVERY == 0:
+            # Superseded versions are never read again; keep the newest max_rows
+            conn.execute(
+                "DELETE FROM report_cache WHERE etag NOT IN "
+                "(SELECT etag FROM report_cache ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_rows,)
+            )
+
+
+class ReportCache:
+    """LRU of report bodies keyed by versioned ETag, optionally backed by SQLite"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("REPORT_CACHE_SIZE", self.maxsize)
+        path = app.config.get("REPORT_CACHE_PATH")
+        if path:
+            self._disk = _DiskTier(path, app.config.get("REPORT_CACHE_DISK_ROWS", 20000))
+
+    def get(self, etag):
+        with self._lock:
+            body = self._memory.get(etag)
+            if body is not None:
+                self._memory.move_to_end(etag)
+                return body
+        if self._disk is None:
+            return None
+        try:
+            body = self._disk.get(etag)
+        except sqlite3.Error as e:
+            logger.warning("Report cache read failed: %s", e)
+            return None
+        if body is not None:
+            self._remember(etag, body)
+        return body
+
+    def set(self, etag, body):
+        self._remember(etag, body)
+        if self._disk is not None:
+            try:
+                self._disk.set(etag, body)
+            except sqlite3.Error as e:
+                logger.warning("Report cache write failed: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def _remember(self, etag, body):
+        with self._lock:
+            self._memory[etag] = body
+            self._memory.move_to_end(etag)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+
+report_cache = ReportCache()
+
+
+def report_etag(endpoint, params, scopes):
+    key = json.dumps([endpoint, params, scopes, versions(scopes)], default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cached_report(endpoint, params, scopes, build):
+    """JSON response for a report, reused while the versions of its scopes are unchanged.
+
+    build() returns the JSON body as a string; anything else (e.g. an error
+    response) is returned as is and not cached.
+    """
+    etag = report_etag(endpoint, params, scopes)
+    if is_current(etag):
+        return not_modified(etag)
+    body = report_cache.get(etag)
+    if body is None:
+        body = build()
+        if not isinstance(body, str):
+            return body
+        report_cache.set(etag, body)
+    return with_validators(Response(body, mimetype='application/json'), etag)
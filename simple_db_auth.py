@@ -4,7 +4,7 @@ Just checks user_id and access_token from mtpl_users table
 """
 from functools import wraps
 from flask import request, jsonify
-from models import User
+from auth import resolve_db_token
 
 def simple_token_required(f):
     @wraps(f)
@@ -17,7 +17,7 @@ def simple_token_required(f):
             token = token[7:]
         
         # Check if token exists in database for any active user
-        user = User.query.filter_by(userAccessToken=token, userIsActive='1').first()
+        user = resolve_db_token(token)
         if not user:
             return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
         
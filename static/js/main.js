@@ -58,27 +58,102 @@ document.addEventListener("DOMContentLoaded", () => {
 
     setInterval(sendFrame, 4000); // every 4 seconds
 
+    let lastEventId = null;
+
+    function attendanceItem(item) {
+      const li = document.createElement("li");
+      li.className = "list-group-item";
+      li.dataset.id = item.id;
+      li.innerHTML = `
+        <strong>${item.person_name || "-"}</strong>
+        <span class="text-muted"> (${item.employee_code || "-"})</span><br>
+        <small>${item.timestamp}</small>
+        <span class="badge bg-secondary ms-2">${item.source}</span>
+      `;
+      return li;
+    }
+
+    function applyEvent(event) {
+      // Clock-outs and breaks update a row that may already be listed
+      const item = attendanceItem(event.attendance);
+      const existing = attendanceList.querySelector(`[data-id="${event.attendance.id}"]`);
+      if (existing) {
+        existing.replaceWith(item);
+      } else {
+        attendanceList.prepend(item);
+        while (attendanceList.children.length > 20) attendanceList.lastElementChild.remove();
+      }
+    }
+
+    // Full list once, then only the events after last_event_id; the server holds
+    // each request open until an event arrives (long-poll)
     function loadAttendance() {
-      fetch("/api/attendance/latest")
+      const url = lastEventId === null
+        ? "/api/attendance/latest"
+        : `/api/attendance/latest?since=${lastEventId}&wait=25`;
+      fetch(url)
         .then(res => res.json())
         .then(data => {
-          attendanceList.innerHTML = "";
-          if (!data.results) return;
-          data.results.forEach(item => {
-            const li = document.createElement("li");
-            li.className = "list-group-item";
-            li.innerHTML = `
-              <strong>${item.person_name || "-"}</strong>
-              <span class="text-muted"> (${item.employee_code || "-"})</span><br>
-              <small>${item.timestamp}</small>
-              <span class="badge bg-secondary ms-2">${item.source}</span>
-            `;
-            attendanceList.appendChild(li);
-          });
-        });
+          if (!data.success) throw new Error(data.error);
+          lastEventId = data.last_event_id;
+          if (data.results) {
+            attendanceList.innerHTML = "";
+            data.results.forEach(item => attendanceList.appendChild(attendanceItem(item)));
+          } else {
+            data.events.forEach(applyEvent);
+          }
+          loadAttendance();
+        })
+        .catch(() => setTimeout(loadAttendance, 10000));
     }
 
     loadAttendance();
-    setInterval(loadAttendance, 10000);
   }
 });
+
+// Approval notifications for the signed-in user (access token in localStorage).
+// Read through fetch because EventSource cannot send the Authorization header.
+function subscribeApprovalEvents(onEvent) {
+  const token = localStorage.getItem("access_token");
+  if (!token) return false;
+  let userId;
+  try {
+    userId = JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/"))).user_id;
+  } catch (err) {
+    return false;
+  }
+
+  const connect = () => {
+    fetch(`/api/approval-events/stream/${userId}`, { headers: { Authorization: `Bearer ${token}` } })
+      .then(async res => {
+        if (res.status === 401 || res.status === 403) return false; // token expired or not ours
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) return true;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf("\n\n")) >= 0) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const data = block.split("\n")
+              .filter(line => line.startsWith("data: "))
+              .map(line => line.slice(6))
+              .join("\n");
+            if (data) onEvent(JSON.parse(data));
+          }
+        }
+      })
+      .catch(err => {
+        console.warn("Approval event stream:", err.message);
+        return true;
+      })
+      .then(reconnect => {
+        if (reconnect) setTimeout(connect, 5000);
+      });
+  };
+  connect();
+  return true;
+}
@@ -3,8 +3,11 @@
 def add_user_approvers_routes(app, db):
     from flask import request, jsonify
     from user_approvers_model import UserApprover
-    from multilevel_models import LeaveApprover, LeaveApproval
-    from models import LeaveRequest, User, get_ist_now
+    from multilevel_models import LeaveApprover
+    from models import LeaveRequest, User, get_ist_now, serialize_all
+    from approval_workflow import build_approvals, insert_approvals
+    from approver_routing import approver_routing
+    from approval_notifications import approval_dispatcher
 
     @app.route("/api/user-approvers", methods=["GET"])
     def api_get_user_approvers():
@@ -16,7 +19,7 @@ def add_user_approvers_routes(app, db):
             query = query.filter_by(userApproverUserId=user_id)
         
         assignments = query.all()
-        return jsonify({"success": True, "assignments": [a.to_dict() for a in assignments]})
+        return jsonify({"success": True, "assignments": serialize_all(assignments)})
 
     @app.route("/api/user-approvers", methods=["POST"])
     def api_assign_approvers_to_user():
@@ -42,11 +45,12 @@ def add_user_approvers_routes(app, db):
             assignments.append(assignment)
         
         db.session.commit()
+        approver_routing.invalidate()
         
         return jsonify({
             "success": True,
             "count": len(assignments),
-            "assignments": [a.to_dict() for a in assignments]
+            "assignments": serialize_all(assignments)
         })
 
     @app.route("/api/user-approvers/<int:assignment_id>", methods=["DELETE"])
@@ -58,6 +62,7 @@ def add_user_approvers_routes(app, db):
         
         db.session.delete(assignment)
         db.session.commit()
+        approver_routing.invalidate()
         
         return jsonify({"success": True})
 
@@ -106,21 +111,12 @@ def add_user_approvers_routes(app, db):
         db.session.flush()  # Get the ID
         
         # Auto-assign approvers based on user's assigned approvers
-        user_approvers = UserApprover.query.filter_by(
-            userApproverUserId=user_id,
-            userApproverIsActive=True
-        ).all()
-        
-        approvals_created = 0
-        for user_approver in user_approvers:
-            approval = LeaveApproval(
-                approvalLeaveRequestId=leave_request.leaveRequestId,
-                approvalApproverId=user_approver.userApproverApproverId
-            )
-            db.session.add(approval)
-            approvals_created += 1
+        approvals_created = insert_approvals(
+            build_approvals(leave_request, approver_routing.approvers_for(user_id))
+        )
         
         db.session.commit()
+        approval_dispatcher.wake()
         
         return jsonify({
             "success": True,
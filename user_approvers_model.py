@@ -18,12 +18,15 @@ class UserApprover(db.Model):
     userApproverIsActive = db.Column('userApproverIsActive', db.Boolean, default=True)
     userApproverCreatedAt = db.Column('userApproverCreatedAt', db.DateTime, default=get_ist_now)
 
+    _user_id_fields = ('userApproverUserId',)
+    _approver_id_field = 'userApproverApproverId'
+
     def to_dict(self):
         from multilevel_models import LeaveApprover
-        from models import User
+        from models import get_row_user
         
         approver = LeaveApprover.query.get(self.userApproverApproverId)
-        user = User.query.get(self.userApproverUserId)
+        user = get_row_user(self, self.userApproverUserId)
         
         return {
             "id": self.userApproverId,
@@ -0,0 +1,150 @@
+"""
+Process-wide user directory
+Keeps userId -> (first name, last name, login, active) in memory so that
+serializers and reports do not query mtpl_users for every row.
+"""
+import threading
+import time
+
+from sqlalchemy import event
+
+from database import db, after_commit
+from models import User
+
+FULL_REFRESH_INTERVAL = 300  # seconds, picks up edits made outside this service
+MISS_REFRESH_INTERVAL = 5  # seconds between incremental refreshes triggered by unknown ids
+
+
+class UserRecord:
+    __slots__ = ('userId', 'userFirstName', 'userLastName', 'userLogin', 'userIsActive')
+
+    def __init__(self, user_id, first_name, last_name, login, is_active):
+        self.userId = user_id
+        self.userFirstName = first_name
+        self.userLastName = last_name
+        self.userLogin = login
+        self.userIsActive = is_active
+
+    @property
+    def name(self):
+        return f"{self.userFirstName} {self.userLastName}"
+
+    @property
+    def employee_code(self):
+        return self.userLogin
+
+    @property
+    def is_active(self):
+        return self.userIsActive == '1'
+
+
+class UserDirectory:
+    def __init__(self):
+        self._records = {}
+        self._max_user_id = 0
+        self._loaded_at = None
+        self._last_miss_refresh = 0.0
+        self._stale_ids = set()
+        self._lock = threading.RLock()
+
+    def _query(self):
+        return db.session.query(
+            User.userId, User.userFirstName, User.userLastName, User.userLogin, User.userIsActive
+        )
+
+    def _store(self, rows, drop_ids=(), replace=False):
+        # Copy on write: readers iterate the dict they picked up while a refresh swaps in a new one
+        records = {} if replace else dict(self._records)
+        for user_id in drop_ids:
+            records.pop(user_id, None)
+        for row in rows:
+            records[row[0]] = UserRecord(*row)
+            if row[0] > self._max_user_id:
+                self._max_user_id = row[0]
+        self._records = records
+
+    def load(self):
+        """Full (re)load of the directory"""
+        rows = self._query().all()
+        with self._lock:
+            self._max_user_id = 0
+            self._stale_ids.clear()
+            self._store(rows, replace=True)
+            self._loaded_at = time.monotonic()
+
+    def refresh_new(self):
+        """Incremental refresh: only users created after the highest known userId"""
+        with self._lock:
+            marker = self._max_user_id
+        rows = self._query().filter(User.userId > marker).all()
+        with self._lock:
+            self._store(rows)
+            self._last_miss_refresh = time.monotonic()
+        return len(rows)
+
+    def _refresh_stale(self):
+        with self._lock:
+            ids, self._stale_ids = self._stale_ids, set()
+        if not ids:
+            return
+        rows = self._query().filter(User.userId.in_(ids)).all()
+        with self._lock:
+            self._store(rows, drop_ids=ids)
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > FULL_REFRESH_INTERVAL:
+            self.load()
+        elif self._stale_ids:
+            self._refresh_stale()
+
+    def invalidate(self, user_id=None):
+        """Mark one user (or, with no id, the whole directory) for reload on next access"""
+        with self._lock:
+            if user_id is None:
+                self._loaded_at = None
+            else:
+                self._stale_ids.add(int(user_id))
+
+    def get(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        self._ensure_fresh()
+        record = self._records.get(user_id)
+        if record is None and user_id > self._max_user_id \
+                and time.monotonic() - self._last_miss_refresh > MISS_REFRESH_INTERVAL:
+            self.refresh_new()
+            record = self._records.get(user_id)
+        return record
+
+    def get_active(self, user_id):
+        record = self.get(user_id)
+        return record if record is not None and record.is_active else None
+
+    def get_many(self, user_ids):
+        """{userId: UserRecord} for the ids that exist"""
+        ids = {int(uid) for uid in user_ids if uid is not None}
+        if not ids:
+            return {}
+        self._ensure_fresh()
+        if any(uid > self._max_user_id for uid in ids) \
+                and time.monotonic() - self._last_miss_refresh > MISS_REFRESH_INTERVAL:
+            self.refresh_new()
+        records = self._records
+        return {uid: records[uid] for uid in ids if uid in records}
+
+    def active_users(self):
+        self._ensure_fresh()
+        return [r for r in self._records.values() if r.is_active]
+
+
+user_directory = UserDirectory()
+
+
+@event.listens_for(User.userIsActive, 'set')
+def _invalidate_on_activation_change(target, value, oldvalue, initiator):
+    # After the commit, otherwise a concurrent reload could cache the old value again
+    if target.userId is not None:
+        user_id = target.userId
+        after_commit(target, lambda: user_directory.invalidate(user_id))
@@ -0,0 +1,108 @@
+"""
+Work calendar
+Keeps mtpl_holidays in memory as one array of day kinds per year (indexed by day
+of year) plus running counts per kind, so classifying a date is an array
+lookup and counting days of a kind between two dates is two lookups per year.
+Week-offs are the holiday rows flagged holidayIsWeekoff.
+"""
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from models import Holiday
+
+WORKING, HOLIDAY, WEEK_OFF = 0, 1, 2
+DAY_TYPES = {WORKING: 'working', HOLIDAY: 'holiday', WEEK_OFF: 'week_off'}
+CALENDAR_REFRESH_INTERVAL = 300  # seconds, picks up holidays edited by other processes
+
+
+class _Year:
+    __slots__ = ('start', 'kinds', 'before')
+
+    def __init__(self, year, holidays):
+        self.start = date(year, 1, 1)
+        self.kinds = np.full((date(year + 1, 1, 1) - self.start).days, WORKING, dtype=np.uint8)
+        for holiday_date, is_weekoff in holidays:
+            self.kinds[(holiday_date - self.start).days] = WEEK_OFF if is_weekoff else HOLIDAY
+        # before[kind][i] = days of that kind among the first i days of the year
+        self.before = np.zeros((len(DAY_TYPES), len(self.kinds) + 1), dtype=np.int32)
+        for kind in DAY_TYPES:
+            np.cumsum(self.kinds == kind, out=self.before[kind, 1:])
+
+    def count(self, first, last, kind):
+        """Days of kind between day indexes first and last (inclusive)"""
+        return int(self.before[kind, last + 1] - self.before[kind, first])
+
+
+class WorkCalendar:
+    def __init__(self):
+        self._years = {}
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def _year(self, year):
+        loaded_at = self._loaded_at.get(year)
+        if loaded_at is None or time.monotonic() - loaded_at > CALENDAR_REFRESH_INTERVAL:
+            rows = Holiday.query.with_entities(Holiday.holidayDate, Holiday.holidayIsWeekoff).filter(
+                Holiday.holidayDate >= date(year, 1, 1),
+                Holiday.holidayDate < date(year + 1, 1, 1)
+            ).all()
+            with self._lock:
+                self._years[year] = _Year(year, rows)
+                self._loaded_at[year] = time.monotonic()
+        return self._years[year]
+
+    def invalidate(self, year=None):
+        """Reload one year (or every year) on next access"""
+        with self._lock:
+            if year is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(year, None)
+
+    def kind(self, day):
+        cal = self._year(day.year)
+        return int(cal.kinds[(day - cal.start).days])
+
+    def day_type(self, day):
+        """'working', 'holiday' or 'week_off'"""
+        return DAY_TYPES[self.kind(day)]
+
+    def is_working_day(self, day):
+        return self.kind(day) == WORKING
+
+    def is_holiday(self, day):
+        return self.kind(day) == HOLIDAY
+
+    def is_week_off(self, day):
+        return self.kind(day) == WEEK_OFF
+
+    def _count(self, start_date, end_date, kind):
+        total = 0
+        for year in range(start_date.year, end_date.year + 1):
+            cal = self._year(year)
+            first = (max(start_date, cal.start) - cal.start).days
+            last = (min(end_date, date(year, 12, 31)) - cal.start).days
+            total += cal.count(first, last, kind)
+        return total
+
+    def working_days(self, start_date, end_date):
+        """Working days from start_date to end_date (inclusive)"""
+        if end_date < start_date:
+            return 0
+        return self._count(start_date, end_date, WORKING)
+
+    def counts(self, start_date, end_date):
+        """(working days, holidays, week-offs) from start_date to end_date (inclusive)"""
+        if end_date < start_date:
+            return 0, 0, 0
+        return (
+            self._count(start_date, end_date, WORKING),
+            self._count(start_date, end_date, HOLIDAY),
+            self._count(start_date, end_date, WEEK_OFF),
+        )
+
+
+work_calendar = WorkCalendar()
@@ -0,0 +1,78 @@
+"""
+Work-hours calculator
+Vectorized worked/break/late/early-out/overtime math over columnar punch arrays
+(numpy datetime64), shared by working reports, daily summaries, monthly reports
+and the dashboard rollups so every path applies the same rules.
+"""
+from datetime import datetime, time
+
+import numpy as np
+
+LATE_HOUR = 10  # clock-in at or after 10:00 is late, before is on time
+EARLY_OUT_HOUR = 18  # clock-out before 18:00 is an early out
+OVERTIME_HOUR = 18  # clock-out at or after 18:00 is overtime
+
+
+def _naive(value):
+    # Rows written in this request still carry the IST tzinfo from get_ist_now()
+    if value is None:
+        return None
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def to_datetime64(values, days=None):
+    """datetime64[s] array from datetimes, or from times on the matching entry of days; None becomes NaT"""
+    if days is not None:
+        values = [datetime.combine(d, v) if isinstance(v, time) else v for d, v in zip(days, values)]
+    return np.array([_naive(v) for v in values], dtype='datetime64[s]')
+
+
+def hour_of_day(stamps):
+    return (stamps - stamps.astype('datetime64[D]')).astype('timedelta64[h]').astype(np.int64)
+
+
+def compute(clock_in, clock_out, break_in, break_out, standard_hours=None):
+    """Per-session metrics for aligned datetime64 arrays (NaT where a punch is missing).
+
+    Returns a dict of arrays:
+      complete     - clocked in and out
+      worked_hours - out - in - break for complete sessions, else 0
+      break_hours  - break out - break in when both are punched, else 0
+      late         - clocked in at or after LATE_HOUR
+      early_out    - clocked out before EARLY_OUT_HOUR
+      overtime     - clocked out at or after OVERTIME_HOUR
+      difference   - worked_hours - standard_hours (NaN for incomplete sessions),
+                     only when standard_hours is given
+    """
+    clocked_in = ~np.isnat(clock_in)
+    complete = clocked_in & ~np.isnat(clock_out)
+    on_break = ~np.isnat(break_in) & ~np.isnat(break_out)
+
+    break_seconds = np.where(on_break, (break_out - break_in).astype(np.float64), 0.0)
+    seconds = np.where(complete, (clock_out - clock_in).astype(np.float64), 0.0)
+    seconds -= np.where(complete, break_seconds, 0.0)
+
+    in_hour = hour_of_day(clock_in)
+    out_hour = hour_of_day(clock_out)
+    metrics = {
+        "complete": complete,
+        "worked_hours": seconds / 3600.0,
+        "break_hours": break_seconds / 3600.0,
+        "late": clocked_in & (in_hour >= LATE_HOUR),
+        "early_out": complete & (out_hour < EARLY_OUT_HOUR),
+        "overtime": complete & (out_hour >= OVERTIME_HOUR),
+    }
+    if standard_hours is not None:
+        metrics["difference"] = np.where(complete, metrics["worked_hours"] - standard_hours, np.nan)
+    return metrics
+
+
+def compute_rows(rows, standard_hours=None, days=None):
+    """compute() for a sequence of (clock_in, clock_out, break_in, break_out) tuples.
+
+    With days (one date per row) the punches may be times of that day, as in
+    manual time entries.
+    """
+    rows = list(rows)
+    columns = list(zip(*rows)) if rows else [()] * 4
+    return compute(*(to_datetime64(c, days) for c in columns), standard_hours=standard_hours)
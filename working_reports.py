@@ -0,0 +1,230 @@
+"""
+Working report engine
+Builds a user's per-day working report from mtpl_attendance, mtpl_manual_time_entries
+and mtpl_working_reports with one query per source and a single bulk upsert.
+"""
+from collections import OrderedDict
+
+from sqlalchemy import and_
+
+from bulk_ops import upsert_rows
+from database import db
+from models import Attendance, ManualTimeEntry, WorkingRecord, Option, get_ist_now, day_bounds
+from work_calendar import work_calendar
+from work_hours import compute_rows
+
+
+def _report_row(user_full_name, day, clock_in, clock_out, worked_hours, difference):
+    return OrderedDict([
+        ("user_full_name", user_full_name),
+        ("date", day.isoformat()),
+        ("day_type", work_calendar.day_type(day)),
+        ("clock_in_time", clock_in.strftime("%H:%M:%S") if clock_in else None),
+        ("clock_out_time", clock_out.strftime("%H:%M:%S") if clock_out else None),
+        ("worked_hours", worked_hours),
+        ("total_hours_difference", difference),
+    ])
+
+
+def _merge_days(existing_records, attendance_records, manual_entries, standard_hours):
+    """Per-day (clock_in, clock_out, worked_hours, difference) of one user plus the days to store.
+
+    Each date is computed from its first attendance row, else its manual time
+    entry; a stored working record is used only for dates with neither. The
+    computed dates that are not stored, or stored with other values, are
+    returned as the days to store. Clock times are datetime.time, hours are
+    unrounded floats and None when the day is incomplete.
+    """
+    stored = {rec.recordDate: rec for rec in existing_records}
+
+    first_punches = {}
+    for att in attendance_records:
+        first_punches.setdefault(att.attendanceTimestamp.date(), att)
+    manual_days = {}
+    for manual in manual_entries:
+        if manual.entryWorkingDate not in first_punches:
+            manual_days.setdefault(manual.entryWorkingDate, manual)
+
+    days = {}
+    for day, rec in stored.items():
+        if day in first_punches or day in manual_days:
+            continue
+        worked_hrs = float(rec.recordWorkedHours) if rec.recordWorkedHours is not None else None
+        # Difference is recalculated against the current standard hours
+        difference = worked_hrs - standard_hours if worked_hrs is not None else None
+        days[day] = (rec.recordClockInTime, rec.recordClockOutTime, worked_hrs, difference)
+
+    punches = [
+        (day, att.attendanceClockInTime, att.attendanceClockOutTime, att.attendanceBreakInTime, att.attendanceBreakOutTime)
+        for day, att in first_punches.items()
+    ] + [
+        (day, m.entryCheckInTime, m.entryCheckOutTime, m.entryBreakInTime, m.entryBreakOutTime)
+        for day, m in manual_days.items()
+    ]
+    metrics = compute_rows([p[1:] for p in punches], standard_hours, days=[p[0] for p in punches])
+
+    changed_days = []
+    for i, (day, clock_in, clock_out, _, _) in enumerate(punches):
+        complete = bool(metrics["complete"][i])
+        if day not in manual_days:
+            clock_in = clock_in.time() if clock_in is not None else None
+            clock_out = clock_out.time() if clock_out is not None else None
+        days[day] = (
+            clock_in,
+            clock_out,
+            float(metrics["worked_hours"][i]) if complete else None,
+            float(metrics["difference"][i]) if complete else None,
+        )
+        rec = stored.get(day)
+        # A day first stored while incomplete (clock-in only) is rewritten once it changes
+        if rec is None or (
+            rec.recordClockInTime, rec.recordClockOutTime,
+            _round(rec.recordWorkedHours), _round(rec.recordTotalHoursDifference),
+        ) != (clock_in, clock_out, _round(days[day][2]), _round(days[day][3])):
+            changed_days.append(day)
+    return days, changed_days
+
+
+def _round(hours):
+    return round(float(hours), 2) if hours is not None else None
+
+
+def build_working_report(user_id, user_full_name, start_date, end_date):
+    """Return (records, search_info) for user_id between start_date and end_date.
+
+    Days are merged by _merge_days(). Days that are not stored yet, or whose
+    stored record no longer matches the punches, are written back in one
+    upsert; nothing is written when every stored day is current.
+    """
+    range_start, range_end = day_bounds(start_date, end_date)
+    attendance_records = Attendance.query.filter(
+        Attendance.attendanceUserId == user_id,
+        Attendance.in_period(range_start, range_end)
+    ).order_by(Attendance.attendanceTimestamp.asc()).all()
+
+    manual_entries = ManualTimeEntry.query.filter(
+        and_(
+            ManualTimeEntry.entryUserId == user_id,
+            ManualTimeEntry.entryWorkingDate >= start_date,
+            ManualTimeEntry.entryWorkingDate <= end_date
+        )
+    ).all()
+
+    existing_records = WorkingRecord.query.filter(
+        and_(
+            WorkingRecord.recordUserId == user_id,
+            WorkingRecord.recordDate >= start_date,
+            WorkingRecord.recordDate <= end_date
+        )
+    ).all()
+
+    standard_hours = Option.get_standard_working_hours()
+    days, changed_days = _merge_days(existing_records, attendance_records, manual_entries, standard_hours)
+    records = {
+        day: _report_row(user_full_name, day, clock_in, clock_out, _round(worked), _round(difference))
+        for day, (clock_in, clock_out, worked, difference) in days.items()
+    }
+    new_rows = {day: days[day] for day in changed_days}
+
+    if new_rows:
+        now = get_ist_now()
+        upsert_rows(
+            WorkingRecord,
+            [{
+                "recordUserId": user_id,
+                "recordDate": day,
+                "recordClockInTime": clock_in,
+                "recordClockOutTime": clock_out,
+                "recordWorkedHours": worked,
+                "recordTotalHoursDifference": difference,
+                "recordCreatedAt": now,
+                "recordUpdatedAt": now,
+            } for day, (clock_in, clock_out, worked, difference) in new_rows.items()],
+            key_columns=("recordUserId", "recordDate"),
+            update_columns=(
+                "recordClockInTime", "recordClockOutTime", "recordWorkedHours",
+                "recordTotalHoursDifference", "recordUpdatedAt",
+            ),
+        )
+        db.session.commit()
+
+    search_info = OrderedDict([
+        ("user_id", user_id),
+        ("date_range", f"{start_date} to {end_date}"),
+        ("working_days", work_calendar.working_days(start_date, end_date)),
+        ("attendance_records_found", len(attendance_records)),
+        ("manual_entries_found", len(manual_entries)),
+        ("existing_records_found", len(existing_records)),
+    ])
+    return [records[day] for day in sorted(records)], search_info
+
+
+def _report_user_ids(start_date, end_date):
+    """Users with attendance, a manual entry or a stored record between start_date and end_date"""
+    range_start, range_end = day_bounds(start_date, end_date)
+    user_ids = set()
+    for query in (
+        db.session.query(Attendance.attendanceUserId).filter(Attendance.in_period(range_start, range_end)),
+        db.session.query(ManualTimeEntry.entryUserId).filter(
+            ManualTimeEntry.entryWorkingDate >= start_date, ManualTimeEntry.entryWorkingDate <= end_date
+        ),
+        db.session.query(WorkingRecord.recordUserId).filter(
+            WorkingRecord.recordDate >= start_date, WorkingRecord.recordDate <= end_date
+        ),
+    ):
+        user_ids.update(uid for (uid,) in query.distinct())
+    return sorted(user_ids)
+
+
+def iter_working_days(start_date, end_date, user_ids=None, batch_size=50):
+    """Yield (user_id, date, clock_in, clock_out, worked_hours, difference) ordered by user and date.
+
+    Rows are merged like build_working_report() but nothing is written back.
+    The three sources are loaded for batch_size users at a time, so memory
+    depends on the batch and the date range, not on the number of users.
+    """
+    user_ids = sorted(set(user_ids)) if user_ids else _report_user_ids(start_date, end_date)
+    range_start, range_end = day_bounds(start_date, end_date)
+    standard_hours = Option.get_standard_working_hours()
+
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        attendance, manual, stored = {}, {}, {}
+        # Plain column rows: _merge_days() only reads attributes and nothing enters the identity map
+        for att in db.session.query(
+            Attendance.attendanceUserId, Attendance.attendanceTimestamp,
+            Attendance.attendanceClockInTime, Attendance.attendanceClockOutTime,
+            Attendance.attendanceBreakInTime, Attendance.attendanceBreakOutTime,
+        ).filter(
+            Attendance.attendanceUserId.in_(batch),
+            Attendance.in_period(range_start, range_end)
+        ).order_by(Attendance.attendanceTimestamp.asc()):
+            attendance.setdefault(att.attendanceUserId, []).append(att)
+        for entry in db.session.query(
+            ManualTimeEntry.entryUserId, ManualTimeEntry.entryWorkingDate,
+            ManualTimeEntry.entryCheckInTime, ManualTimeEntry.entryCheckOutTime,
+            ManualTimeEntry.entryBreakInTime, ManualTimeEntry.entryBreakOutTime,
+        ).filter(
+            ManualTimeEntry.entryUserId.in_(batch),
+            ManualTimeEntry.entryWorkingDate >= start_date,
+            ManualTimeEntry.entryWorkingDate <= end_date
+        ):
+            manual.setdefault(entry.entryUserId, []).append(entry)
+        for rec in db.session.query(
+            WorkingRecord.recordUserId, WorkingRecord.recordDate,
+            WorkingRecord.recordClockInTime, WorkingRecord.recordClockOutTime,
+            WorkingRecord.recordWorkedHours, WorkingRecord.recordTotalHoursDifference,
+        ).filter(
+            WorkingRecord.recordUserId.in_(batch),
+            WorkingRecord.recordDate >= start_date,
+            WorkingRecord.recordDate <= end_date
+        ):
+            stored.setdefault(rec.recordUserId, []).append(rec)
+
+        for user_id in batch:
+            days, _ = _merge_days(
+                stored.get(user_id, ()), attendance.get(user_id, ()), manual.get(user_id, ()), standard_hours
+            )
+            for day in sorted(days):
+                clock_in, clock_out, worked, difference = days[day]
+                yield user_id, day, clock_in, clock_out, _round(worked), _round(difference)